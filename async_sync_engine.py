@@ -0,0 +1,248 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import ummap_mri_sync_to_box_helpers as hlps
+
+###########
+# Globals #
+
+# Default number of each kind of Box call allowed to run at once
+default_concurrency_limits = {
+    "list": 4,
+    "mkdir": 4,
+    "upload": 8,
+    "delete": 2,
+}
+
+
+class AsyncSyncEngine:
+    """An asyncio alternative to DirEntryNode.sync_tree_object_items that keeps the whole tree in flight at once
+
+    Every folder of the pruned DirEntryNode tree becomes a task. A folder's task lists its Box Folder, then starts
+    child-folder tasks, uploads, updates, and deletes side by side instead of one folder at a time. The only ordering
+    kept is the one that matters: a Box Folder is listed or created before anything inside it is touched. The
+    blocking boxsdk calls run on a thread pool, with a separate concurrency limit per kind of call. BoxFolderIndex
+    reads and writes all happen on the event loop thread.
+    """
+
+    def __init__(self, box_index, concurrency_limits=None, update_files=False, remove_items=False, is_verbose=False,
+                 chunked_uploader=None, series_bundler=None, hash_index=None):
+        """Instantiation method for AsyncSyncEngine class
+
+        :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+        :type  box_index: BoxFolderIndex
+        :param concurrency_limits: A dict of "list", "mkdir", "upload", and "delete" call limits overriding defaults
+        :type  concurrency_limits: dict[str, int], optional
+        :param update_files: A boolean flag for updating Box Files from source based on timestamps
+        :type  update_files: boolean
+        :param remove_items: A boolean flag for removing Box Folders and Box Files not in tree object model
+        :type  remove_items: boolean
+        :param is_verbose: A boolean flag for verbosity
+        :type  is_verbose: boolean
+        :param chunked_uploader: An uploader sending large files in parts through resumable Box upload sessions
+        :type  chunked_uploader: ChunkedUploader, optional
+        :param series_bundler: A bundler uploading each series folder as one archive; series are walked if None
+        :type  series_bundler: SeriesBundler, optional
+        :param hash_index: An index of local SHA-1s to update Box Files by content; timestamps are compared if None
+        :type  hash_index: FileHashIndex, optional
+        """
+        self.box_index = box_index
+        self.concurrency_limits = dict(default_concurrency_limits)
+        self.concurrency_limits.update({call_type: limit for call_type, limit in (concurrency_limits or {}).items()
+                                        if limit})
+        self.update_files = update_files
+        self.remove_items = remove_items
+        self.is_verbose = is_verbose
+        self.chunked_uploader = chunked_uploader
+        self.series_bundler = series_bundler
+        self.hash_index = hash_index
+        self.semaphores = {}
+        self.thread_pool = None
+
+    def run(self, root_node, box_folder):
+        """Sync the tree composed of a DirEntryNode object into a Box Folder, returning once every Box call is done
+
+        :param root_node: A pruned root DirEntryNode object
+        :type  root_node: DirEntryNode
+        :param box_folder: A Box Folder to sync the root DirEntryNode object's contents into
+        :type  box_folder: Folder
+        """
+        with ThreadPoolExecutor(max_workers=sum(self.concurrency_limits.values()),
+                                thread_name_prefix="box-async") as thread_pool:
+            self.thread_pool = thread_pool
+            asyncio.run(self.sync_node(root_node, box_folder))
+        self.thread_pool = None
+
+    async def call_box(self, call_type, box_call):
+        """Run a blocking Box call on the thread pool, within the concurrency limit for its kind of call
+
+        :param call_type: A kind of Box call: "list", "mkdir", "upload", or "delete"
+        :type  call_type: str
+        :param box_call: A function taking no arguments that makes the Box call and returns its result
+        :type  box_call: function
+
+        :return: The Box call's result
+        """
+        if call_type not in self.semaphores:  # created lazily so they belong to the running event loop
+            self.semaphores[call_type] = asyncio.Semaphore(self.concurrency_limits[call_type])
+        async with self.semaphores[call_type]:
+            return await asyncio.get_running_loop().run_in_executor(self.thread_pool, box_call)
+
+    async def get_subitems_by_name(self, box_folder):
+        """Get a Box Folder's subitems from the BoxFolderIndex, listing the Box Folder on the thread pool if needed
+
+        :param box_folder: A Box Folder whose contents we want to fetch
+        :type  box_folder: Folder
+
+        :return: A dict of Box subitem names to Box Files and Folders
+        :rtype: dict[str, Folder/File]
+        """
+        if self.box_index.has_listing(box_folder):
+            return self.box_index.get_subitems_by_name(box_folder)
+        box_subitems = await self.call_box("list", lambda: hlps.get_box_subitems(box_folder))
+        return self.box_index.record_listing(box_folder, box_subitems)
+
+    async def sync_node(self, dir_entry_node, box_folder):
+        """Sync a folder DirEntryNode object's children into its Box Folder, starting every child task at once
+
+        :param dir_entry_node: A folder DirEntryNode object
+        :type  dir_entry_node: DirEntryNode
+        :param box_folder: A Box Folder corresponding to the DirEntryNode object
+        :type  box_folder: Folder
+        """
+        box_subitems_by_name = dict(await self.get_subitems_by_name(box_folder))
+        child_folder_names = {den_folder.dir_entry.name for den_folder in dir_entry_node.child_dir_entry_node_folders}
+        child_file_names = {den_file.dir_entry.name for den_file in dir_entry_node.child_dir_entry_node_files}
+        if self.series_bundler is not None:
+            child_file_names.update(self.series_bundler.get_bundle_names(dir_entry_node))
+
+        tasks = []
+
+        if self.remove_items:
+            for box_subitem in box_subitems_by_name.values():
+                if box_subitem.type == "folder" and box_subitem.name not in child_folder_names or \
+                        box_subitem.type == "file" and box_subitem.name not in child_file_names:
+                    tasks.append(self.delete_box_subitem(dir_entry_node, box_subitem))
+
+        for den_folder in dir_entry_node.child_dir_entry_node_folders:
+            box_subitem = box_subitems_by_name.get(den_folder.dir_entry.name)
+            if self.series_bundler is not None and self.series_bundler.is_series_node(den_folder):
+                tasks.append(self.upload_series_bundle(den_folder, box_folder, box_subitems_by_name))
+            elif box_subitem is not None and box_subitem.type == "folder":
+                tasks.append(self.sync_node(den_folder, box_subitem))
+            else:
+                tasks.append(self.create_box_subfolder_and_sync(den_folder, box_folder))
+
+        for den_file in dir_entry_node.child_dir_entry_node_files:
+            box_subitem = box_subitems_by_name.get(den_file.dir_entry.name)
+            if box_subitem is None:
+                tasks.append(self.upload_box_subfile(den_file, box_folder))
+            elif self.update_files and box_subitem.type == "file":
+                tasks.append(self.update_box_subfile_if_differs(den_file, box_folder, box_subitem))
+
+        await asyncio.gather(*tasks)
+
+    async def create_box_subfolder_and_sync(self, den_folder, box_folder):
+        """Create the Box subFolder for a folder DirEntryNode object, then sync into it
+
+        :param den_folder: A folder DirEntryNode object with no Box subFolder yet
+        :type  den_folder: DirEntryNode
+        :param box_folder: A parent Box Folder to create the Box subFolder in
+        :type  box_folder: Folder
+        """
+        box_subfolder, is_new = await self.call_box(
+            "mkdir", lambda: hlps.create_box_subfolder(box_folder, den_folder.dir_entry.name))
+        self.box_index.add_new_folder(box_folder, box_subfolder, is_new)
+        if self.is_verbose:
+            den_folder.print_subitem_action(box_subfolder, "Creating")
+        await self.sync_node(den_folder, box_subfolder)
+
+    async def upload_box_subfile(self, den_file, box_folder):
+        """Upload the local file of a file DirEntryNode object into a Box Folder
+
+        :param den_file: A file DirEntryNode object with no Box subFile yet
+        :type  den_file: DirEntryNode
+        :param box_folder: A Box Folder to upload into
+        :type  box_folder: Folder
+        """
+        box_subfile = await self.call_box(
+            "upload", lambda: hlps.upload_local_file(box_folder, den_file.dir_entry.path, self.chunked_uploader))
+        self.box_index.add_item(box_folder, box_subfile)
+        if self.is_verbose:
+            den_file.print_subitem_action(box_subfile, "Creating")
+
+    async def update_box_subfile_if_differs(self, den_file, box_folder, box_subfile):
+        """Update a Box subFile if the local file of a file DirEntryNode object is newer or, by hash, differs
+
+        Local files are hashed on the thread pool, so reading them doesn't hold up the event loop.
+
+        :param den_file: A file DirEntryNode object with a Box subFile
+        :type  den_file: DirEntryNode
+        :param box_folder: A parent Box Folder of the Box subFile
+        :type  box_folder: Folder
+        :param box_subfile: A Box File to compare against and maybe update
+        :type  box_subfile: File
+        """
+        if self.hash_index is None:
+            differs = den_file.is_newer_than_box_subfile(box_subfile)
+        else:
+            differs = await asyncio.get_running_loop().run_in_executor(
+                self.thread_pool, lambda: den_file.differs_from_box_subfile(box_subfile, self.hash_index))
+        if differs:
+            await self.update_box_subfile(den_file, box_folder, box_subfile)
+
+    async def update_box_subfile(self, den_file, box_folder, box_subfile):
+        """Update a Box subFile with the contents of the local file of a file DirEntryNode object
+
+        :param den_file: A file DirEntryNode object whose local file is newer than its Box subFile
+        :type  den_file: DirEntryNode
+        :param box_folder: A parent Box Folder of the Box subFile
+        :type  box_folder: Folder
+        :param box_subfile: A Box File to update
+        :type  box_subfile: File
+        """
+        updated_box_subfile = await self.call_box(
+            "upload",
+            lambda: hlps.update_box_file_contents(box_subfile, den_file.dir_entry.path, self.chunked_uploader))
+        self.box_index.add_item(box_folder, updated_box_subfile)
+        if self.is_verbose:
+            den_file.print_subitem_action(updated_box_subfile, "Updating")
+
+    async def upload_series_bundle(self, den_series, box_folder, box_subitems_by_name):
+        """Upload a series folder DirEntryNode object as one archive, plus its index sidecar, if they need it
+
+        :param den_series: A series folder DirEntryNode object
+        :type  den_series: DirEntryNode
+        :param box_folder: A Box Folder corresponding to the series folder's parent
+        :type  box_folder: Folder
+        :param box_subitems_by_name: A dict of the Box Folder's subitem names to Box Files and Folders
+        :type  box_subitems_by_name: dict[str, Folder/File]
+        """
+        uploaded = await self.call_box(
+            "upload",
+            lambda: self.series_bundler.upload_series(box_folder, den_series, box_subitems_by_name, self.update_files))
+        for action_str, box_subfile in uploaded:
+            self.box_index.add_item(box_folder, box_subfile)
+            if self.is_verbose:
+                den_series.print_subitem_action(box_subfile, action_str)
+
+    async def delete_box_subitem(self, dir_entry_node, box_subitem):
+        """Delete a Box subitem that has no counterpart among a DirEntryNode object's children
+
+        :param dir_entry_node: A folder DirEntryNode object whose Box Folder holds the Box subitem
+        :type  dir_entry_node: DirEntryNode
+        :param box_subitem: A Box File or Folder to delete
+        :type  box_subitem: Folder/File
+        """
+        if box_subitem.type == "folder":
+            box_subitem_deleted = await self.call_box("delete", lambda: box_subitem.delete(recursive=True))
+        else:
+            box_subitem_deleted = await self.call_box("delete", lambda: box_subitem.delete())
+        if box_subitem_deleted:
+            self.box_index.remove_item(box_subitem)
+        if box_subitem_deleted and self.is_verbose:
+            print("  " * (dir_entry_node.depth + 1) +
+                  f"Removed Box sub{box_subitem.type.capitalize()}",
+                  f"'{box_subitem.name}'",
+                  f"with ID",
+                  f"'{box_subitem.id}'")
@@ -0,0 +1,185 @@
+#!/usr/bin/env Python3
+
+##################
+# Import Modules #
+
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dir_entry_node as den
+import dir_scan_snapshot as dss
+
+
+def write_synthetic_deep_tree(root_path, n_sessions, n_series, n_files):
+    """Write empty `hlp17umm#####_#####/dicom/s#####/i*.MRDC.*` files; building the tree never opens them
+
+    :param root_path: A path to the directory to write the sessions into
+    :type  root_path: str
+    :param n_sessions: A number of session directories to write
+    :type  n_sessions: int
+    :param n_series: A number of series directories to write in each session
+    :type  n_series: int
+    :param n_files: A number of files to write in each series
+    :type  n_files: int
+
+    :return: A number of directories written
+    :rtype: int
+    """
+    for session_number in range(1, n_sessions + 1):
+        for series_number in range(1, n_series + 1):
+            series_path = os.path.join(root_path,
+                                       f"hlp17umm{session_number:05d}_{session_number:05d}",
+                                       "dicom",
+                                       f"s{series_number:05d}")
+            os.makedirs(series_path)
+            for file_number in range(1, n_files + 1):
+                open(os.path.join(series_path, f"i{1000000 + file_number}.MRDC.{file_number}"), "w").close()
+
+    return 1 + n_sessions * (2 + n_series)
+
+
+def get_tree_signature(dir_entry_node):
+    """Get a list of (depth, path, is_dir) tuples in `print_node` order, for comparing two trees exactly
+
+    :param dir_entry_node: A root DirEntryNode object
+    :type  dir_entry_node: DirEntryNode
+
+    :return: A list of tuples describing every node in the tree
+    :rtype: [(int, str, bool)]
+    """
+    signature = [(dir_entry_node.depth, dir_entry_node.dir_entry.path, True)]
+    for dir_entry_node_folder in dir_entry_node.child_dir_entry_node_folders:
+        signature.extend(get_tree_signature(dir_entry_node_folder))
+    for dir_entry_node_file in dir_entry_node.child_dir_entry_node_files:
+        signature.append((dir_entry_node_file.depth, dir_entry_node_file.dir_entry.path, False))
+    return signature
+
+
+def age_dirs(root_path, age_seconds=3600):
+    """Set every directory's modified time `age_seconds` back, so a scan snapshot taken now trusts its listings
+
+    :param root_path: A path to the root of the synthetic tree
+    :type  root_path: str
+    :param age_seconds: Seconds to set modified times back by
+    :type  age_seconds: float
+    """
+    aged_time = time.time() - age_seconds
+    for dir_path, _, _ in os.walk(root_path):
+        os.utime(dir_path, (aged_time, aged_time))
+
+
+def time_build(root_path, scan_workers, dir_scan_snapshot=None):
+    """Build a DirEntryNode tree at `root_path`, serially if `scan_workers` is 1, and time it
+
+    :param root_path: A path to the root of the synthetic tree
+    :type  root_path: str
+    :param scan_workers: A number of directories to list at once
+    :type  scan_workers: int
+    :param dir_scan_snapshot: A snapshot of directory listings to build with
+    :type  dir_scan_snapshot: DirScanSnapshot, optional
+
+    :return: A tuple of seconds taken and the built root DirEntryNode object
+    :rtype: (float, DirEntryNode)
+    """
+    root_dir_entry = [dir_entry for dir_entry in os.scandir(os.path.dirname(root_path))
+                      if dir_entry.name == os.path.basename(root_path)][0]
+    root_node = den.DirEntryNode(root_dir_entry, depth=0)
+    rgx_folder = re.compile(r'^hlp17umm\d{5}_\d{5}$|^dicom$|^s\d{5}$')
+    rgx_file = re.compile(r'^i\d+\.MRDC\.\d+$')
+
+    start = time.perf_counter()
+    if scan_workers > 1:
+        root_node.build_tree_from_node_parallel(rgx_folder, rgx_file, max_workers=scan_workers,
+                                                dir_scan_snapshot=dir_scan_snapshot)
+    else:
+        root_node.build_tree_from_node(rgx_folder, rgx_file, dir_scan_snapshot=dir_scan_snapshot)
+    return time.perf_counter() - start, root_node
+
+
+########
+# Main #
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark serial vs. parallel vs. snapshot DirEntryNode tree "
+                                                 "building.")
+
+    parser.add_argument('--sessions', type=int, default=200,
+                        help=f"number of synthetic session directories")
+
+    parser.add_argument('--series', type=int, default=10,
+                        help=f"number of series directories per session")
+
+    parser.add_argument('--files', type=int, default=5,
+                        help=f"number of files per series directory")
+
+    parser.add_argument('--scan_workers', type=int, nargs='+', default=[4, 16],
+                        help=f"worker counts to time the parallel builder with")
+
+    parser.add_argument('--listing_latency_ms', type=float, default=2.0,
+                        help=f"delay added to every directory listing and stat, standing in for NFS round trips")
+
+    args = parser.parse_args()
+
+    # Add a fixed delay to every directory listing, like an NFS round trip
+    scandir, listdir, stat = os.scandir, os.listdir, os.stat
+
+    def slow_scandir(*scandir_args):
+        time.sleep(args.listing_latency_ms / 1000)
+        return scandir(*scandir_args)
+
+    def slow_listdir(*listdir_args):
+        time.sleep(args.listing_latency_ms / 1000)
+        return listdir(*listdir_args)
+
+    def slow_stat(*stat_args, **stat_kwargs):
+        time.sleep(args.listing_latency_ms / 1000)
+        return stat(*stat_args, **stat_kwargs)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root_path = os.path.join(tmp_dir, "mri")
+        n_dirs = write_synthetic_deep_tree(root_path, args.sessions, args.series, args.files)
+        age_dirs(root_path)
+        print(f"Directories in tree:", n_dirs)
+        print(f"Listing latency:    ", f"{args.listing_latency_ms} ms")
+
+        os.scandir, os.listdir, os.stat = slow_scandir, slow_listdir, slow_stat
+        try:
+            serial_seconds, serial_root_node = time_build(root_path, 1)
+            serial_signature = get_tree_signature(serial_root_node)
+            print(f"Serial:             ", f"{serial_seconds:8.3f} s")
+
+            for scan_workers in args.scan_workers:
+                parallel_seconds, parallel_root_node = time_build(root_path, scan_workers)
+                is_identical = get_tree_signature(parallel_root_node) == serial_signature
+                print(f"Parallel ({scan_workers:>3} workers):",
+                      f"{parallel_seconds:8.3f} s",
+                      f"({serial_seconds / parallel_seconds:.1f}x)",
+                      f"identical tree" if is_identical else f"TREE DIFFERS")
+                if not is_identical:
+                    sys.exit(1)
+
+            dir_scan_snapshot = dss.DirScanSnapshot(os.path.join(tmp_dir, "scan_snapshot.sqlite"))
+            for run, scan_workers in [("cold", 1), ("warm", 1), ("warm", max(args.scan_workers))]:
+                snapshot_seconds, snapshot_root_node = time_build(root_path, scan_workers, dir_scan_snapshot)
+                is_identical = get_tree_signature(snapshot_root_node) == serial_signature
+                print(f"Snapshot ({run}, {scan_workers:>3} workers):",
+                      f"{snapshot_seconds:8.3f} s",
+                      f"({serial_seconds / snapshot_seconds:.1f}x)",
+                      f"identical tree" if is_identical else f"TREE DIFFERS")
+                if not is_identical:
+                    sys.exit(1)
+            dir_scan_snapshot.print_summary()
+            dir_scan_snapshot.close()
+        finally:
+            os.scandir, os.listdir, os.stat = scandir, listdir, stat
+
+
+if __name__ == "__main__":
+    main()
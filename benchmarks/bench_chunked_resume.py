@@ -0,0 +1,333 @@
+#!/usr/bin/env Python3
+
+##################
+# Import Modules #
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import tempfile
+import contextlib
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from boxsdk.exception import BoxAPIException
+
+import box_chunked_upload as bcu
+from local_box_client import LocalBoxClient, LocalBoxUploadSession
+
+
+def count_stored_parts(chunked_uploader):
+    """Count the parts the session store holds as acknowledged by Box
+
+    :param chunked_uploader: A ChunkedUploader with one file's session in its store
+    :type  chunked_uploader: ChunkedUploader
+
+    :return: A number of stored parts
+    :rtype: int
+    """
+    with chunked_uploader.lock:
+        return chunked_uploader.connection.execute("SELECT COUNT(*) FROM upload_parts").fetchone()[0]
+
+
+def count_stored_rows(chunked_uploader, session_id):
+    """Count the session store's rows: stored sessions, and stored parts of one session
+
+    :param chunked_uploader: A ChunkedUploader
+    :type  chunked_uploader: ChunkedUploader
+    :param session_id: A Box UploadSession ID to count stored parts of
+    :type  session_id: str
+
+    :return: A tuple of the numbers of stored sessions and of the session's stored parts
+    :rtype: (int, int)
+    """
+    with chunked_uploader.lock:
+        n_sessions = chunked_uploader.connection.execute("SELECT COUNT(*) FROM upload_sessions").fetchone()[0]
+        n_parts = chunked_uploader.connection.execute("SELECT COUNT(*) FROM upload_parts WHERE session_id = ?",
+                                                      (session_id,)).fetchone()[0]
+    return n_sessions, n_parts
+
+
+def get_stored_session_id(chunked_uploader):
+    """Get the ID of the one Box UploadSession in the session store
+
+    :param chunked_uploader: A ChunkedUploader with one file's session in its store
+    :type  chunked_uploader: ChunkedUploader
+
+    :return: A Box UploadSession ID
+    :rtype: str
+    """
+    with chunked_uploader.lock:
+        return json.loads(chunked_uploader.connection.execute("SELECT session_json FROM upload_sessions")
+                          .fetchone()[0])["id"]
+
+
+@contextlib.contextmanager
+def failing_part_uploads(should_fail, status=500):
+    """Make stand-in part uploads fail with an HTTP status, counted by the store like its own injected failures
+
+    :param should_fail: A function taking an upload session ID and a part offset, True for parts to fail
+    :type  should_fail: function
+    :param status: An HTTP status to fail with, e.g., 500, or 404 or 410 for sessions Box no longer knows
+    :type  status: int, optional
+    """
+    upload_part_bytes = LocalBoxUploadSession.upload_part_bytes
+
+    def failing_upload_part_bytes(upload_session, part_bytes, offset, total_size, part_content_sha1=None):
+        if should_fail(upload_session.object_id, offset):
+            store = upload_session.store
+            with store.lock:
+                store.calls["upload_part"] += 1
+                store.failures["upload_part"] += 1
+            raise BoxAPIException(status, code="injected_failure", message=f"Injected failure of part at {offset}")
+        return upload_part_bytes(upload_session, part_bytes, offset, total_size, part_content_sha1)
+
+    LocalBoxUploadSession.upload_part_bytes = failing_upload_part_bytes
+    try:
+        yield
+    finally:
+        LocalBoxUploadSession.upload_part_bytes = upload_part_bytes
+
+
+def check_resume_after_failed_part(tmp_dir, local_path, file_bytes, n_parts, part_size, part_workers):
+    """Fail one part of an upload, then check the parts sent by the failed run and by the run resuming it
+
+    All parts are in flight at once, so the failed run sends every part and stores all but the failed one; the
+    resuming run must send exactly that one part through the same session.
+
+    :param tmp_dir: A directory to write the session store into
+    :type  tmp_dir: str
+    :param local_path: A path to the local file to upload
+    :type  local_path: str
+    :param file_bytes: The local file's contents
+    :type  file_bytes: bytes
+    :param n_parts: A number of parts the file splits into
+    :type  n_parts: int
+    :param part_size: A part size in bytes for the stand-in upload sessions
+    :type  part_size: int
+    :param part_workers: A number of parts sent at once
+    :type  part_workers: int
+    """
+    box_client = LocalBoxClient(part_size=part_size)
+    try:
+        chunked_uploader = bcu.ChunkedUploader(os.path.join(tmp_dir, "failed_part_sessions.sqlite"),
+                                               part_workers=part_workers)
+        box_folder = box_client.folder(box_client.create_root_folder("failed-part"))
+        store = box_client.store
+        failed_offset = (n_parts // 2) * part_size
+
+        with failing_part_uploads(lambda session_id, offset: offset == failed_offset):
+            try:
+                chunked_uploader.upload(box_folder, local_path)
+            except BoxAPIException:
+                pass
+            else:
+                raise AssertionError("upload with a failing part was committed")
+        session_id = get_stored_session_id(chunked_uploader)
+        assert store.calls["upload_part"] == n_parts, \
+            f"failed run sent {store.calls['upload_part']} parts, not all {n_parts}"
+        assert count_stored_rows(chunked_uploader, session_id) == (1, n_parts - 1), \
+            f"failed run stored {count_stored_rows(chunked_uploader, session_id)} (sessions, parts), " \
+            f"not (1, {n_parts - 1})"
+
+        part_calls_before = store.calls["upload_part"]
+        box_file = chunked_uploader.upload(box_folder, local_path)
+        resumed_part_calls = store.calls["upload_part"] - part_calls_before
+        assert resumed_part_calls == 1, f"resuming run sent {resumed_part_calls} parts, not the 1 that failed"
+        assert (chunked_uploader.sessions_created, chunked_uploader.sessions_resumed) == (1, 1), \
+            f"{chunked_uploader.sessions_created} sessions created and {chunked_uploader.sessions_resumed} resumed, " \
+            f"not 1 and 1"
+        assert box_file.sha1 == hashlib.sha1(file_bytes).hexdigest(), "committed Box File doesn't match"
+        assert count_stored_rows(chunked_uploader, session_id) == (0, 0), "committed session left in the store"
+        chunked_uploader.close()
+        print(f"OK: failed part at offset {failed_offset} re-sent alone by the resuming run")
+    finally:
+        box_client.store.cleanup()
+
+
+def check_restart_after_lost_session(tmp_dir, local_path, file_bytes, n_parts, part_size, part_workers, status):
+    """Interrupt an upload, have Box answer the stored session with a 404 or 410, then check that the resuming run
+    forgets the session and its parts and uploads every part through a new one
+
+    :param tmp_dir: A directory to write the session store into
+    :type  tmp_dir: str
+    :param local_path: A path to the local file to upload
+    :type  local_path: str
+    :param file_bytes: The local file's contents
+    :type  file_bytes: bytes
+    :param n_parts: A number of parts the file splits into
+    :type  n_parts: int
+    :param part_size: A part size in bytes for the stand-in upload sessions
+    :type  part_size: int
+    :param part_workers: A number of parts sent at once
+    :type  part_workers: int
+    :param status: An HTTP status Box answers the stored session with: 404 (expired) or 410 (gone)
+    :type  status: int
+    """
+    box_client = LocalBoxClient(part_size=part_size)
+    try:
+        chunked_uploader = bcu.ChunkedUploader(os.path.join(tmp_dir, f"lost_session_{status}_sessions.sqlite"),
+                                               part_workers=part_workers)
+        box_folder = box_client.folder(box_client.create_root_folder(f"lost-session-{status}"))
+        store = box_client.store
+
+        with failing_part_uploads(lambda session_id, offset: offset == 0):
+            try:
+                chunked_uploader.upload(box_folder, local_path)
+            except BoxAPIException:
+                pass
+        lost_session_id = get_stored_session_id(chunked_uploader)
+        assert count_stored_rows(chunked_uploader, lost_session_id) == (1, n_parts - 1), \
+            f"interrupted run stored {count_stored_rows(chunked_uploader, lost_session_id)} (sessions, parts)"
+
+        if status == 404:
+            del store.upload_sessions[lost_session_id]  # expired: Box no longer finds it
+        part_calls_by_session = Counter()
+
+        def is_lost_session_part(session_id, offset):
+            part_calls_by_session[session_id] += 1
+            return session_id == lost_session_id
+
+        def create_upload_session(file_size, file_name):
+            # By the time a new session is created, the lost one must be gone from the store
+            assert count_stored_rows(chunked_uploader, lost_session_id) == (0, 0), \
+                f"lost session {lost_session_id} still stored when starting over"
+            return create_folder_upload_session(file_size, file_name)
+
+        create_folder_upload_session = box_folder.create_upload_session
+        box_folder.create_upload_session = create_upload_session
+        with failing_part_uploads(is_lost_session_part, status):
+            box_file = chunked_uploader.upload(box_folder, local_path)
+        new_session_part_calls = sum(n_calls for session_id, n_calls in part_calls_by_session.items()
+                                     if session_id != lost_session_id)
+        assert new_session_part_calls == n_parts, \
+            f"new session sent {new_session_part_calls} parts, not all {n_parts}"
+        assert (chunked_uploader.sessions_created, chunked_uploader.sessions_resumed) == (2, 1), \
+            f"{chunked_uploader.sessions_created} sessions created and {chunked_uploader.sessions_resumed} resumed, " \
+            f"not 2 and 1"
+        assert box_file.sha1 == hashlib.sha1(file_bytes).hexdigest(), "committed Box File doesn't match"
+        chunked_uploader.close()
+        print(f"OK: session lost with HTTP {status} forgotten, all {n_parts} parts sent through a new one")
+    finally:
+        box_client.store.cleanup()
+
+
+def upload_until_committed(box_client, chunked_uploader, box_folder, local_path, n_parts, max_attempts):
+    """Upload a file in parts, running the upload again after each injected failure as the next run would, and check
+    that every attempt sends only the parts Box hasn't acknowledged
+
+    :param box_client: A LocalBoxClient injecting `upload_part` failures
+    :type  box_client: LocalBoxClient
+    :param chunked_uploader: A ChunkedUploader sharing its session store across attempts
+    :type  chunked_uploader: ChunkedUploader
+    :param box_folder: A stand-in Box Folder to upload into
+    :type  box_folder: LocalBoxFolder
+    :param local_path: A path to the local file
+    :type  local_path: str
+    :param n_parts: A number of parts the file splits into
+    :type  n_parts: int
+    :param max_attempts: A number of attempts after which to give up
+    :type  max_attempts: int
+
+    :return: The uploaded Box File
+    :rtype: LocalBoxFile
+    """
+    store = box_client.store
+    for attempt in range(1, max_attempts + 1):
+        n_stored_before = count_stored_parts(chunked_uploader)
+        part_calls_before = store.calls["upload_part"]
+        part_failures_before = store.failures["upload_part"]
+        error = None
+        try:
+            box_file = chunked_uploader.upload(box_folder, local_path)
+        except Exception as exception:
+            error = exception
+        part_calls = store.calls["upload_part"] - part_calls_before
+        part_failures = store.failures["upload_part"] - part_failures_before
+        n_stored_after = n_parts if error is None else count_stored_parts(chunked_uploader)
+
+        print(f"Attempt {attempt:>2}:",
+              f"{n_stored_before:>3} parts already stored,",
+              f"{part_calls:>3} sent ({part_failures} failed),",
+              f"{n_stored_after:>3} stored after;",
+              "committed" if error is None else
+              f"failed ({type(error).__name__}: {(str(error).splitlines() or [''])[0]})")
+
+        assert part_calls <= n_parts - n_stored_before, \
+            f"attempt {attempt} sent {part_calls} parts, but only {n_parts - n_stored_before} were missing"
+        assert n_stored_after == n_stored_before + part_calls - part_failures, \
+            f"attempt {attempt} had {part_calls - part_failures} parts acknowledged, " \
+            f"but stored {n_stored_after - n_stored_before}"
+        if error is None:
+            return box_file
+    raise AssertionError(f"upload wasn't committed after {max_attempts} attempts")
+
+
+########
+# Main #
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Check that resumed chunked uploads re-send only missing parts, "
+                                                 "against a local stand-in for Box that fails part uploads.")
+
+    parser.add_argument('--parts', type=int, default=10,
+                        help=f"number of parts the test file splits into")
+
+    parser.add_argument('--part_size', type=int, default=100_000,
+                        help=f"part size in bytes handed out by the stand-in upload sessions")
+
+    parser.add_argument('--failure_rate', type=float, default=0.3,
+                        help=f"chance each part upload fails with HTTP 500")
+
+    parser.add_argument('--part_workers', type=int, default=bcu.default_part_workers,
+                        help=f"number of parts sent at once")
+
+    parser.add_argument('--seed', type=int, default=0,
+                        help=f"seed for the failure injection")
+
+    parser.add_argument('--max_attempts', type=int, default=50,
+                        help=f"number of attempts after which to give up")
+
+    args = parser.parse_args()
+
+    box_client = LocalBoxClient(part_size=args.part_size, failure_rate={"upload_part": args.failure_rate},
+                                seed=args.seed)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            local_path = os.path.join(tmp_dir, "i00001.MRDC.1")
+            file_bytes = os.urandom(args.parts * args.part_size - args.part_size // 2)  # a short last part
+            with open(local_path, 'wb') as local_file:
+                local_file.write(file_bytes)
+
+            # Called directly, so a file below the 20 MB Box minimum still goes through an upload session
+            chunked_uploader = bcu.ChunkedUploader(os.path.join(tmp_dir, "upload_sessions.sqlite"),
+                                                   part_workers=args.part_workers)
+            box_folder = box_client.folder(box_client.create_root_folder("chunked-resume"))
+            box_file = upload_until_committed(box_client, chunked_uploader, box_folder, local_path, args.parts,
+                                              args.max_attempts)
+            chunked_uploader.close()
+            chunked_uploader.print_summary()
+
+            store = box_client.store
+            n_acknowledged = store.calls["upload_part"] - store.failures["upload_part"]
+            assert n_acknowledged == args.parts, \
+                f"Box acknowledged {n_acknowledged} part uploads for a {args.parts}-part file"
+            assert box_file.sha1 == hashlib.sha1(file_bytes).hexdigest(), "committed Box File doesn't match"
+            print(f"OK: each of {args.parts} parts acknowledged once,",
+                  f"{store.failures['upload_part']} failed part uploads re-sent")
+
+            check_resume_after_failed_part(tmp_dir, local_path, file_bytes, args.parts, args.part_size,
+                                           args.part_workers)
+            for status in (404, 410):
+                check_restart_after_lost_session(tmp_dir, local_path, file_bytes, args.parts, args.part_size,
+                                                 args.part_workers, status)
+    finally:
+        box_client.store.cleanup()
+
+
+if __name__ == "__main__":
+    main()
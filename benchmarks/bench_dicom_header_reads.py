@@ -0,0 +1,154 @@
+#!/usr/bin/env Python3
+
+##################
+# Import Modules #
+
+import io
+import os
+import re
+import sys
+import argparse
+import tempfile
+
+import pydicom
+from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, MRImageStorage, generate_uid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ummap_mri_sync_to_box_helpers as hlps
+
+
+class ByteCountingFile(io.FileIO):
+    """A read-only file object that tallies the bytes handed back to its reader"""
+
+    def __init__(self, path):
+        """Instantiation method for ByteCountingFile class
+
+        :param path: A path to the file to open for binary reading
+        :type  path: str
+        """
+        super().__init__(path, "rb")
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def readinto(self, buffer):
+        n_bytes = super().readinto(buffer)
+        self.bytes_read += n_bytes or 0
+        return n_bytes
+
+
+def write_synthetic_dicom_files(dir_path, n_files, rows, cols, series_descrip="t1sag_208"):
+    """Write a series of small but valid MR DICOM files named like GE `i*.MRDC.*` files
+
+    :param dir_path: A path to the directory to write the DICOM files into
+    :type  dir_path: str
+    :param n_files: A number of DICOM files to write
+    :type  n_files: int
+    :param rows: A number of pixel rows in each image
+    :type  rows: int
+    :param cols: A number of pixel columns in each image
+    :type  cols: int
+    :param series_descrip: A Series Description to stamp on each DICOM file
+    :type  series_descrip: str
+
+    :return: A list of paths to the written DICOM files
+    :rtype: [str]
+    """
+    series_uid = generate_uid()
+    dicom_paths = []
+    for instance_number in range(1, n_files + 1):
+        file_meta = FileMetaDataset()
+        file_meta.MediaStorageSOPClassUID = MRImageStorage
+        file_meta.MediaStorageSOPInstanceUID = generate_uid()
+        file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+        dicom_path = os.path.join(dir_path, f"i{1000000 + instance_number}.MRDC.{instance_number}")
+        ds = FileDataset(dicom_path, {}, file_meta=file_meta, preamble=b"\0" * 128)
+        ds.SOPClassUID = MRImageStorage
+        ds.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+        ds.SeriesInstanceUID = series_uid
+        ds.Modality = "MR"
+        ds.SeriesDescription = series_descrip
+        ds.InstanceNumber = instance_number
+        ds.Rows, ds.Columns = rows, cols
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = "MONOCHROME2"
+        ds.BitsAllocated, ds.BitsStored, ds.HighBit = 16, 16, 15
+        ds.PixelRepresentation = 0
+        ds.PixelData = bytes(rows * cols * 2)
+        ds.save_as(dicom_path, enforce_file_format=True)
+        dicom_paths.append(dicom_path)
+
+    return dicom_paths
+
+
+def measure_bytes_read(dicom_paths, header_only):
+    """Read each DICOM file and tally the bytes pulled off disk
+
+    :param dicom_paths: A list of paths to DICOM files
+    :type  dicom_paths: [str]
+    :param header_only: A boolean flag for reading only the header tags the filters need
+    :type  header_only: boolean
+
+    :return: A list of bytes read per DICOM file
+    :rtype: [int]
+    """
+    bytes_read_per_file = []
+    for dicom_path in dicom_paths:
+        with ByteCountingFile(dicom_path) as dicom_file:
+            if header_only:
+                hlps.read_local_dicom_header(dicom_file)
+            else:
+                pydicom.dcmread(dicom_file)
+            bytes_read_per_file.append(dicom_file.bytes_read)
+
+    return bytes_read_per_file
+
+
+########
+# Main #
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark bytes read per DICOM file: full read vs. header-only.")
+
+    parser.add_argument('-d', '--dicom_dir',
+                        help=f"directory of `i*.MRDC.*` DICOM files to read; synthetic files are used if omitted")
+
+    parser.add_argument('-n', '--n_files', type=int, default=200,
+                        help=f"number of synthetic DICOM files to write")
+
+    parser.add_argument('-p', '--pixels', type=int, default=256,
+                        help=f"rows and columns of each synthetic DICOM image")
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.dicom_dir:
+            rgx_dicom = re.compile(r'^i\d+\.MRDC\.\d+$')
+            dicom_paths = sorted(dir_entry.path for dir_entry in os.scandir(args.dicom_dir)
+                                 if dir_entry.is_file() and re.match(rgx_dicom, dir_entry.name))
+        else:
+            dicom_paths = write_synthetic_dicom_files(tmp_dir, args.n_files, args.pixels, args.pixels)
+
+        n_files = len(dicom_paths)
+        if n_files == 0:
+            print(f"No DICOM files found.")
+            return
+
+        full_bytes = sum(measure_bytes_read(dicom_paths, header_only=False))
+        header_bytes = sum(measure_bytes_read(dicom_paths, header_only=True))
+
+    print(f"DICOM files read:", n_files)
+    print(f"Full read:        ", f"{full_bytes / n_files:12,.0f} bytes/file")
+    print(f"Header-only read: ", f"{header_bytes / n_files:12,.0f} bytes/file")
+    print(f"Reduction:        ", f"{full_bytes / max(header_bytes, 1):12,.1f}x")
+
+
+if __name__ == "__main__":
+    main()
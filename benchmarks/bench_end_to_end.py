@@ -0,0 +1,156 @@
+#!/usr/bin/env Python3
+
+##################
+# Import Modules #
+
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ummap_mri_sync_to_box as main_module
+import ummap_mri_sync_to_box_helpers as hlps
+from bench_prune_dcmread_calls import write_synthetic_session_tree
+from local_box_client import LocalBoxClient
+
+###########
+# Globals #
+
+# Scenarios to run, as a name and the extra command line arguments passed to main()
+scenarios = [
+    ("recursive", []),
+    ("recursive x8", ["--upload_workers", "8"]),
+    ("async", ["--engine", "async", "--upload_workers", "8"]),
+    ("plan x8", ["--engine", "plan", "--upload_workers", "8"]),
+    ("stream x8", ["--engine", "stream", "--upload_workers", "8"]),
+    ("bundle zip", ["--bundle_series", "zip"]),
+]
+
+
+def run_main(box_client, mri_path, box_folder_id, extra_args):
+    """Run main()'s whole pipeline against a stand-in Box client, timing it and counting the Box calls it makes
+
+    :param box_client: A LocalBoxClient for main() to use instead of an authenticated Box client
+    :type  box_client: LocalBoxClient
+    :param mri_path: A path to the synthetic MRI directory to sync
+    :type  mri_path: str
+    :param box_folder_id: An ID of the stand-in Box Folder to sync into
+    :type  box_folder_id: str
+    :param extra_args: Extra command line arguments for main()
+    :type  extra_args: list[str]
+
+    :return: A dict of wall seconds, Box calls by type, bytes uploaded and downloaded, and any error that ended the run
+    :rtype: dict
+    """
+    store = box_client.store
+    calls_before = store.calls.copy()
+    uploaded_before, downloaded_before = store.bytes_uploaded, store.bytes_downloaded
+
+    argv = sys.argv
+    get_box_authenticated_client = hlps.get_box_authenticated_client
+    sys.argv = ["ummap_mri_sync_to_box.py",
+                "-m", mri_path,
+                "-j", "local_box_client",
+                "-b", box_folder_id,
+                "-f", r'^hlp17umm\d{5}_\d{5}$', r'^dicom$', r'^s\d{5}$',
+                "-s", r'^t1sag.*$'] + extra_args
+    hlps.get_box_authenticated_client = lambda *args, **kwargs: box_client
+    error = None
+    started_at = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            main_module.main()
+    except Exception as exception:  # e.g., an injected failure boxsdk would have retried against real Box
+        error = exception
+    finally:
+        wall_seconds = time.perf_counter() - started_at
+        sys.argv = argv
+        hlps.get_box_authenticated_client = get_box_authenticated_client
+
+    return {"wall_seconds": wall_seconds,
+            "calls": store.calls - calls_before,
+            "bytes_uploaded": store.bytes_uploaded - uploaded_before,
+            "bytes_downloaded": store.bytes_downloaded - downloaded_before,
+            "error": error}
+
+
+def print_result(scenario, run, result):
+    calls = result["calls"]
+    print(f"{scenario:<14} {run:<8}",
+          f"{result['wall_seconds']:8.2f} s",
+          f"{sum(calls.values()):6d} calls",
+          f"{result['bytes_uploaded'] / 1024 / 1024:8.2f} MB up",
+          f"{result['bytes_downloaded'] / 1024 / 1024:6.2f} MB down ",
+          "(" + ", ".join(f"{call_type} {count}" for call_type, count in sorted(calls.items())) + ")")
+    if result["error"] is not None:
+        print(f"{'':<23} FAILED:", f"{type(result['error']).__name__}",
+              f"{(str(result['error']).splitlines() or [''])[0]}")
+
+
+########
+# Main #
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Time main()'s whole sync pipeline against a local stand-in for Box.")
+
+    parser.add_argument('--sessions', type=int, default=4,
+                        help=f"number of synthetic session directories")
+
+    parser.add_argument('--series', type=int, default=4,
+                        help=f"number of series directories per session")
+
+    parser.add_argument('--files', type=int, default=50,
+                        help=f"number of DICOM files per series directory")
+
+    parser.add_argument('--latency_ms', type=float, default=20.0,
+                        help=f"milliseconds of injected latency per Box call")
+
+    parser.add_argument('--failure_rate', type=float, default=0.0,
+                        help=f"chance each Box call fails with HTTP 500")
+
+    parser.add_argument('--scenario', nargs='+', choices=[name for name, _ in scenarios],
+                        help=f"scenarios to run; all by default")
+
+    args = parser.parse_args()
+
+    failed_checks = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        mri_path = os.path.join(tmp_dir, "mri")
+        n_files = write_synthetic_session_tree(mri_path, args.sessions, args.series, args.files)
+        print(f"DICOM files in tree:", n_files, f"({args.sessions * args.files} matching)")
+
+        for scenario, extra_args in scenarios:
+            if args.scenario and scenario not in args.scenario:
+                continue
+            box_client = LocalBoxClient(latency=args.latency_ms / 1000.0, failure_rate=args.failure_rate)
+            try:
+                box_folder_id = box_client.create_root_folder("mri-sync")
+                manifest_path = os.path.join(tmp_dir, f"manifest-{scenario.replace(' ', '-')}.sqlite")
+                manifest_args = ["--box_manifest", manifest_path]
+                print_result(scenario, "initial", run_main(box_client, mri_path, box_folder_id,
+                                                           extra_args + manifest_args))
+                rerun_result = run_main(box_client, mri_path, box_folder_id, extra_args + manifest_args)
+                print_result(scenario, "re-run", rerun_result)
+                # Nothing changed since the initial run, whose own writes are in the manifest, so nothing is listed
+                if rerun_result["error"] is None and rerun_result["calls"]["list"] > 0:
+                    failed_checks.append(f"{scenario}: re-run listed {rerun_result['calls']['list']} Box Folders")
+                n_box_files, n_box_folders, n_box_bytes = box_client.store.get_tree_size()
+                print(f"{'':<23} Box holds {n_box_files} files, {n_box_folders} folders,",
+                      f"{n_box_bytes / 1024 / 1024:.2f} MB")
+            finally:
+                box_client.store.cleanup()
+
+    for failed_check in failed_checks:
+        print(f"FAIL:", failed_check)
+    if failed_checks:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
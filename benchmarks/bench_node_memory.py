@@ -0,0 +1,188 @@
+#!/usr/bin/env Python3
+
+##################
+# Import Modules #
+
+import gc
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dir_entry_node as den
+from bench_build_tree import write_synthetic_deep_tree
+
+###########
+# Globals #
+
+rgx_folder = re.compile(r'^hlp17umm\d{5}_\d{5}$|^dicom$|^s\d{5}$')
+rgx_file = re.compile(r'^i\d+\.MRDC\.\d+$')
+
+
+class LegacyDirEntryNode:
+    """The DirEntryNode representation used before compact nodes, kept here for comparison: a live DirEntry, a
+    per-instance `__dict__`, and two plain lists of children"""
+
+    def __init__(self, dir_entry, depth=0):
+        self.dir_entry = dir_entry
+        self.depth = depth
+        self.child_dir_entry_node_folders = []
+        self.child_dir_entry_node_files = []
+        self.series_descrip = None
+
+    def add_child(self, dir_entry_node):
+        if dir_entry_node.dir_entry.is_dir():
+            self.child_dir_entry_node_folders.append(dir_entry_node)
+        if dir_entry_node.dir_entry.is_file():
+            self.child_dir_entry_node_files.append(dir_entry_node)
+
+    def build_tree_from_node(self, rgx_folder, rgx_file):
+        dir_entry_folders, dir_entry_files = den.DirEntryNode.scan_child_dir_entries(self, rgx_folder, rgx_file)
+        for dir_entry_folder in dir_entry_folders:
+            new_dir_entry_node_folder = LegacyDirEntryNode(dir_entry_folder, depth=self.depth + 1)
+            self.add_child(new_dir_entry_node_folder)
+            new_dir_entry_node_folder.build_tree_from_node(rgx_folder, rgx_file)
+        for dir_entry_file in dir_entry_files:
+            self.add_child(LegacyDirEntryNode(dir_entry_file, depth=self.depth + 1))
+
+    def diff_box_subfiles(self, box_subfiles):
+        """The list-based set differences `create_box_subfiles` and `remove_box_subfiles` used to make"""
+        box_subfile_names = [box_subfile.name for box_subfile in box_subfiles]
+        subfiles_in_treeobj_not_in_box = \
+            [den_file for den_file in self.child_dir_entry_node_files
+             if den_file.dir_entry.name not in box_subfile_names]
+        dir_entry_node_subfile_names = [den_file.dir_entry.name for den_file in self.child_dir_entry_node_files]
+        subfiles_in_box_not_in_treeobj = \
+            [box_subfile for box_subfile in box_subfiles if box_subfile.name not in dir_entry_node_subfile_names]
+        return subfiles_in_treeobj_not_in_box, subfiles_in_box_not_in_treeobj
+
+
+def build_tree(node_class, root_path, measure_memory):
+    """Build a tree of `node_class` nodes at `root_path`, timing it or measuring the memory it holds
+
+    :param node_class: DirEntryNode or LegacyDirEntryNode
+    :type  node_class: type
+    :param root_path: A path to the root of the synthetic tree
+    :type  root_path: str
+    :param measure_memory: A boolean flag for tracing allocations, which slows building down
+    :type  measure_memory: boolean
+
+    :return: A tuple of the root node and either seconds taken or bytes held by the tree
+    :rtype: (DirEntryNode/LegacyDirEntryNode, float/int)
+    """
+    root_dir_entry = [dir_entry for dir_entry in os.scandir(os.path.dirname(root_path))
+                      if dir_entry.name == os.path.basename(root_path)][0]
+    gc.collect()
+    if measure_memory:
+        tracemalloc.start()
+    started_at = time.perf_counter()
+    root_node = node_class(root_dir_entry, depth=0)
+    root_node.build_tree_from_node(rgx_folder, rgx_file)
+    if measure_memory:
+        held_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return root_node, held_bytes
+    return root_node, time.perf_counter() - started_at
+
+
+def get_series_nodes(root_node):
+    dir_entry_nodes, series_nodes = [root_node], []
+    while dir_entry_nodes:
+        dir_entry_node = dir_entry_nodes.pop()
+        if dir_entry_node.child_dir_entry_node_files:
+            series_nodes.append(dir_entry_node)
+        dir_entry_nodes.extend(dir_entry_node.child_dir_entry_node_folders)
+    return series_nodes
+
+
+def time_diffs(series_nodes, diff_function):
+    """Time diffing every series node against a Box listing of the same files in reverse order
+
+    :param series_nodes: A list of series nodes
+    :type  series_nodes: [DirEntryNode/LegacyDirEntryNode]
+    :param diff_function: A function taking a series node and a list of Box Files
+    :type  diff_function: function
+
+    :return: Seconds taken
+    :rtype: float
+    """
+    box_listings = [[SimpleNamespace(name=den_file.dir_entry.name, type="file")
+                     for den_file in reversed(series_node.child_dir_entry_node_files)]
+                    for series_node in series_nodes]
+    started_at = time.perf_counter()
+    for series_node, box_subfiles in zip(series_nodes, box_listings):
+        diff_function(series_node, box_subfiles)
+    return time.perf_counter() - started_at
+
+
+def diff_compact(series_node, box_subfiles):
+    """Run `create_box_subfiles` and `remove_box_subfiles` on a listing they find nothing to upload or delete in"""
+    series_node.create_box_subfiles(None, box_subfiles, False, None)
+    series_node.remove_box_subfiles(box_subfiles, False, None)
+
+
+########
+# Main #
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark memory and time of compact vs. legacy DirEntryNode trees.")
+
+    parser.add_argument('--sessions', type=int, default=500,
+                        help=f"number of synthetic session directories")
+
+    parser.add_argument('--series', type=int, default=10,
+                        help=f"number of series directories per session")
+
+    parser.add_argument('--files', type=int, default=200,
+                        help=f"number of files per series directory; the default tree holds 1M files")
+
+    parser.add_argument('--root_path',
+                        help=f"existing synthetic tree to reuse, e.g., from an earlier run with --keep; "
+                             f"a new one is written if omitted")
+
+    parser.add_argument('--keep', metavar='PATH',
+                        help=f"write the synthetic tree to PATH and leave it there for later runs")
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root_path = args.root_path or args.keep or os.path.join(tmp_dir, "mri")
+        if not args.root_path:
+            started_at = time.perf_counter()
+            write_synthetic_deep_tree(root_path, args.sessions, args.series, args.files)
+            print(f"Wrote {args.sessions * args.series * args.files} files in",
+                  f"{time.perf_counter() - started_at:.1f} s")
+
+        results = {}
+        for label, node_class in [("legacy", LegacyDirEntryNode), ("compact", den.DirEntryNode)]:
+            root_node, held_bytes = build_tree(node_class, root_path, measure_memory=True)
+            del root_node
+            root_node, build_seconds = build_tree(node_class, root_path, measure_memory=False)
+            series_nodes = get_series_nodes(root_node)
+            n_files = sum(len(series_node.child_dir_entry_node_files) for series_node in series_nodes)
+            diff_function = LegacyDirEntryNode.diff_box_subfiles if node_class is LegacyDirEntryNode else diff_compact
+            diff_seconds = time_diffs(series_nodes, diff_function)
+            results[label] = (held_bytes, build_seconds, diff_seconds)
+            print(f"{label:<8}",
+                  f"{n_files} files,",
+                  f"{held_bytes / 1024 / 1024:8.1f} MB held ({held_bytes / n_files:5.0f} B/file),",
+                  f"build {build_seconds:6.2f} s,",
+                  f"Box diffs {diff_seconds:6.2f} s")
+            del root_node, series_nodes
+            gc.collect()
+
+        print(f"Compact vs. legacy:",
+              f"{results['legacy'][0] / results['compact'][0]:.1f}x less memory,",
+              f"{results['legacy'][1] / results['compact'][1]:.1f}x faster build,",
+              f"{results['legacy'][2] / results['compact'][2]:.1f}x faster Box diffs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env Python3
+
+##################
+# Import Modules #
+
+import os
+import re
+import sys
+import argparse
+import tempfile
+
+import pydicom
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ummap_mri_sync_to_box_helpers as hlps
+import dir_entry_node as den
+import dicom_classifier as dcl
+from bench_dicom_header_reads import write_synthetic_dicom_files
+
+
+class DcmreadCallCounter:
+    """A stand-in for `pydicom.dcmread` that counts how many times it is called, and on how many distinct files"""
+
+    def __init__(self, dcmread):
+        """Instantiation method for DcmreadCallCounter class
+
+        :param dcmread: The original `pydicom.dcmread` function to delegate to
+        :type  dcmread: function
+        """
+        self.dcmread = dcmread
+        self.calls = 0
+        self.paths = set()
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        self.paths.add(args[0] if args else kwargs.get("fp"))
+        return self.dcmread(*args, **kwargs)
+
+
+def write_synthetic_session_tree(root_path, n_sessions, n_series, n_files, depth=0):
+    """Write `hlp17umm#####_#####/dicom/s#####` sessions whose last series is the only one matching `^t1sag.*$`
+
+    The sessions are nested `depth` grouping folders deep, `g01/g02/...`, since the legacy prune searches again at
+    every level and so reads more files the deeper the matching series are.
+
+    :param root_path: A path to the directory to write the sessions into
+    :type  root_path: str
+    :param n_sessions: A number of session directories to write
+    :type  n_sessions: int
+    :param n_series: A number of series directories to write in each session
+    :type  n_series: int
+    :param n_files: A number of DICOM files to write in each series
+    :type  n_files: int
+    :param depth: A number of grouping folders to nest the sessions under
+    :type  depth: int, optional
+
+    :return: A number of DICOM files written
+    :rtype: int
+    """
+    for session_number in range(1, n_sessions + 1):
+        for series_number in range(1, n_series + 1):
+            series_path = os.path.join(root_path,
+                                       *[f"g{level:02d}" for level in range(1, depth + 1)],
+                                       f"hlp17umm{session_number:05d}_{session_number:05d}",
+                                       "dicom",
+                                       f"s{series_number:05d}")
+            os.makedirs(series_path)
+            series_descrip = "t1sag_208" if series_number == n_series else "localizer"
+            write_synthetic_dicom_files(series_path, n_files, 8, 8, series_descrip)
+
+    return n_sessions * n_series * n_files
+
+
+def legacy_prune_nodes_without_dicom_dataset_series_descrip(dir_entry_node, rgx_sequence):
+    """The search-then-recurse pruning that ran before the single post-order pass, kept here for comparison
+
+    :param dir_entry_node: A DirEntryNode object to prune below
+    :type  dir_entry_node: DirEntryNode
+    :param rgx_sequence: A Regex for matching a DICOM Dataset Series Description
+    :type  rgx_sequence: Regex
+    """
+    for dir_entry_node_folder in dir_entry_node.child_dir_entry_node_folders:
+        if dir_entry_node_folder.search_at_or_below_for_dicom_dataset_series_descrip(rgx_sequence):
+            legacy_prune_nodes_without_dicom_dataset_series_descrip(dir_entry_node_folder, rgx_sequence)
+        else:
+            dir_entry_node.remove_child(dir_entry_node_folder)
+
+
+def build_session_tree(root_path):
+    """Build a DirEntryNode tree of the synthetic sessions at `root_path`
+
+    :param root_path: A path to the root of the synthetic session tree
+    :type  root_path: str
+
+    :return: A root DirEntryNode object
+    :rtype: DirEntryNode
+    """
+    root_dir_entry = [dir_entry for dir_entry in os.scandir(os.path.dirname(root_path))
+                      if dir_entry.name == os.path.basename(root_path)][0]
+    root_node = den.DirEntryNode(root_dir_entry, depth=0)
+    root_node.build_tree_from_node(re.compile(r'^g\d{2}$|^hlp17umm\d{5}_\d{5}$|^dicom$|^s\d{5}$'),
+                                   re.compile(r'^i\d+\.MRDC\.\d+$'))
+    return root_node
+
+
+def count_dcmread_calls(root_path, prune_function, rgx_sequence):
+    """Build a DirEntryNode tree at `root_path`, prune it with `prune_function`, and count `pydicom.dcmread` calls
+    and the distinct files they opened
+
+    :param root_path: A path to the root of the synthetic session tree
+    :type  root_path: str
+    :param prune_function: A function taking a root DirEntryNode object and a Regex
+    :type  prune_function: function
+    :param rgx_sequence: A Regex for matching a DICOM Dataset Series Description
+    :type  rgx_sequence: Regex
+
+    :return: A tuple of the numbers of `pydicom.dcmread` calls made while pruning and of distinct files opened
+    :rtype: (int, int)
+    """
+    root_node = build_session_tree(root_path)
+
+    dcmread = pydicom.dcmread
+    pydicom.dcmread = counter = DcmreadCallCounter(dcmread)
+    try:
+        prune_function(root_node, rgx_sequence)
+    finally:
+        pydicom.dcmread = dcmread
+
+    return counter.calls, len(counter.paths)
+
+
+def count_headers_parsed_with_classify(root_path, rgx_sequence, classify_workers):
+    """Build a DirEntryNode tree at `root_path`, classify it on `classify_workers` processes, then prune it
+
+    Headers parsed in worker processes aren't seen by a patched `pydicom.dcmread`, so classifying is counted by
+    `classify_tree`'s return and pruning by the helpers' in-process count.
+
+    :param root_path: A path to the root of the synthetic session tree
+    :type  root_path: str
+    :param rgx_sequence: A Regex for matching a DICOM Dataset Series Description
+    :type  rgx_sequence: Regex
+    :param classify_workers: A number of worker processes to classify on
+    :type  classify_workers: int
+
+    :return: A tuple of the numbers of DICOM headers parsed while classifying and while pruning afterwards
+    :rtype: (int, int)
+    """
+    root_node = build_session_tree(root_path)
+    n_classify_parsed = dcl.classify_tree(root_node, rgx_sequence, classify_workers=classify_workers)
+    dicom_headers_parsed_before = hlps.dicom_headers_parsed
+    root_node.prune_tree_post_order(rgx_sequence)
+    return n_classify_parsed, hlps.dicom_headers_parsed - dicom_headers_parsed_before
+
+
+########
+# Main #
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Count `pydicom.dcmread` calls made by each pruning mode.")
+
+    parser.add_argument('--sessions', type=int, default=4,
+                        help=f"number of synthetic session directories")
+
+    parser.add_argument('--series', type=int, default=6,
+                        help=f"number of series directories per session")
+
+    parser.add_argument('--files', type=int, default=20,
+                        help=f"number of DICOM files per series directory")
+
+    parser.add_argument('--depth', type=int, default=3,
+                        help=f"number of grouping folders the sessions are nested under")
+
+    parser.add_argument('--series_sample_size', type=int, default=1,
+                        help=f"number of DICOM headers read per series directory in series-sampled mode")
+
+    parser.add_argument('--classify_workers', type=int, default=4,
+                        help=f"number of worker processes to classify on before pruning")
+
+    args = parser.parse_args()
+
+    rgx_sequence = re.compile(r'^t1sag.*$')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root_path = os.path.join(tmp_dir, "mri")
+        n_files = write_synthetic_session_tree(root_path, args.sessions, args.series, args.files, args.depth)
+
+        legacy_calls, _ = count_dcmread_calls(root_path, legacy_prune_nodes_without_dicom_dataset_series_descrip,
+                                              rgx_sequence)
+        post_order_calls, post_order_files = count_dcmread_calls(root_path, den.DirEntryNode.prune_tree_post_order,
+                                                                 rgx_sequence)
+        series_sampled_calls, _ = count_dcmread_calls(
+            root_path,
+            lambda node, rgx: node.prune_tree_post_order(rgx, series_sample_size=args.series_sample_size),
+            rgx_sequence)
+        classify_parsed, classified_prune_parsed = count_headers_parsed_with_classify(root_path, rgx_sequence,
+                                                                                      args.classify_workers)
+
+    print(f"DICOM files in tree:     ", n_files)
+    print(f"Legacy dcmread calls:    ", legacy_calls)
+    print(f"Post-order dcmread calls:", post_order_calls, f"on {post_order_files} distinct files")
+    print(f"Series-sampled calls:    ", series_sampled_calls)
+    print(f"Classify-then-prune:     ", classify_parsed, f"parsed on {args.classify_workers} worker(s),",
+          classified_prune_parsed, f"while pruning")
+    if post_order_calls != post_order_files:
+        print(f"FAIL: post-order pruning made {post_order_calls} dcmread calls on {post_order_files} distinct files")
+        sys.exit(1)
+    if legacy_calls <= post_order_calls:
+        print(f"FAIL: legacy pruning made {legacy_calls} dcmread calls, no more than post-order's {post_order_calls}")
+        sys.exit(1)
+    if classified_prune_parsed != 0:
+        print(f"FAIL: pruning parsed DICOM headers that classifying should have")
+        sys.exit(1)
+    if classify_parsed != post_order_calls:
+        print(f"FAIL: classifying parsed {classify_parsed} DICOM headers, not the {post_order_calls} pruning needs")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
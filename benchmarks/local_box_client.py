@@ -0,0 +1,440 @@
+#!/usr/bin/env Python3
+
+##################
+# Import Modules #
+
+import os
+import time
+import random
+import shutil
+import hashlib
+import tempfile
+import itertools
+import threading
+from collections import Counter
+from datetime import datetime
+
+from boxsdk.exception import BoxAPIException
+from pytz import timezone
+
+###########
+# Globals #
+
+# Box timestamps in the stand-in are US Eastern, like the real account's
+tz_east = timezone("US/Eastern")
+
+# Part size handed out by stand-in upload sessions
+default_part_size = 8 * 1024 * 1024
+
+# Fields the stand-in keeps for every Box item, as the real API returns them
+box_item_fields = ["type", "id", "name", "size", "sha1", "modified_at", "etag", "sequence_id"]
+
+
+class LocalBoxStore:
+    """The state behind a LocalBoxClient: file contents in a temp directory, everything else in memory
+
+    Every Box call the client serves goes through `call`, which counts it by type, sleeps for the injected latency,
+    and raises an injected failure at the configured rate before the call changes anything.
+    """
+
+    def __init__(self, latency=None, failure_rate=None, failure_status=500, seed=0, part_size=default_part_size):
+        """Instantiation method for LocalBoxStore class
+
+        :param latency: Seconds each call sleeps, as one number or a dict of call type to seconds
+        :type  latency: float/dict[str, float], optional
+        :param failure_rate: A chance each call fails, as one number or a dict of call type to chance
+        :type  failure_rate: float/dict[str, float], optional
+        :param failure_status: An HTTP status injected failures raise BoxAPIException with, e.g., 429 or 500
+        :type  failure_status: int, optional
+        :param seed: A seed for the failure injection's random number generator
+        :type  seed: int, optional
+        :param part_size: A part size for upload sessions
+        :type  part_size: int, optional
+        """
+        self.root_path = tempfile.mkdtemp(prefix="local-box-")
+        self.latency = latency or 0.0
+        self.failure_rate = failure_rate or 0.0
+        self.failure_status = failure_status
+        self.rng = random.Random(seed)
+        self.part_size = part_size
+        self.lock = threading.RLock()
+        self.ids = itertools.count(1)
+
+        self.items = {}  # Box item ID -> record dict, kept after deletion with "trashed" set
+        self.children = {"0": {}}  # Box Folder ID -> {subitem name: Box item ID}
+        self.items["0"] = {"type": "folder", "id": "0", "name": "All Files", "parent_id": None, "size": 0,
+                           "sha1": None, "modified_at": self.now(), "etag": "0", "sequence_id": "0", "trashed": False}
+        self.upload_sessions = {}  # upload session ID -> session dict with its parts
+        self.events = []  # (Box item ID, parent Box Folder ID) per change
+
+        self.calls = Counter()
+        self.failures = Counter()
+        self.bytes_uploaded = 0
+        self.bytes_downloaded = 0
+
+    @staticmethod
+    def now():
+        return datetime.now(tz_east).isoformat(timespec="seconds")
+
+    def get_setting(self, setting, call_type):
+        return setting.get(call_type, 0.0) if isinstance(setting, dict) else setting
+
+    def call(self, call_type):
+        """Count a Box call, sleep for its injected latency, and maybe raise an injected failure
+
+        :param call_type: A kind of Box call, e.g., "list", "mkdir", "upload", "update", or "delete"
+        :type  call_type: str
+        """
+        with self.lock:
+            self.calls[call_type] += 1
+            is_failure = self.rng.random() < self.get_setting(self.failure_rate, call_type)
+            if is_failure:
+                self.failures[call_type] += 1
+        latency = self.get_setting(self.latency, call_type)
+        if latency:
+            time.sleep(latency)
+        if is_failure:
+            raise BoxAPIException(self.failure_status, code="injected_failure",
+                                  message=f"Injected failure of '{call_type}' call",
+                                  headers={"Retry-After": "0"} if self.failure_status == 429 else {})
+
+    def add_item(self, item_type, name, parent_id, data=None):
+        """Add a Box File or Folder to a Box Folder, raising a 409 like Box if the name is taken
+
+        :return: The new Box item's record
+        :rtype: dict
+        """
+        with self.lock:
+            if name in self.children[parent_id]:
+                raise BoxAPIException(409, code="item_name_in_use", message="Item with the same name already exists",
+                                      context_info={"conflicts": [{"id": self.children[parent_id][name]}]})
+            item_id = str(next(self.ids))
+            record = {"type": item_type, "id": item_id, "name": name, "parent_id": parent_id, "size": 0,
+                      "sha1": None, "modified_at": self.now(), "etag": "0", "sequence_id": "0", "trashed": False}
+            self.items[item_id] = record
+            self.children[parent_id][name] = item_id
+            if item_type == "folder":
+                self.children[item_id] = {}
+            else:
+                self.write_contents(record, data)
+            self.events.append((item_id, parent_id))
+            return record
+
+    def write_contents(self, record, data):
+        """Write a Box File's contents to the temp directory and update its size, SHA-1, and version"""
+        with open(os.path.join(self.root_path, record["id"]), 'wb') as blob_file:
+            blob_file.write(data)
+        with self.lock:
+            record["size"] = len(data)
+            record["sha1"] = hashlib.sha1(data).hexdigest()
+            record["modified_at"] = self.now()
+            self.bytes_uploaded += len(data)
+
+    def update_contents(self, item_id, data):
+        with self.lock:
+            record = self.get_record(item_id)
+            self.write_contents(record, data)
+            record["etag"] = record["sequence_id"] = str(int(record["etag"]) + 1)
+            self.events.append((item_id, record["parent_id"]))
+            return record
+
+    def read_contents(self, item_id):
+        with open(os.path.join(self.root_path, self.get_record(item_id)["id"]), 'rb') as blob_file:
+            data = blob_file.read()
+        with self.lock:
+            self.bytes_downloaded += len(data)
+        return data
+
+    def delete_item(self, item_id, recursive=False):
+        with self.lock:
+            record = self.get_record(item_id)
+            if record["type"] == "folder":
+                if self.children[item_id] and not recursive:
+                    raise BoxAPIException(400, code="folder_not_empty", message="Folder is not empty")
+                for child_id in list(self.children[item_id].values()):
+                    self.delete_item(child_id, recursive=True)
+            del self.children[record["parent_id"]][record["name"]]
+            record["trashed"] = True
+            record["etag"] = record["sequence_id"] = str(int(record["etag"]) + 1)  # as Box does on trashing
+            self.events.append((item_id, record["parent_id"]))
+            return True
+
+    def get_record(self, item_id):
+        record = self.items.get(item_id)
+        if record is None or record["trashed"]:
+            raise BoxAPIException(404, code="not_found", message="Not Found")
+        return record
+
+    def make_item(self, record):
+        """Make a stand-in Box File or Folder object for a record"""
+        return (LocalBoxFolder if record["type"] == "folder" else LocalBoxFile)(self, record["id"])
+
+    def list_folder(self, folder_id):
+        with self.lock:
+            self.get_record(folder_id)
+            return [self.items[item_id] for _, item_id in sorted(self.children[folder_id].items())]
+
+    def get_tree_size(self):
+        """Get a count of Box Files and Folders held, and their total bytes, for checking a sync's result
+
+        :return: A tuple of Box File count, Box Folder count (without the root), and bytes
+        :rtype: (int, int, int)
+        """
+        with self.lock:
+            live_records = [record for record in self.items.values() if not record["trashed"] and record["id"] != "0"]
+            return (sum(record["type"] == "file" for record in live_records),
+                    sum(record["type"] == "folder" for record in live_records),
+                    sum(record["size"] for record in live_records if record["type"] == "file"))
+
+    def cleanup(self):
+        shutil.rmtree(self.root_path, ignore_errors=True)
+
+
+class LocalBoxTranslator:
+    """Rebuilds stand-in Box objects from response-like dicts, like boxsdk's Translator"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def translate(self, session, response_object):
+        if response_object["type"] == "upload_session":
+            return LocalBoxUploadSession(self.store, response_object["id"])
+        return self.store.make_item(response_object)
+
+
+class LocalBoxItem:
+    """A stand-in Box File or Folder; its fields are read live from the LocalBoxStore"""
+
+    def __init__(self, store, object_id):
+        self.store = store
+        self.object_id = object_id
+        self.id = object_id
+
+    def __getattr__(self, field):
+        if field in box_item_fields or field == "parent":
+            record = self.store.items.get(self.__dict__["object_id"])
+            if record is None:
+                raise AttributeError(field)
+            if field == "parent":
+                return LocalBoxFolder(self.store, record["parent_id"]) if record["parent_id"] else None
+            return record[field]
+        raise AttributeError(field)
+
+    @property
+    def translator(self):
+        return LocalBoxTranslator(self.store)
+
+    @property
+    def session(self):
+        return None
+
+    def delete(self, recursive=False):
+        self.store.call("delete")
+        return self.store.delete_item(self.object_id, recursive=recursive)
+
+
+class LocalBoxFolder(LocalBoxItem):
+    """A stand-in Box Folder"""
+
+    type = "folder"
+
+    def get(self, fields=None):
+        self.store.call("get_folder")
+        self.store.get_record(self.object_id)
+        return self
+
+    def get_items(self, limit=None, offset=0, fields=None, **kwargs):
+        self.store.call("list")
+        return [self.store.make_item(record) for record in self.store.list_folder(self.object_id)]
+
+    def create_subfolder(self, name):
+        self.store.call("mkdir")
+        return LocalBoxFolder(self.store, self.store.add_item("folder", name, self.object_id)["id"])
+
+    def upload(self, file_path, file_name=None, preflight_check=False, **kwargs):
+        self.store.call("upload")
+        with open(file_path, 'rb') as local_file:
+            data = local_file.read()
+        record = self.store.add_item("file", file_name or os.path.basename(file_path), self.object_id, data)
+        return LocalBoxFile(self.store, record["id"])
+
+    def upload_stream(self, file_stream, file_name, preflight_check=False, **kwargs):
+        self.store.call("upload")
+        record = self.store.add_item("file", file_name, self.object_id, file_stream.read())
+        return LocalBoxFile(self.store, record["id"])
+
+    def create_upload_session(self, file_size, file_name, **kwargs):
+        self.store.call("upload_session")
+        return LocalBoxUploadSession.create(self.store, file_size, file_name=file_name, folder_id=self.object_id)
+
+
+class LocalBoxFile(LocalBoxItem):
+    """A stand-in Box File"""
+
+    type = "file"
+
+    def get(self, fields=None):
+        self.store.call("get_file")
+        self.store.get_record(self.object_id)
+        return self
+
+    def update_contents(self, file_path, preflight_check=False, **kwargs):
+        self.store.call("update")
+        with open(file_path, 'rb') as local_file:
+            self.store.update_contents(self.object_id, local_file.read())
+        return LocalBoxFile(self.store, self.object_id)
+
+    def update_contents_with_stream(self, file_stream, **kwargs):
+        self.store.call("update")
+        self.store.update_contents(self.object_id, file_stream.read())
+        return LocalBoxFile(self.store, self.object_id)
+
+    def content(self, **kwargs):
+        self.store.call("download")
+        return self.store.read_contents(self.object_id)
+
+    def create_upload_session(self, file_size, file_name=None, **kwargs):
+        self.store.call("upload_session")
+        return LocalBoxUploadSession.create(self.store, file_size, file_id=self.object_id)
+
+
+class LocalBoxUploadSession:
+    """A stand-in Box UploadSession whose parts are held in memory until commit"""
+
+    def __init__(self, store, session_id):
+        self.store = store
+        self.object_id = session_id
+        self.id = session_id
+
+    @classmethod
+    def create(cls, store, file_size, file_name=None, folder_id=None, file_id=None):
+        with store.lock:
+            session_id = f"session-{next(store.ids)}"
+            store.upload_sessions[session_id] = {
+                "type": "upload_session", "id": session_id, "part_size": store.part_size,
+                "total_parts": -(-file_size // store.part_size), "file_size": file_size,
+                "file_name": file_name, "folder_id": folder_id, "file_id": file_id, "parts": {}}
+        return cls(store, session_id)
+
+    def get_session(self):
+        upload_session = self.store.upload_sessions.get(self.object_id)
+        if upload_session is None:
+            raise BoxAPIException(404, code="not_found", message="Upload session not found")
+        return upload_session
+
+    @property
+    def part_size(self):
+        return self.get_session()["part_size"]
+
+    @property
+    def total_parts(self):
+        return self.get_session()["total_parts"]
+
+    def __iter__(self):
+        return iter(["type", "id", "part_size", "total_parts"])
+
+    def __getitem__(self, field):
+        return self.get_session()[field]
+
+    def upload_part_bytes(self, part_bytes, offset, total_size, part_content_sha1=None):
+        self.store.call("upload_part")
+        with self.store.lock:
+            self.get_session()["parts"][offset] = bytes(part_bytes)
+            self.store.bytes_uploaded += len(part_bytes)
+        return {"part_id": f"{offset:016x}", "offset": offset, "size": len(part_bytes),
+                "sha1": hashlib.sha1(part_bytes).hexdigest()}
+
+    def commit(self, content_sha1, parts=None, file_attributes=None, etag=None):
+        self.store.call("commit")
+        upload_session = self.get_session()
+        data = b"".join(upload_session["parts"][part["offset"]] for part in parts)
+        if hashlib.sha1(data).digest() != content_sha1 or len(data) != upload_session["file_size"]:
+            raise BoxAPIException(412, code="sha1_mismatch", message="Committed parts don't match the file")
+        with self.store.lock:
+            self.store.bytes_uploaded -= len(data)  # counted once already, as parts
+            del self.store.upload_sessions[self.object_id]
+        if upload_session["file_id"] is not None:
+            record = self.store.update_contents(upload_session["file_id"], data)
+        else:
+            record = self.store.add_item("file", upload_session["file_name"], upload_session["folder_id"], data)
+        return LocalBoxFile(self.store, record["id"])
+
+    def abort(self):
+        self.store.call("abort")
+        with self.store.lock:
+            return self.store.upload_sessions.pop(self.object_id, None) is not None
+
+
+class LocalBoxEvent:
+    """A stand-in Box event; only its source is used"""
+
+    def __init__(self, source):
+        self.source = source
+
+
+class LocalBoxEvents:
+    """A stand-in Box events stream: one event per change, positioned by index"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def get_latest_stream_position(self):
+        self.store.call("events")
+        with self.store.lock:
+            return len(self.store.events)
+
+    def get_events(self, limit=100, stream_position=0, **kwargs):
+        self.store.call("events")
+        with self.store.lock:
+            stream_position = int(stream_position)
+            events_slice = self.store.events[stream_position:stream_position + limit]
+        entries = [LocalBoxEvent(self.store.make_item(self.store.items[item_id])) for item_id, _ in events_slice]
+        return {"entries": entries, "next_stream_position": stream_position + len(events_slice)}
+
+
+class LocalBoxClient:
+    """A stand-in for an authenticated boxsdk Client, serving the calls this tool makes from a LocalBoxStore
+
+    It covers `folder(...).get`, `get_items`, `create_subfolder`, `upload`, `upload_stream`, `update_contents`,
+    `update_contents_with_stream`, `content`, `delete`, upload sessions, and the events stream. Store counters report
+    API calls by type and bytes moved.
+    """
+
+    def __init__(self, store=None, **store_kwargs):
+        """Instantiation method for LocalBoxClient class
+
+        :param store: A LocalBoxStore to serve calls from; a new one is made from `store_kwargs` if None
+        :type  store: LocalBoxStore, optional
+        """
+        self.store = store or LocalBoxStore(**store_kwargs)
+
+    @property
+    def translator(self):
+        return LocalBoxTranslator(self.store)
+
+    @property
+    def session(self):
+        return None
+
+    def folder(self, folder_id):
+        return LocalBoxFolder(self.store, folder_id)
+
+    def file(self, file_id):
+        return LocalBoxFile(self.store, file_id)
+
+    def upload_session(self, session_id):
+        return LocalBoxUploadSession(self.store, session_id)
+
+    def events(self):
+        return LocalBoxEvents(self.store)
+
+    def create_root_folder(self, name):
+        """Create a Box Folder under "All Files" without counting it as a call, to sync into
+
+        :param name: A name for the Box Folder
+        :type  name: str
+
+        :return: The new Box Folder's ID
+        :rtype: str
+        """
+        return self.store.add_item("folder", name, "0")["id"]
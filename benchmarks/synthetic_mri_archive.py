@@ -0,0 +1,261 @@
+#!/usr/bin/env Python3
+
+##################
+# Import Modules #
+
+import io
+import os
+import math
+import random
+import argparse
+
+from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, MRImageStorage
+
+###########
+# Globals #
+
+# Default Series Description weights, roughly as often as each shows up in a UMMAP MRI session
+default_series_descrips = {
+    "3Plane_Loc": 2.0,
+    "ASSET_calibration": 1.0,
+    "t1sag_208": 1.0,
+    "t2flairsag": 1.0,
+    "rsfMRI": 1.0,
+    "DTI_64dir": 1.0,
+    "SWI": 0.5,
+}
+
+# Series Descriptions that look like synced sequences but don't match `^t1sag.*$|^t2flairsag.*$`
+default_decoy_series_descrips = ["ax_t1sag_208", "T1SAG_208", "sag_t2flair", "t1_sag_mprage", "t2flair_ax"]
+
+# Series Description stamped on oversized series; it matches, so only the item-count cutoff keeps them out
+oversized_series_descrip = "t1sag_208"
+
+# Number of files in an oversized series; `build_tree_from_node` skips series directories with 250 or more items
+default_oversized_files = 260
+
+# Width of the zero-padded instance number in each file's SOP Instance UID and Instance Number, fixed so a series
+# template's bytes can be patched per file without re-encoding
+instance_number_width = 6
+
+
+def parse_weights(weights_string):
+    """Parse Series Description weights like "t1sag_208=1,localizer=2.5" into a dict
+
+    :param weights_string: Comma-separated `description=weight` pairs
+    :type  weights_string: str
+
+    :return: A dict of Series Description to weight
+    :rtype: dict[str, float]
+    """
+    weights = {}
+    for pair in weights_string.split(","):
+        descrip, _, weight = pair.partition("=")
+        weights[descrip.strip()] = float(weight) if weight else 1.0
+    return weights
+
+
+def make_series_template(series_uid, series_descrip, payload_bytes):
+    """Encode one tiny but valid MR DICOM file for a series, with placeholder instance fields
+
+    :param series_uid: A Series Instance UID; SOP Instance UIDs are made by appending a fixed-width number to it
+    :type  series_uid: str
+    :param series_descrip: A Series Description
+    :type  series_descrip: str
+    :param payload_bytes: A size of the 16-bit pixel payload; the image is made about square to hold it
+    :type  payload_bytes: int
+
+    :return: A tuple of the template bytes and the placeholder SOP Instance UID and Instance Number bytes
+    :rtype: (bytes, bytes, bytes)
+    """
+    n_pixels = max(1, payload_bytes // 2)
+    cols = max(1, int(math.sqrt(n_pixels)))
+    rows = max(1, n_pixels // cols)
+    placeholder_number = f"{1:0{instance_number_width}d}"
+    instance_uid = f"{series_uid}.1{placeholder_number}"  # a leading 1, since UID components can't start with 0
+
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = MRImageStorage
+    file_meta.MediaStorageSOPInstanceUID = instance_uid
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = FileDataset("template", {}, file_meta=file_meta, preamble=b"\0" * 128)
+    ds.SOPClassUID = MRImageStorage
+    ds.SOPInstanceUID = instance_uid
+    ds.SeriesInstanceUID = series_uid
+    ds.Modality = "MR"
+    ds.Manufacturer = "GE MEDICAL SYSTEMS"
+    ds.SeriesDescription = series_descrip
+    ds.InstanceNumber = placeholder_number
+    ds.Rows, ds.Columns = rows, cols
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated, ds.BitsStored, ds.HighBit = 16, 16, 15
+    ds.PixelRepresentation = 0
+    ds.PixelData = bytes(rows * cols * 2)
+
+    template_file = io.BytesIO()
+    ds.save_as(template_file, enforce_file_format=True)
+    return template_file.getvalue(), instance_uid.encode(), b"IS" + len(placeholder_number).to_bytes(2, "little") + \
+        placeholder_number.encode()
+
+
+def write_series(series_path, n_files, series_descrip, payload_bytes, rng):
+    """Write a series directory of `i*.MRDC.*` DICOM files that differ only in their instance fields
+
+    :param series_path: A path to the series directory to create
+    :type  series_path: str
+    :param n_files: A number of DICOM files to write
+    :type  n_files: int
+    :param series_descrip: A Series Description to stamp on each DICOM file
+    :type  series_descrip: str
+    :param payload_bytes: A size of each file's pixel payload
+    :type  payload_bytes: int
+    :param rng: A random number generator, so an archive can be written again exactly
+    :type  rng: random.Random
+
+    :return: A number of bytes written
+    :rtype: int
+    """
+    os.makedirs(series_path)
+    series_uid = f"2.25.{rng.getrandbits(96)}"
+    template, placeholder_uid, placeholder_number = make_series_template(series_uid, series_descrip, payload_bytes)
+    file_number = rng.randrange(10000000, 90000000)
+
+    for instance_number in range(1, n_files + 1):
+        number = f"{instance_number:0{instance_number_width}d}"
+        dicom_bytes = template.replace(placeholder_uid, f"{series_uid}.1{number}".encode()) \
+            .replace(placeholder_number, placeholder_number[:4] + number.encode())
+        with open(os.path.join(series_path, f"i{file_number + instance_number}.MRDC.{instance_number}"), 'wb') \
+                as dicom_file:
+            dicom_file.write(dicom_bytes)
+
+    return n_files * len(template)
+
+
+def write_synthetic_archive(root_path, n_sessions, series_per_session=8, files_per_series=200, payload_bytes=128,
+                            series_descrips=None, decoy_fraction=0.0, oversized_fraction=0.0,
+                            oversized_files=default_oversized_files, seed=0):
+    """Write a synthetic MRI archive of `hlp17umm#####_#####/dicom/s#####/i*.MRDC.*` sessions
+
+    Each series gets a Series Description drawn from `series_descrips` by weight. Then a `decoy_fraction` share of
+    series is given a Series Description that looks like a synced sequence but doesn't match, and an
+    `oversized_fraction` share is given a matching Series Description and `oversized_files` files.
+
+    :param root_path: A path to the archive directory to create
+    :type  root_path: str
+    :param n_sessions: A number of session directories to write
+    :type  n_sessions: int
+    :param series_per_session: A number of series directories per session
+    :type  series_per_session: int, optional
+    :param files_per_series: A number of DICOM files per ordinary series
+    :type  files_per_series: int, optional
+    :param payload_bytes: A size of each file's pixel payload
+    :type  payload_bytes: int, optional
+    :param series_descrips: A dict of Series Description to weight; `default_series_descrips` if None
+    :type  series_descrips: dict[str, float], optional
+    :param decoy_fraction: A share of series given decoy Series Descriptions
+    :type  decoy_fraction: float, optional
+    :param oversized_fraction: A share of series made oversized
+    :type  oversized_fraction: float, optional
+    :param oversized_files: A number of DICOM files per oversized series
+    :type  oversized_files: int, optional
+    :param seed: A seed for the random number generator, so the same arguments write the same archive
+    :type  seed: int, optional
+
+    :return: A dict counting sessions, series, files, and bytes written, and series per Series Description and kind
+    :rtype: dict
+    """
+    series_descrips = series_descrips or default_series_descrips
+    descrips, weights = list(series_descrips), list(series_descrips.values())
+    rng = random.Random(seed)
+    summary = {"sessions": n_sessions, "series": 0, "files": 0, "bytes": 0,
+               "decoy_series": 0, "oversized_series": 0, "series_by_descrip": {}}
+
+    for session_index in range(n_sessions):
+        session_name = f"hlp17umm{rng.randrange(100000):05d}_{session_index + 1:05d}"
+        for series_number in range(1, series_per_session + 1):
+            series_path = os.path.join(root_path, session_name, "dicom", f"s{series_number:05d}")
+            kind_draw = rng.random()
+            if kind_draw < oversized_fraction:
+                series_descrip, n_files = oversized_series_descrip, oversized_files
+                summary["oversized_series"] += 1
+            elif kind_draw < oversized_fraction + decoy_fraction:
+                series_descrip, n_files = rng.choice(default_decoy_series_descrips), files_per_series
+                summary["decoy_series"] += 1
+            else:
+                series_descrip, n_files = rng.choices(descrips, weights)[0], files_per_series
+            summary["bytes"] += write_series(series_path, n_files, series_descrip, payload_bytes, rng)
+            summary["series"] += 1
+            summary["files"] += n_files
+            summary["series_by_descrip"][series_descrip] = summary["series_by_descrip"].get(series_descrip, 0) + 1
+
+    return summary
+
+
+########
+# Main #
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Write a synthetic MRI archive of tiny but valid DICOM files.")
+
+    parser.add_argument('root_path',
+                        help=f"directory to write the archive into; it must not exist yet")
+
+    parser.add_argument('--sessions', type=int, default=100,
+                        help=f"number of `hlp17umm#####_#####` session directories")
+
+    parser.add_argument('--series', type=int, default=8,
+                        help=f"number of `s#####` series directories per session")
+
+    parser.add_argument('--files', type=int, default=200,
+                        help=f"number of `i*.MRDC.*` DICOM files per series directory")
+
+    parser.add_argument('--payload_bytes', type=int, default=128,
+                        help=f"bytes of pixel data in each DICOM file")
+
+    parser.add_argument('--series_descrips',
+                        help=f"comma-separated `description=weight` pairs to draw Series Descriptions from; "
+                             f"default: {','.join(f'{d}={w}' for d, w in default_series_descrips.items())}")
+
+    parser.add_argument('--decoy_fraction', type=float, default=0.05,
+                        help=f"share of series given Series Descriptions that look synced but don't match")
+
+    parser.add_argument('--oversized_fraction', type=float, default=0.02,
+                        help=f"share of series given {default_oversized_files}+ files, tripping the 250-item cutoff")
+
+    parser.add_argument('--oversized_files', type=int, default=default_oversized_files,
+                        help=f"number of DICOM files per oversized series")
+
+    parser.add_argument('--seed', type=int, default=0,
+                        help=f"random seed; the same arguments write the same archive")
+
+    args = parser.parse_args()
+
+    if os.path.exists(args.root_path):
+        parser.error(f"{args.root_path} already exists")
+
+    summary = write_synthetic_archive(args.root_path, args.sessions,
+                                      series_per_session=args.series,
+                                      files_per_series=args.files,
+                                      payload_bytes=args.payload_bytes,
+                                      series_descrips=parse_weights(args.series_descrips)
+                                      if args.series_descrips else None,
+                                      decoy_fraction=args.decoy_fraction,
+                                      oversized_fraction=args.oversized_fraction,
+                                      oversized_files=args.oversized_files,
+                                      seed=args.seed)
+
+    print(f"Sessions:        ", summary["sessions"])
+    print(f"Series:          ", summary["series"],
+          f"({summary['decoy_series']} decoy, {summary['oversized_series']} oversized)")
+    print(f"DICOM files:     ", summary["files"])
+    print(f"Bytes written:   ", summary["bytes"])
+    for series_descrip, count in sorted(summary["series_by_descrip"].items()):
+        print(f"  {series_descrip:<22}", count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from boxsdk.exception import BoxAPIException
+
+###########
+# Globals #
+
+# Smallest file Box accepts an upload session for; smaller files always go through a plain upload
+box_min_upload_session_size = 20 * 1024 * 1024
+
+# Default size at or above which files are uploaded in parts through a Box upload session
+default_chunked_upload_threshold = 50 * 1024 * 1024
+
+# Default number of parts of one file to send at once
+default_part_workers = 4
+
+# Number of times to retry a commit that Box accepted but hasn't finished processing (HTTP 202)
+commit_retries = 5
+
+
+class ChunkedUploader:
+    """Uploads large local files to Box in parts, resuming interrupted uploads from an on-disk session store
+
+    Files at or above `threshold` bytes get a Box upload session. Its parts are sent `part_workers` at a time, and
+    the session ID and every part Box acknowledges are written to a SQLite store as they finish. If the run dies
+    mid-upload, the next run finds the session for the same file (same path, size, and modified time) and sends only
+    the missing parts. Sessions Box no longer knows about, e.g., expired ones, are dropped and started over.
+    """
+
+    def __init__(self, db_path, threshold=default_chunked_upload_threshold, part_workers=default_part_workers):
+        """Instantiation method for ChunkedUploader class
+
+        :param db_path: A path to the SQLite session store; it is created if it doesn't exist
+        :type  db_path: str
+        :param threshold: A file size in bytes at or above which files are uploaded in parts (20 MB at least)
+        :type  threshold: int, optional
+        :param part_workers: A number of parts of one file to send at once
+        :type  part_workers: int, optional
+        """
+        self.db_path = db_path
+        self.threshold = max(threshold, box_min_upload_session_size)
+        self.part_workers = part_workers
+        self.sessions_created = 0
+        self.sessions_resumed = 0
+        self.parts_uploaded = 0
+        self.parts_skipped = 0
+
+        # Uploads may run on several threads at once, so they share one connection behind a lock
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS upload_sessions ("
+                                "  path TEXT PRIMARY KEY,"
+                                "  size INTEGER NOT NULL,"
+                                "  mtime_ns INTEGER NOT NULL,"
+                                "  target_id TEXT NOT NULL,"
+                                "  session_json TEXT NOT NULL"
+                                ")")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS upload_parts ("
+                                "  session_id TEXT NOT NULL,"
+                                "  offset INTEGER NOT NULL,"
+                                "  part_json TEXT NOT NULL,"
+                                "  PRIMARY KEY (session_id, offset)"
+                                ")")
+        self.connection.commit()
+
+    def should_chunk(self, local_path):
+        """Check whether a local file is big enough to upload in parts
+
+        :param local_path: A path to a local file
+        :type  local_path: str
+
+        :return: A boolean whether the file should go through a Box upload session
+        :rtype: boolean
+        """
+        return os.stat(local_path).st_size >= self.threshold
+
+    def upload(self, box_folder, local_path):
+        """Upload a new local file into a Box Folder in parts
+
+        :param box_folder: A Box Folder to upload into
+        :type  box_folder: Folder
+        :param local_path: A path to the local file
+        :type  local_path: str
+
+        :return: The new Box File
+        :rtype: File
+        """
+        return self.upload_in_parts(box_folder, local_path,
+                                    lambda file_size: box_folder.create_upload_session(file_size,
+                                                                                       os.path.basename(local_path)))
+
+    def update(self, box_file, local_path):
+        """Upload a new version of a Box File's contents from a local file in parts
+
+        :param box_file: A Box File to update
+        :type  box_file: File
+        :param local_path: A path to the local file
+        :type  local_path: str
+
+        :return: The updated Box File
+        :rtype: File
+        """
+        return self.upload_in_parts(box_file, local_path,
+                                    lambda file_size: box_file.create_upload_session(file_size))
+
+    def upload_in_parts(self, box_item, local_path, create_upload_session):
+        """Send a local file's missing parts through a new or resumed Box upload session, then commit it
+
+        :param box_item: A Box Folder (new file) or Box File (new version) the session uploads into
+        :type  box_item: Folder/File
+        :param local_path: A path to the local file
+        :type  local_path: str
+        :param create_upload_session: A function taking the file size and creating a new Box UploadSession
+        :type  create_upload_session: function
+
+        :return: The created or updated Box File
+        :rtype: File
+        """
+        stat = os.stat(local_path)
+        upload_session = self.get_stored_session(box_item, local_path, stat)
+        if upload_session is not None:
+            try:
+                return self.send_parts_and_commit(upload_session, local_path, stat.st_size)
+            except BoxAPIException as box_api_exception:
+                if box_api_exception.status not in (404, 410):
+                    raise
+                self.forget_session(local_path, upload_session.object_id)  # expired or aborted; start over
+
+        upload_session = create_upload_session(stat.st_size)
+        self.sessions_created += 1
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO upload_sessions VALUES (?, ?, ?, ?, ?)",
+                                    (local_path, stat.st_size, stat.st_mtime_ns, box_item.object_id,
+                                     json.dumps({key: upload_session[key] for key in upload_session})))
+            self.connection.commit()
+        return self.send_parts_and_commit(upload_session, local_path, stat.st_size)
+
+    def get_stored_session(self, box_item, local_path, stat):
+        """Rebuild the Box UploadSession stored for a local file, if the file hasn't changed since it was stored
+
+        :param box_item: A Box Folder or Box File the session uploads into
+        :type  box_item: Folder/File
+        :param local_path: A path to the local file
+        :type  local_path: str
+        :param stat: The local file's stat result
+        :type  stat: os.stat_result
+
+        :return: A Box UploadSession, or None if there's no usable stored session
+        :rtype: UploadSession
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT size, mtime_ns, target_id, session_json FROM upload_sessions "
+                                          "WHERE path = ?", (local_path,)).fetchone()
+        if row is None:
+            return None
+
+        size, mtime_ns, target_id, session_json = row
+        session_object = json.loads(session_json)
+        if (size, mtime_ns, target_id) != (stat.st_size, stat.st_mtime_ns, box_item.object_id):
+            self.forget_session(local_path, session_object["id"])
+            return None
+
+        self.sessions_resumed += 1
+        # Rebuilt from the stored response so the part size and session endpoints don't need another API call
+        return box_item.translator.translate(box_item.session, session_object)
+
+    def send_parts_and_commit(self, upload_session, local_path, file_size):
+        """Send the parts Box hasn't acknowledged yet, `part_workers` at a time, then commit the session
+
+        :param upload_session: A Box UploadSession for the local file
+        :type  upload_session: UploadSession
+        :param local_path: A path to the local file
+        :type  local_path: str
+        :param file_size: A size of the local file in bytes
+        :type  file_size: int
+
+        :return: The created or updated Box File
+        :rtype: File
+        """
+        session_id = upload_session.object_id
+        with self.lock:
+            parts_by_offset = {offset: json.loads(part_json) for offset, part_json in
+                               self.connection.execute("SELECT offset, part_json FROM upload_parts "
+                                                       "WHERE session_id = ?", (session_id,))}
+        missing_offsets = [offset for offset in range(0, file_size, upload_session.part_size)
+                           if offset not in parts_by_offset]
+        self.parts_skipped += len(parts_by_offset)
+
+        def upload_part(offset):
+            with open(local_path, 'rb') as local_file:
+                local_file.seek(offset)
+                part_bytes = local_file.read(upload_session.part_size)
+            part = upload_session.upload_part_bytes(part_bytes, offset, file_size)
+            # Stored here rather than as results are collected: once one part fails, the parts still in flight
+            # finish anyway, and they must be stored for the next run to skip them
+            with self.lock:
+                self.connection.execute("INSERT OR REPLACE INTO upload_parts VALUES (?, ?, ?)",
+                                        (session_id, offset, json.dumps(part)))
+                self.connection.commit()
+                self.parts_uploaded += 1
+            return offset, part
+
+        with ThreadPoolExecutor(max_workers=self.part_workers, thread_name_prefix="box-part") as part_pool:
+            for future in as_completed([part_pool.submit(upload_part, offset) for offset in missing_offsets]):
+                offset, part = future.result()
+                parts_by_offset[offset] = part
+
+        content_sha1 = hashlib.sha1()
+        with open(local_path, 'rb') as local_file:
+            for chunk in iter(lambda: local_file.read(upload_session.part_size), b''):
+                content_sha1.update(chunk)
+
+        parts = [parts_by_offset[offset] for offset in sorted(parts_by_offset)]
+        for attempt in range(commit_retries):
+            box_file = upload_session.commit(content_sha1.digest(), parts=parts)
+            if box_file is not None:
+                break
+            time.sleep(attempt + 1)  # Box is still assembling the parts
+        else:
+            raise RuntimeError(f"Box didn't finish committing upload session '{session_id}' for '{local_path}'")
+
+        self.forget_session(local_path, session_id)
+        return box_file
+
+    def forget_session(self, local_path, session_id):
+        """Delete a local file's stored session and its parts
+
+        :param local_path: A path to the local file
+        :type  local_path: str
+        :param session_id: A Box UploadSession ID
+        :type  session_id: str
+        """
+        with self.lock:
+            self.connection.execute("DELETE FROM upload_sessions WHERE path = ?", (local_path,))
+            self.connection.execute("DELETE FROM upload_parts WHERE session_id = ?", (session_id,))
+            self.connection.commit()
+
+    def close(self):
+        """Close the SQLite database connection"""
+        self.connection.close()
+
+    def print_summary(self):
+        """Print session and part counts for this run"""
+        print(f"Chunked uploads:",
+              f"{self.sessions_created} sessions created,",
+              f"{self.sessions_resumed} resumed,",
+              f"{self.parts_uploaded} parts uploaded,",
+              f"{self.parts_skipped} parts already on Box")
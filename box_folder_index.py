@@ -0,0 +1,186 @@
+import ummap_mri_sync_to_box_helpers as hlps
+
+
+class BoxFolderIndex:
+    """An in-memory, per-run index of Box Folder listings, keyed by Box Folder ID and then by subitem name"""
+
+    def __init__(self, journal=None, metrics=None):
+        """Instantiation method for BoxFolderIndex class
+
+        :param journal: A journal to write each recorded Box Folder creation, upload, update, and deletion to
+        :type  journal: BoxSyncJournal, optional
+        :param metrics: Run metrics to count each recorded Box Folder creation, upload, update, and deletion in
+        :type  metrics: SyncMetrics, optional
+        """
+        self.journal = journal
+        self.metrics = metrics
+        self.folder_listings = {}  # Box Folder ID -> {subitem name: Box subitem}
+        self.parent_folder_ids = {}  # (Box subitem type, Box subitem ID) -> parent Box Folder ID
+        self.removed_item_keys = set()  # (Box subitem type, Box subitem ID) of each Box subitem deleted this run
+        self.listings_fetched = 0
+        self.listings_saved = 0
+
+    def get_subitems_by_name(self, box_folder):
+        """Get the subitems of a Box Folder as a name -> item dict, listing the Box Folder only on first request
+
+        :param box_folder: A Box Folder whose contents we want to fetch
+        :type  box_folder: Folder
+
+        :return: A dict of Box subitem names to Box Files and Folders
+        :rtype: dict[str, Folder/File]
+        """
+        listing = self.folder_listings.get(box_folder.id)
+        if listing is None:
+            listing = self.record_listing(box_folder, hlps.get_box_subitems(box_folder))
+        else:
+            self.listings_saved += 1
+
+        return listing
+
+    def has_listing(self, box_folder):
+        """Check whether a Box Folder's listing is already held, so getting its subitems won't call the Box API
+
+        :param box_folder: A Box Folder
+        :type  box_folder: Folder
+
+        :return: A boolean whether the Box Folder's listing is held
+        :rtype: boolean
+        """
+        return box_folder.id in self.folder_listings
+
+    def record_listing(self, box_folder, box_subitems):
+        """Record a Box Folder listing that was just fetched from the Box API
+
+        :param box_folder: A Box Folder that was listed
+        :type  box_folder: Folder
+        :param box_subitems: A list of the Box Folder's Box Files and Folders
+        :type  box_subitems: list[Folder/File]
+
+        :return: A dict of Box subitem names to Box Files and Folders
+        :rtype: dict[str, Folder/File]
+        """
+        self.seed_listing(box_folder.id, box_subitems)
+        self.listings_fetched += 1
+        return self.folder_listings[box_folder.id]
+
+    def seed_listing(self, box_folder_id, box_subitems):
+        """Record a Box Folder listing known from elsewhere (e.g., a BoxManifest) so the Box Folder is never listed
+
+        :param box_folder_id: A Box Folder ID
+        :type  box_folder_id: str
+        :param box_subitems: A list of the Box Folder's Box Files and Folders
+        :type  box_subitems: list[Folder/File]
+        """
+        listing = {}
+        for box_subitem in box_subitems:
+            listing[box_subitem.name] = box_subitem
+            self.parent_folder_ids[(box_subitem.type, box_subitem.id)] = box_folder_id
+        self.folder_listings[box_folder_id] = listing
+
+    def get_subitems(self, box_folder):
+        """Get a list of all immediate subitems in a Box Folder
+
+        :param box_folder: A Box Folder whose contents we want to fetch
+        :type  box_folder: Folder
+
+        :return: A list of Box Files and Folders
+        :rtype: list[Folder/File]
+        """
+        return list(self.get_subitems_by_name(box_folder).values())
+
+    def get_subfolder(self, box_folder, name):
+        """Get the Box subFolder of a Box Folder by name
+
+        :param box_folder: A Box Folder whose contents may hold the Box subFolder
+        :type  box_folder: Folder
+        :param name: A name of the Box subFolder
+        :type  name: str
+
+        :return: A Box Folder, or None if there is no Box subFolder by that name
+        :rtype: Folder
+        """
+        box_subitem = self.get_subitems_by_name(box_folder).get(name)
+        return box_subitem if box_subitem is not None and box_subitem.type == "folder" else None
+
+    def get_subfile(self, box_folder, name):
+        """Get the Box subFile of a Box Folder by name
+
+        :param box_folder: A Box Folder whose contents may hold the Box subFile
+        :type  box_folder: Folder
+        :param name: A name of the Box subFile
+        :type  name: str
+
+        :return: A Box File, or None if there is no Box subFile by that name
+        :rtype: File
+        """
+        box_subitem = self.get_subitems_by_name(box_folder).get(name)
+        return box_subitem if box_subitem is not None and box_subitem.type == "file" else None
+
+    def add_item(self, box_folder, box_subitem):
+        """Record a Box subitem that was just created, uploaded, or updated in a Box Folder
+
+        :param box_folder: A parent Box Folder of the Box subitem
+        :type  box_folder: Folder
+        :param box_subitem: A Box File or Folder to record
+        :type  box_subitem: Folder/File
+        """
+        self.put_item(box_folder, box_subitem)
+        if self.journal is not None:
+            self.journal.record("put_file" if box_subitem.type == "file" else "create_folder", box_folder.id,
+                                box_subitem)
+        if self.metrics is not None:
+            self.metrics.record_box_put(box_subitem)
+
+    def put_item(self, box_folder, box_subitem):
+        """Helper function: Put a Box subitem into its parent Box Folder's listing, if that listing is held
+
+        :param box_folder: A parent Box Folder of the Box subitem
+        :type  box_folder: Folder
+        :param box_subitem: A Box File or Folder to put
+        :type  box_subitem: Folder/File
+        """
+        listing = self.folder_listings.get(box_folder.id)
+        if listing is not None:
+            listing[box_subitem.name] = box_subitem
+        self.parent_folder_ids[(box_subitem.type, box_subitem.id)] = box_folder.id
+
+    def add_new_folder(self, box_folder, box_subfolder, is_new=True):
+        """Record a Box subFolder that was just created; being new, it is known to be empty without listing it
+
+        :param box_folder: A parent Box Folder of the new Box subFolder
+        :type  box_folder: Folder
+        :param box_subfolder: A new, empty Box Folder
+        :type  box_subfolder: Folder
+        :param is_new: False if creating it found one by the same name already there (e.g., made by another shard),
+                       whose listing isn't known
+        :type  is_new: boolean, optional
+        """
+        if not is_new:
+            self.put_item(box_folder, box_subfolder)
+            return
+        self.add_item(box_folder, box_subfolder)
+        self.folder_listings[box_subfolder.id] = {}
+
+    def remove_item(self, box_subitem):
+        """Forget a Box subitem that was just deleted, along with the listing of a deleted Box Folder
+
+        :param box_subitem: A deleted Box File or Folder
+        :type  box_subitem: Folder/File
+        """
+        parent_folder_id = self.parent_folder_ids.pop((box_subitem.type, box_subitem.id), None)
+        self.removed_item_keys.add((box_subitem.type, box_subitem.id))
+        if self.journal is not None:
+            self.journal.record("delete", parent_folder_id, box_subitem)
+        if self.metrics is not None:
+            self.metrics.increment("box_items_deleted")
+        listing = self.folder_listings.get(parent_folder_id)
+        if listing is not None:
+            listing.pop(box_subitem.name, None)
+        if box_subitem.type == "folder":
+            self.folder_listings.pop(box_subitem.id, None)
+
+    def print_summary(self):
+        """Print how many Box Folder listings were fetched and how many were served from the index"""
+        print(f"Box Folder listings:",
+              f"{self.listings_fetched} fetched,",
+              f"{self.listings_saved} served from index (API calls saved)")
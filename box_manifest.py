@@ -0,0 +1,271 @@
+import time
+import sqlite3
+from boxsdk.exception import BoxAPIException
+
+###########
+# Globals #
+
+# Box doesn't promise to keep user events forever, so a manifest older than this forces a full crawl
+manifest_max_age_days = 7
+
+# Number of Box events to fetch per events stream request
+events_page_size = 500
+
+
+class BoxManifest:
+    """An on-disk SQLite manifest of the Box Folder listings recorded at the end of the last successful sync"""
+
+    def __init__(self, db_path):
+        """Instantiation method for BoxManifest class
+
+        :param db_path: A path to the SQLite database file; it is created if it doesn't exist
+        :type  db_path: str
+        """
+        self.db_path = db_path
+        self.next_stream_position = None
+        self.dirty_folder_ids = set()
+
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS manifest_state ("
+                                "  key TEXT PRIMARY KEY,"
+                                "  value TEXT NOT NULL"
+                                ")")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS box_folders ("
+                                "  folder_id TEXT PRIMARY KEY"
+                                ")")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS box_items ("
+                                "  folder_id TEXT NOT NULL,"
+                                "  type TEXT NOT NULL,"
+                                "  id TEXT NOT NULL,"
+                                "  name TEXT NOT NULL,"
+                                "  size INTEGER,"
+                                "  sha1 TEXT,"
+                                "  modified_at TEXT,"
+                                "  etag TEXT,"
+                                "  sequence_id TEXT,"
+                                "  PRIMARY KEY (type, id)"
+                                ")")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS box_deleted_items ("
+                                "  type TEXT NOT NULL,"
+                                "  id TEXT NOT NULL,"
+                                "  PRIMARY KEY (type, id)"
+                                ")")
+        self.connection.commit()
+
+    def get_state(self, key):
+        """Get a value saved with the manifest, e.g., the Box events stream position
+
+        :param key: A name of the saved value
+        :type  key: str
+
+        :return: A saved value, or None if nothing is saved under that name
+        :rtype: str
+        """
+        row = self.connection.execute("SELECT value FROM manifest_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def load_into_index(self, box_client, box_folder, box_index, full_reconcile=False, is_verbose=False):
+        """Seed a BoxFolderIndex with every recorded Box Folder listing that Box reports as untouched
+
+        The current Box events stream position is captured first, so anything changed on Box during this run shows up
+        as an event on the next; events on items just as this run recorded them, e.g., its own uploads, are skipped
+        then. Recorded listings are only trusted if the manifest is for the same root Box Folder, the root
+        Box Folder's etag is unchanged, and the events stream since the last sync can be read; otherwise nothing is
+        seeded and the sync falls back to a full crawl.
+
+        :param box_client: An authenticated Box client
+        :type  box_client: Client
+        :param box_folder: A root Box Folder the sync writes into
+        :type  box_folder: Folder
+        :param box_index: A per-run index of Box Folder listings to seed
+        :type  box_index: BoxFolderIndex
+        :param full_reconcile: A boolean flag for ignoring the manifest and crawling every Box Folder
+        :type  full_reconcile: boolean
+        :param is_verbose: A boolean flag for verbosity
+        :type  is_verbose: boolean
+
+        :return: A number of Box Folder listings seeded into the index
+        :rtype: int
+        """
+        self.next_stream_position = box_client.events().get_latest_stream_position()
+
+        fallback_reason = None
+        synced_at = self.get_state("synced_at")
+        if full_reconcile:
+            fallback_reason = "full reconcile requested"
+        elif synced_at is None:
+            fallback_reason = "no previous sync recorded"
+        elif self.get_state("root_folder_id") != box_folder.id:
+            fallback_reason = "manifest is for a different root Box Folder"
+        elif self.get_state("root_folder_etag") != (getattr(box_folder, "etag", None) or ""):
+            fallback_reason = "root Box Folder etag changed"
+        elif time.time() - float(synced_at) > manifest_max_age_days * 24 * 60 * 60:
+            fallback_reason = f"manifest older than {manifest_max_age_days} days"
+        else:
+            dirty_folder_ids = self.get_dirty_folder_ids(box_client, self.get_state("stream_position"))
+            if dirty_folder_ids is None:
+                fallback_reason = "Box events stream could not be reconciled"
+            else:
+                self.dirty_folder_ids = dirty_folder_ids
+
+        if fallback_reason:
+            print(f"Box manifest: full crawl ({fallback_reason})")
+            return 0
+
+        folder_listings = {}
+        for (folder_id,) in self.connection.execute("SELECT folder_id FROM box_folders"):
+            if folder_id not in self.dirty_folder_ids:
+                folder_listings[folder_id] = []
+        for row in self.connection.execute("SELECT folder_id, type, id, name, size, sha1, modified_at, etag, "
+                                           "sequence_id FROM box_items"):
+            if row[0] in folder_listings:
+                folder_listings[row[0]].append(self.make_box_item(box_folder, row[1:]))
+
+        for folder_id, box_subitems in folder_listings.items():
+            box_index.seed_listing(folder_id, box_subitems)
+
+        if is_verbose:
+            print(f"Box manifest:",
+                  f"{len(folder_listings)} Box Folder listings seeded,",
+                  f"{len(self.dirty_folder_ids)} Box Folders changed since last sync")
+        return len(folder_listings)
+
+    def get_dirty_folder_ids(self, box_client, stream_position):
+        """Get the IDs of Box Folders whose listings may have changed since a Box events stream position
+
+        :param box_client: An authenticated Box client
+        :type  box_client: Client
+        :param stream_position: A Box events stream position saved at the start of the last sync
+        :type  stream_position: str
+
+        :return: A set of Box Folder IDs, or None if the events stream can't account for every change
+        :rtype: set[str]
+        """
+        if stream_position is None:
+            return None
+
+        dirty_folder_ids = set()
+        try:
+            while True:
+                events_page = box_client.events().get_events(limit=events_page_size, stream_position=stream_position)
+                for event in events_page["entries"]:
+                    source = getattr(event, "source", None)
+                    if getattr(source, "type", None) not in ("file", "folder") or self.is_recorded_event(source):
+                        continue
+                    event_folder_ids = self.get_event_folder_ids(source)
+                    if not event_folder_ids:
+                        return None  # a change we can't place in the tree
+                    dirty_folder_ids.update(event_folder_ids)
+                stream_position = events_page["next_stream_position"]
+                if len(events_page["entries"]) < events_page_size:
+                    break
+        except BoxAPIException as box_api_exception:
+            print(f"Box manifest: events stream request failed:", f"{box_api_exception.status}")
+            return None
+
+        return dirty_folder_ids
+
+    def is_recorded_event(self, source):
+        """Check whether an event's Box File or Folder is just as the manifest recorded it
+
+        The events stream is read from where it stood before the last sync wrote anything, so that sync's own Box
+        Folder creations, uploads, and deletions come back as events. Their items are in the manifest with the same
+        parent, sequence ID, and etag, or among the items it deleted, so they changed nothing the manifest doesn't
+        already know.
+
+        :param source: A Box File or Folder that an event happened to
+        :type  source: File/Folder
+
+        :return: A boolean whether the item is in the manifest as it was when the event happened
+        :rtype: boolean
+        """
+        if self.connection.execute("SELECT 1 FROM box_deleted_items WHERE type = ? AND id = ?",
+                                   (source.type, source.id)).fetchone():
+            return True
+        if getattr(source, "item_status", "active") != "active":
+            return False
+        row = self.connection.execute("SELECT folder_id, sequence_id, etag FROM box_items WHERE type = ? AND id = ?",
+                                      (source.type, source.id)).fetchone()
+        if row is None:
+            return False
+        parent = getattr(source, "parent", None)
+        if parent is not None and parent.id != row[0]:
+            return False
+        for field, recorded_value in zip(["sequence_id", "etag"], row[1:]):
+            value = getattr(source, field, None)
+            if value is not None and recorded_value is not None and str(value) != recorded_value:
+                return False
+        return True
+
+    def get_event_folder_ids(self, source):
+        """Get the IDs of Box Folders whose listings an event on a Box File or Folder may have changed
+
+        :param source: A Box File or Folder that an event happened to
+        :type  source: File/Folder
+
+        :return: A set of Box Folder IDs
+        :rtype: set[str]
+        """
+        event_folder_ids = set()
+        parent = getattr(source, "parent", None)
+        if parent is not None:
+            event_folder_ids.add(parent.id)  # where the item is now
+        row = self.connection.execute("SELECT folder_id FROM box_items WHERE type = ? AND id = ?",
+                                      (source.type, source.id)).fetchone()
+        if row:
+            event_folder_ids.add(row[0])  # where the item was at the last sync
+        if event_folder_ids and source.type == "folder":
+            event_folder_ids.add(source.id)
+        return event_folder_ids
+
+    def make_box_item(self, box_folder, item_row):
+        """Rebuild a Box File or Folder object from a manifest row without calling the Box API
+
+        :param box_folder: Any Box Folder from the authenticated client, used for its session and translator
+        :type  box_folder: Folder
+        :param item_row: A tuple of type, id, name, size, sha1, modified_at, etag, and sequence_id
+        :type  item_row: tuple
+
+        :return: A Box File or Folder
+        :rtype: File/Folder
+        """
+        item_fields = ["type", "id", "name", "size", "sha1", "modified_at", "etag", "sequence_id"]
+        response_object = {field: value for field, value in zip(item_fields, item_row) if value is not None}
+        return box_folder.translator.translate(box_folder.session, response_object)
+
+    def save_from_index(self, box_folder, box_index):
+        """Replace the manifest with the Box Folder listings held in a BoxFolderIndex after a successful sync
+
+        :param box_folder: A root Box Folder the sync wrote into
+        :type  box_folder: Folder
+        :param box_index: A per-run index of Box Folder listings
+        :type  box_index: BoxFolderIndex
+        """
+        self.connection.execute("DELETE FROM box_folders")
+        self.connection.execute("DELETE FROM box_items")
+        self.connection.execute("DELETE FROM box_deleted_items")
+        self.connection.executemany("INSERT OR REPLACE INTO box_deleted_items VALUES (?, ?)",
+                                    sorted(box_index.removed_item_keys))
+        for folder_id, listing in box_index.folder_listings.items():
+            self.connection.execute("INSERT INTO box_folders VALUES (?)", (folder_id,))
+            self.connection.executemany("INSERT OR REPLACE INTO box_items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                        [(folder_id,
+                                          box_subitem.type,
+                                          box_subitem.id,
+                                          box_subitem.name,
+                                          getattr(box_subitem, "size", None),
+                                          getattr(box_subitem, "sha1", None),
+                                          getattr(box_subitem, "modified_at", None),
+                                          getattr(box_subitem, "etag", None),
+                                          getattr(box_subitem, "sequence_id", None))
+                                         for box_subitem in listing.values()])
+        self.connection.executemany("INSERT OR REPLACE INTO manifest_state VALUES (?, ?)",
+                                    [("root_folder_id", box_folder.id),
+                                     ("root_folder_etag", getattr(box_folder, "etag", None) or ""),
+                                     ("stream_position", str(self.next_stream_position)),
+                                     ("synced_at", str(time.time()))])
+        self.connection.commit()
+
+    def close(self):
+        """Close the SQLite database connection"""
+        self.connection.close()
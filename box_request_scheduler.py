@@ -0,0 +1,237 @@
+import re
+import time
+import random
+import threading
+from collections import Counter
+
+from boxsdk.network.default_network import DefaultNetwork
+
+###########
+# Globals #
+
+# Default token-bucket budgets in requests per second: Box allows about 1000 API calls and 240 uploads per minute
+default_requests_per_second = 15.0
+default_uploads_per_second = 4.0
+
+# Default bounds on the number of Box requests in flight at once
+default_max_concurrency = 16
+default_min_concurrency = 1
+
+# AIMD factors: the concurrency limit is cut by these on throttling, server errors, and slow responses
+throttle_decrease_factor = 0.5
+server_error_decrease_factor = 0.75
+slow_response_decrease_factor = 0.9
+
+# A response is slow when it takes this many times the fastest one seen for its endpoint
+slow_response_factor = 3.0
+
+# Number of responses an endpoint needs before its latency floor is trusted
+latency_warmup_count = 5
+
+# Retries wait up to this fraction longer than Box (or boxsdk's backoff) asks, so threads don't retry in lockstep
+retry_jitter_fraction = 0.5
+
+# Endpoint names for Box API requests, matched in order against the request method and URL path
+box_endpoint_patterns = [
+    ("upload_part", re.compile(r'^PUT .*/files/upload_sessions/[^/]+$')),
+    ("upload_session", re.compile(r'^(GET|PUT|POST|DELETE) .*/files/(\d+/)?upload_sessions')),
+    ("update", re.compile(r'^POST .*/files/\d+/content')),
+    ("upload", re.compile(r'^POST .*/files/content')),
+    ("download", re.compile(r'^GET .*/files/\d+/content')),
+    ("list", re.compile(r'^GET .*/folders/\d+/items')),
+    ("get_folder", re.compile(r'^GET .*/folders/\d+$')),
+    ("mkdir", re.compile(r'^POST .*/folders$')),
+    ("delete", re.compile(r'^DELETE ')),
+    ("events", re.compile(r'^(GET|OPTIONS) .*/events')),
+]
+
+# Endpoints drawing on the upload budget rather than the general API budget
+upload_endpoints = {"upload", "update", "upload_session", "upload_part"}
+
+# Endpoints whose response times follow the bytes sent rather than how loaded Box is, so they never count as slow
+size_bound_endpoints = {"upload_part"}
+
+
+def get_box_endpoint(method, url):
+    """Name the Box API endpoint a request goes to, e.g., "list" for a Box Folder items listing
+
+    :param method: An HTTP method
+    :type  method: str
+    :param url: A request URL
+    :type  url: str
+
+    :return: An endpoint name, or "other"
+    :rtype: str
+    """
+    request_line = f"{method.upper()} {url.split('?')[0]}"
+    for endpoint, rgx_endpoint in box_endpoint_patterns:
+        if re.match(rgx_endpoint, request_line):
+            return endpoint
+    return "other"
+
+
+class BoxRequestScheduler(DefaultNetwork):
+    """A boxsdk network layer that paces every Box API request the client makes, from any thread
+
+    Listings, folder creations, uploads, updates, deletes, upload-session parts, and events polls all pass through
+    `request`. Before it's sent, each request waits for three things:
+
+    * a token from its budget's bucket: uploads and updates draw on one, everything else on another;
+    * any pause set by a throttled (HTTP 429) response, which holds back every thread until `Retry-After` has passed;
+    * a free slot under the concurrency limit.
+
+    The concurrency limit is tuned AIMD-style. It grows by about one slot per limit's worth of healthy responses.
+    It is cut multiplicatively on throttling, on server errors, and on responses much slower than the fastest seen
+    for their endpoint. Upload-session part PUTs take as long as their bytes take to send, so they're never slow.
+    boxsdk's own retries (429s, 5xxs) come back through `retry_after`. There they wait at least as long as Box or
+    boxsdk asks, plus jitter, and are counted.
+    """
+
+    def __init__(self, requests_per_second=default_requests_per_second, uploads_per_second=default_uploads_per_second,
+                 max_concurrency=default_max_concurrency, min_concurrency=default_min_concurrency, metrics=None):
+        """Instantiation method for BoxRequestScheduler class
+
+        :param requests_per_second: A budget for non-upload Box API requests
+        :type  requests_per_second: float, optional
+        :param uploads_per_second: A budget for upload and update requests
+        :type  uploads_per_second: float, optional
+        :param max_concurrency: A most Box requests in flight at once; the concurrency limit starts here
+        :type  max_concurrency: int, optional
+        :param min_concurrency: A fewest Box requests in flight at once the limit may be cut to
+        :type  min_concurrency: int, optional
+        :param metrics: Run metrics to report each request's endpoint, status, and latency to
+        :type  metrics: SyncMetrics, optional
+        """
+        super().__init__()
+        self.rates = {"api": requests_per_second, "upload": uploads_per_second}
+        self.tokens = {"api": max(requests_per_second, 1.0), "upload": max(uploads_per_second, 1.0)}
+        self.refilled_at = time.monotonic()
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.concurrency_limit = float(max_concurrency)
+        self.lowest_concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.condition = threading.Condition()
+        self.metrics = metrics
+
+        self.requests_by_endpoint = Counter()
+        self.latency_floors = {}  # endpoint -> fastest response time seen
+        self.throttles = 0
+        self.server_errors = 0
+        self.slow_responses = 0
+        self.retries = 0
+        self.seconds_waited = 0.0
+
+    def refill_tokens(self, now):
+        """Helper function: Add the tokens earned since the last refill, up to one second's budget per bucket"""
+        elapsed = now - self.refilled_at
+        for bucket, rate in self.rates.items():
+            self.tokens[bucket] = min(max(rate, 1.0), self.tokens[bucket] + elapsed * rate)
+        self.refilled_at = now
+
+    def acquire(self, endpoint):
+        """Block until a request to an endpoint may be sent, then take its token and concurrency slot
+
+        :param endpoint: An endpoint name from `get_box_endpoint`
+        :type  endpoint: str
+        """
+        bucket = "upload" if endpoint in upload_endpoints else "api"
+        started_at = time.monotonic()
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self.refill_tokens(now)
+                if now < self.paused_until:
+                    wait_seconds = self.paused_until - now
+                elif self.tokens[bucket] < 1.0:
+                    wait_seconds = (1.0 - self.tokens[bucket]) / self.rates[bucket]
+                elif self.in_flight >= int(self.concurrency_limit):
+                    wait_seconds = None  # until a request finishes
+                else:
+                    break
+                self.condition.wait(wait_seconds)
+            self.tokens[bucket] -= 1.0
+            self.in_flight += 1
+            self.requests_by_endpoint[endpoint] += 1
+            self.seconds_waited += time.monotonic() - started_at
+
+    def release(self, endpoint, status_code, retry_after_header, elapsed):
+        """Give back a concurrency slot and adjust the concurrency limit from how the request went
+
+        :param endpoint: An endpoint name from `get_box_endpoint`
+        :type  endpoint: str
+        :param status_code: An HTTP status code, or None if the request raised
+        :type  status_code: int
+        :param retry_after_header: A `Retry-After` response header value, if any
+        :type  retry_after_header: str
+        :param elapsed: Seconds the request took
+        :type  elapsed: float
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if status_code == 429:
+                self.throttles += 1
+                self.decrease_concurrency(throttle_decrease_factor)
+                try:
+                    pause_seconds = float(retry_after_header)
+                except (TypeError, ValueError):
+                    pause_seconds = 1.0
+                self.paused_until = max(self.paused_until, time.monotonic() + pause_seconds)
+            elif status_code is None or status_code >= 500:
+                self.server_errors += 1
+                self.decrease_concurrency(server_error_decrease_factor)
+            else:
+                if endpoint not in size_bound_endpoints:
+                    self.latency_floors[endpoint] = min(self.latency_floors.get(endpoint, elapsed), elapsed)
+                if endpoint in self.latency_floors and self.requests_by_endpoint[endpoint] > latency_warmup_count and \
+                        elapsed > slow_response_factor * self.latency_floors[endpoint]:
+                    self.slow_responses += 1
+                    self.decrease_concurrency(slow_response_decrease_factor)
+                else:
+                    self.concurrency_limit = min(self.max_concurrency,
+                                                 self.concurrency_limit + 1.0 / self.concurrency_limit)
+            self.condition.notify_all()
+
+    def decrease_concurrency(self, factor):
+        """Helper function: Cut the concurrency limit by a factor, no lower than the minimum"""
+        self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit * factor)
+        self.lowest_concurrency_limit = min(self.lowest_concurrency_limit, self.concurrency_limit)
+
+    def request(self, method, url, access_token, **kwargs):
+        """Base class override: Send a Box API request once the scheduler lets it through"""
+        endpoint = get_box_endpoint(method, url)
+        self.acquire(endpoint)
+        started_at = time.monotonic()
+        try:
+            network_response = super().request(method, url, access_token, **kwargs)
+        except Exception:
+            elapsed = time.monotonic() - started_at
+            self.release(endpoint, None, None, elapsed)
+            if self.metrics is not None:
+                self.metrics.observe_box_request(endpoint, None, elapsed)
+            raise
+        elapsed = time.monotonic() - started_at
+        self.release(endpoint, network_response.status_code, network_response.headers.get('Retry-After'), elapsed)
+        if self.metrics is not None:
+            self.metrics.observe_box_request(endpoint, network_response.status_code, elapsed)
+        return network_response
+
+    def retry_after(self, delay, request_method, *args, **kwargs):
+        """Base class override: Retry a request after at least `delay` seconds, plus jitter"""
+        with self.condition:
+            self.retries += 1
+        time.sleep(delay * (1.0 + random.uniform(0.0, retry_jitter_fraction)))
+        return request_method(*args, **kwargs)
+
+    def print_summary(self):
+        """Print request counts by endpoint, throttling and retry counts, and the concurrency limit"""
+        print(f"Box API requests:",
+              f"{sum(self.requests_by_endpoint.values())}",
+              "(" + ", ".join(f"{endpoint} {count}" for endpoint, count in
+                              sorted(self.requests_by_endpoint.items())) + ");",
+              f"{self.throttles} throttled,",
+              f"{self.server_errors} server errors,",
+              f"{self.retries} retries,",
+              f"{self.seconds_waited:.1f} s waiting;",
+              f"concurrency limit {self.concurrency_limit:.1f} (lowest {self.lowest_concurrency_limit:.1f})")
@@ -0,0 +1,178 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+###########
+# Globals #
+
+# Number of final journal entries whose Box Folders are listed again on resume, since Box calls that were in flight
+# when the run died may have finished on Box without being journaled
+journal_tail_size = 256
+
+# Box item fields written with each journal entry
+journal_item_fields = ["type", "id", "name", "size", "sha1", "modified_at", "etag", "sequence_id"]
+
+
+class BoxSyncJournal:
+    """An append-only JSON Lines journal of the Box operations a sync run has completed
+
+    Once attached to a BoxFolderIndex, every Box Folder created, Box File uploaded or updated, and Box item deleted is
+    written to the journal, one flushed line each, as soon as it succeeds. If the run dies, the next run with `resume`
+    replays the journal into its BoxFolderIndex: Box Folders the dead run created are known in full without listing
+    them, and only Box Folders touched by, or created in, the journal's tail are listed again. A run that finishes
+    clears the journal.
+    """
+
+    def __init__(self, journal_path):
+        """Instantiation method for BoxSyncJournal class
+
+        :param journal_path: A path to the journal file; it is created if it doesn't exist
+        :type  journal_path: str
+        """
+        self.journal_path = journal_path
+        self.journal_file = None
+        self.lock = threading.Lock()
+        self.entries_replayed = 0
+        self.entries_written = 0
+
+    def read_entries(self, box_folder):
+        """Read the journal's entries, if it was written by a run into the same root Box Folder
+
+        :param box_folder: A root Box Folder this run syncs into
+        :type  box_folder: Folder
+
+        :return: A list of entry dicts, oldest first
+        :rtype: list[dict]
+        """
+        if not os.path.isfile(self.journal_path):
+            return []
+        with open(self.journal_path) as journal_file:
+            lines = journal_file.read().splitlines()
+        if not lines or json.loads(lines[0]).get("root_box_folder_id") != box_folder.id:
+            return []
+
+        entries = []
+        for line in lines[1:]:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:  # a line cut short when the run died
+                break
+        return entries
+
+    def replay_into_index(self, box_folder, box_index, tail_size=journal_tail_size, is_verbose=False):
+        """Rebuild what the journal knows about Box into a BoxFolderIndex, before the sync starts
+
+        Box Folders created by the journaled run get their listings seeded from the journal. Box Folders already
+        listed in the index (e.g., from a BoxManifest) get the journaled changes applied. Box Folders touched by, or
+        created in, the last `tail_size` entries are dropped from the index instead, so they're listed again.
+
+        :param box_folder: A root Box Folder this run syncs into, also used for its session and translator
+        :type  box_folder: Folder
+        :param box_index: A per-run index of Box Folder listings to rebuild remote state in
+        :type  box_index: BoxFolderIndex
+        :param tail_size: A number of final entries whose Box Folders are listed again
+        :type  tail_size: int, optional
+        :param is_verbose: A boolean flag for verbosity
+        :type  is_verbose: boolean
+
+        :return: A number of entries replayed
+        :rtype: int
+        """
+        entries = self.read_entries(box_folder)
+        created_folder_ids = set()
+        changes_by_folder_id = {}  # Box Folder ID -> {subitem name: Box subitem, or None if deleted}
+        for entry in entries:
+            box_subitem = box_folder.translator.translate(box_folder.session, entry["item"])
+            folder_changes = changes_by_folder_id.setdefault(entry["parent_id"], {})
+            if entry["op"] == "delete":
+                folder_changes[box_subitem.name] = None
+                if box_subitem.type == "folder":
+                    created_folder_ids.discard(box_subitem.id)
+                    changes_by_folder_id.pop(box_subitem.id, None)
+            else:
+                folder_changes[box_subitem.name] = box_subitem
+                if entry["op"] == "create_folder":
+                    created_folder_ids.add(box_subitem.id)
+                    changes_by_folder_id.setdefault(box_subitem.id, {})
+
+        tail_entries = entries[-tail_size:] if tail_size > 0 else []
+        tail_folder_ids = {entry["parent_id"] for entry in tail_entries}
+        # Box calls into a Box Folder created in the tail may have been in flight too, even if none were journaled
+        tail_folder_ids.update(entry["item"]["id"] for entry in tail_entries if entry["op"] == "create_folder")
+        for folder_id, folder_changes in changes_by_folder_id.items():
+            if folder_id in tail_folder_ids:
+                box_index.folder_listings.pop(folder_id, None)
+            elif folder_id in created_folder_ids:
+                box_index.seed_listing(folder_id, [box_subitem for box_subitem in folder_changes.values()
+                                                   if box_subitem is not None])
+            elif folder_id in box_index.folder_listings:
+                listing = box_index.folder_listings[folder_id]
+                for name, box_subitem in folder_changes.items():
+                    if box_subitem is None:
+                        listing.pop(name, None)
+                    else:
+                        listing[name] = box_subitem
+
+        self.entries_replayed = len(entries)
+        if is_verbose:
+            print(f"Replayed", f"{len(entries)}", f"journal entries;",
+                  f"{len(created_folder_ids - tail_folder_ids)} new Box Folders known without listing")
+        return len(entries)
+
+    def start(self, box_folder, resume=False):
+        """Open the journal for appending, keeping its entries only if resuming a run into the same root Box Folder
+
+        :param box_folder: A root Box Folder this run syncs into
+        :type  box_folder: Folder
+        :param resume: A boolean flag for appending to the journal of a run that died
+        :type  resume: boolean
+        """
+        entries = self.read_entries(box_folder) if resume else []
+        # Rewritten rather than appended to, so a line cut short when the last run died doesn't swallow new entries
+        self.journal_file = open(self.journal_path, 'w')
+        self.journal_file.write(json.dumps({"root_box_folder_id": box_folder.id,
+                                            "started_at": datetime.now().astimezone().isoformat(timespec="seconds")})
+                                + "\n")
+        for entry in entries:
+            self.journal_file.write(json.dumps(entry) + "\n")
+        self.journal_file.flush()
+
+    def record(self, op, box_folder_id, box_subitem):
+        """Append one completed operation to the journal, flushing it to disk at once
+
+        :param op: A kind of operation: "create_folder", "put_file" (upload or update), or "delete"
+        :type  op: str
+        :param box_folder_id: An ID of the Box subitem's parent Box Folder
+        :type  box_folder_id: str
+        :param box_subitem: The created, uploaded, updated, or deleted Box File or Folder
+        :type  box_subitem: Folder/File
+        """
+        if self.journal_file is None:
+            return
+        item = {field: getattr(box_subitem, field, None) for field in journal_item_fields}
+        line = json.dumps({"op": op,
+                           "parent_id": box_folder_id,
+                           "item": {field: value for field, value in item.items() if value is not None}})
+        with self.lock:
+            self.journal_file.write(line + "\n")
+            self.journal_file.flush()
+            self.entries_written += 1
+
+    def finish(self):
+        """Clear the journal after a run that finished, so there's nothing left to resume"""
+        self.close()
+        if os.path.isfile(self.journal_path):
+            os.remove(self.journal_path)
+
+    def close(self):
+        """Close the journal file, leaving it for a later run to resume from"""
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+
+    def print_summary(self):
+        """Print how many entries were replayed and written in this run"""
+        print(f"Sync journal:",
+              f"{self.entries_replayed} entries replayed,",
+              f"{self.entries_written} written")
@@ -0,0 +1,137 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import ummap_mri_sync_to_box_helpers as hlps
+
+
+class BoxUploadExecutor:
+    """A thread pool that runs Box File uploads and updates concurrently across the whole tree
+
+    Box calls are submitted from the tree walk and run on worker threads, so uploads into one Box Folder overlap with
+    the walk (and uploads) into the next. Each call's `on_result` callback runs back on the submitting thread, in
+    submission order, so verbose logging and BoxFolderIndex updates stay ordered and single-threaded. At most
+    `max_in_flight` calls are queued, running, or finished but still waiting for their callback; submitting more
+    blocks until the oldest finishes and its callback runs, so a slow call can't hold back an unbounded backlog.
+    """
+
+    def __init__(self, max_workers, max_in_flight=None):
+        """Instantiation method for BoxUploadExecutor class
+
+        :param max_workers: A number of worker threads making Box calls
+        :type  max_workers: int
+        :param max_in_flight: A number of Box calls allowed to be outstanding at once; twice the workers if None
+        :type  max_in_flight: int, optional
+        """
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight or 2 * max_workers
+        self.thread_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="box-upload")
+        self.pending = deque()  # (Future, on_result) pairs in submission order
+        self.calls_submitted = 0
+
+    def submit(self, box_call, on_result=None):
+        """Run a Box call on a worker thread, first waiting on the oldest while `max_in_flight` calls are outstanding
+
+        :param box_call: A function taking no arguments that makes one Box call and returns its result
+        :type  box_call: function
+        :param on_result: A function to call with the Box call's result, on this thread, in submission order
+        :type  on_result: function, optional
+        """
+        while len(self.pending) >= self.max_in_flight:
+            self.collect_next()
+        self.pending.append((self.thread_pool.submit(box_call), on_result))
+        self.calls_submitted += 1
+        self.collect_finished()
+
+    def submit_upload(self, box_folder, dir_entry_node_file, box_index=None, is_verbose=False, chunked_uploader=None):
+        """Upload a local file into a Box Folder on a worker thread
+
+        :param box_folder: A Box Folder that already exists to upload the file into
+        :type  box_folder: Folder
+        :param dir_entry_node_file: A file DirEntryNode object to upload
+        :type  dir_entry_node_file: DirEntryNode
+        :param box_index: A per-run index of Box Folder listings to record the new Box File in
+        :type  box_index: BoxFolderIndex, optional
+        :param is_verbose: A boolean flag for verbosity
+        :type  is_verbose: boolean
+        :param chunked_uploader: An uploader sending large files in parts through resumable Box upload sessions
+        :type  chunked_uploader: ChunkedUploader, optional
+        """
+        def on_result(box_subfile):
+            if box_index is not None:
+                box_index.add_item(box_folder, box_subfile)
+            if is_verbose:
+                dir_entry_node_file.print_subitem_action(box_subfile, "Creating")
+
+        self.submit(lambda: hlps.upload_local_file(box_folder, dir_entry_node_file.dir_entry.path, chunked_uploader),
+                    on_result)
+
+    def submit_update(self, box_folder, box_file, dir_entry_node_file, box_index=None, is_verbose=False,
+                      chunked_uploader=None):
+        """Update a Box File's contents from a local file on a worker thread
+
+        :param box_folder: A parent Box Folder of the Box File
+        :type  box_folder: Folder
+        :param box_file: A Box File to update
+        :type  box_file: File
+        :param dir_entry_node_file: A file DirEntryNode object with the new contents
+        :type  dir_entry_node_file: DirEntryNode
+        :param box_index: A per-run index of Box Folder listings to record the updated Box File in
+        :type  box_index: BoxFolderIndex, optional
+        :param is_verbose: A boolean flag for verbosity
+        :type  is_verbose: boolean
+        :param chunked_uploader: An uploader sending large files in parts through resumable Box upload sessions
+        :type  chunked_uploader: ChunkedUploader, optional
+        """
+        def on_result(box_subfile):
+            if box_index is not None:
+                box_index.add_item(box_folder, box_subfile)
+            if is_verbose:
+                dir_entry_node_file.print_subitem_action(box_subfile, "Updating")
+
+        self.submit(lambda: hlps.update_box_file_contents(box_file, dir_entry_node_file.dir_entry.path,
+                                                          chunked_uploader),
+                    on_result)
+
+    def collect_finished(self):
+        """Hand finished results to their callbacks, stopping at the first Box call still running
+
+        Raises the exception of any Box call that failed.
+        """
+        while self.pending and self.pending[0][0].done():
+            self.collect_next()
+
+    def collect_next(self, raise_errors=True):
+        """Block until the oldest outstanding Box call has finished, and hand its result to its callback
+
+        :param raise_errors: A boolean flag for raising a failed Box call's exception rather than skipping the call
+        :type  raise_errors: boolean
+        """
+        future, on_result = self.pending.popleft()
+        if not raise_errors and future.exception() is not None:
+            return
+        result = future.result()
+        if on_result is not None:
+            on_result(result)
+
+    def wait(self, raise_errors=True):
+        """Block until every submitted Box call has finished, handing results to their callbacks in order
+
+        Raises the exception of any Box call that failed, unless `raise_errors` is False.
+
+        :param raise_errors: A boolean flag for raising failed Box calls' exceptions rather than skipping those calls
+        :type  raise_errors: boolean
+        """
+        while self.pending:
+            self.collect_next(raise_errors)
+
+    def shutdown(self, raise_errors=True):
+        """Wait for outstanding Box calls and stop the worker threads; calling it again does nothing more
+
+        :param raise_errors: A boolean flag for raising failed Box calls' exceptions; pass False when shutting down
+                             after another error, so the Box calls that did finish are still recorded
+        :type  raise_errors: boolean
+        """
+        try:
+            self.wait(raise_errors=raise_errors)
+        finally:
+            self.thread_pool.shutdown(wait=True)
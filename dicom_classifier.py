@@ -0,0 +1,158 @@
+import re
+import pydicom
+from concurrent.futures import ProcessPoolExecutor
+
+import ummap_mri_sync_to_box_helpers as hlps
+
+###########
+# Globals #
+
+# Number of folders' DICOM file paths handed to a worker process at a time
+classify_chunksize = 4
+
+
+def read_series_descrip(dicom_path):
+    """Read the Series Description from a DICOM file header
+
+    :param dicom_path: A path to a DICOM Dataset file
+    :type  dicom_path: str
+
+    :return: A tuple of the path and its Series Description ("" if the file has none)
+    :rtype: (str, str)
+    """
+    dicom_dataset = hlps.read_local_dicom_header(dicom_path, ["SeriesDescription"])
+    return dicom_path, str(dicom_dataset.get("SeriesDescription", ""))
+
+
+def read_series_descrips(dicom_paths, rgx_sequence=None):
+    """Read the Series Descriptions from a folder's DICOM file headers; runs in worker processes, so it must be
+    top-level
+
+    :param dicom_paths: A list of paths to DICOM Dataset files, in the order pruning reads them
+    :type  dicom_paths: list[str]
+    :param rgx_sequence: A Regex to stop reading at the first match of, as pruning does; every file is read if None
+    :type  rgx_sequence: Regex, optional
+
+    :return: A list of tuples of each path read and its Series Description
+    :rtype: [(str, str)]
+    """
+    series_descrips = []
+    for dicom_path in dicom_paths:
+        series_descrips.append(read_series_descrip(dicom_path))
+        if rgx_sequence is not None and re.match(rgx_sequence, series_descrips[-1][1]):
+            break
+    return series_descrips
+
+
+def collect_candidate_file_groups(dir_entry_node, rgx_dicom=re.compile(r'^i\d+\.MRDC\.\d+$'),
+                                  series_sample_size=0, series_verify_size=0):
+    """Collect, folder by folder, the unclassified file DirEntryNode objects in a tree whose DICOM headers pruning
+    may need
+
+    :param dir_entry_node: A root DirEntryNode object
+    :type  dir_entry_node: DirEntryNode
+    :param rgx_dicom: A Regex matching the DICOM filenames
+    :type  rgx_dicom: Regex
+    :param series_sample_size: A number of files per series folder pruning will read; 0 collects every DICOM file of
+                               each folder, which pruning reads in order until one matches
+    :type  series_sample_size: int
+    :param series_verify_size: A number of the remaining files per series folder pruning will check
+    :type  series_verify_size: int
+
+    :return: A list of tuples of a folder's file DirEntryNode objects and whether pruning stops at the first match
+    :rtype: [([DirEntryNode], boolean)]
+    """
+    if series_sample_size > 0 and re.match(r'^s\d{5}$', dir_entry_node.dir_entry.name):
+        sample_files, verify_files = dir_entry_node.get_series_sample_files(series_sample_size, series_verify_size)
+        candidate_file_nodes, stops_at_match = sample_files + verify_files, False
+    else:
+        candidate_file_nodes, stops_at_match = dir_entry_node.child_dir_entry_node_files, True
+    candidate_file_nodes = [den_file for den_file in candidate_file_nodes
+                            if re.match(rgx_dicom, den_file.dir_entry.name)]
+
+    candidate_file_groups = [(candidate_file_nodes, stops_at_match)] if candidate_file_nodes else []
+    for dir_entry_node_folder in dir_entry_node.child_dir_entry_node_folders:
+        candidate_file_groups.extend(collect_candidate_file_groups(dir_entry_node_folder, rgx_dicom,
+                                                                   series_sample_size, series_verify_size))
+
+    return candidate_file_groups
+
+
+def classify_tree(dir_entry_node, rgx_sequence, classify_workers=1, header_index=None, series_sample_size=0,
+                  series_verify_size=0, is_verbose=False):
+    """Read the Series Description of every DICOM file pruning would read in a tree and store it on its DirEntryNode
+    object
+
+    Headers served by the DicomHeaderIndex are used as-is. The rest are parsed on a pool of `classify_workers`
+    processes, one folder's files at a time, read in pruning's order and, where pruning stops at the first match,
+    only up to it. Workers send back only (path, Series Description) tuples so little has to be pickled; with one
+    worker the headers are parsed in this process instead. Pruning afterwards reads no DICOM files.
+
+    :param dir_entry_node: A root DirEntryNode object
+    :type  dir_entry_node: DirEntryNode
+    :param rgx_sequence: A Regex for matching a DICOM Dataset Series Description
+    :type  rgx_sequence: Regex
+    :param classify_workers: A number of worker processes to parse DICOM headers on
+    :type  classify_workers: int
+    :param header_index: An on-disk index to serve DICOM header reads from and write new ones to
+    :type  header_index: DicomHeaderIndex, optional
+    :param series_sample_size: A number of files per series folder pruning will read; 0 reads each folder's files
+                               until one matches
+    :type  series_sample_size: int
+    :param series_verify_size: A number of the remaining files per series folder pruning will check
+    :type  series_verify_size: int
+    :param is_verbose: A boolean flag for verbosity
+    :type  is_verbose: boolean
+
+    :return: A number of DICOM headers parsed
+    :rtype: int
+    """
+    candidate_file_groups = collect_candidate_file_groups(dir_entry_node,
+                                                          series_sample_size=series_sample_size,
+                                                          series_verify_size=series_verify_size)
+
+    # Serve what the index has, handing each folder's remaining files to the workers; a folder whose indexed files
+    # already reached a match is settled
+    unindexed_file_nodes = {}
+    classify_tasks = []  # (paths, Regex or None) for `read_series_descrips`
+    n_files_classified = 0
+    for candidate_file_nodes, stops_at_match in candidate_file_groups:
+        task_dicom_paths = []
+        for den_file in candidate_file_nodes:
+            if den_file.series_descrip is None and not task_dicom_paths and header_index is not None:
+                header_dataset = header_index.lookup_dicom_dataset(den_file.dir_entry)
+                if header_dataset is not None:
+                    den_file.series_descrip = str(header_dataset.get("SeriesDescription", ""))
+            if den_file.series_descrip is None:
+                unindexed_file_nodes[den_file.dir_entry.path] = den_file
+                task_dicom_paths.append(den_file.dir_entry.path)
+            elif not task_dicom_paths:
+                n_files_classified += 1
+                if stops_at_match and re.match(rgx_sequence, den_file.series_descrip):
+                    break
+        if task_dicom_paths:
+            classify_tasks.append((task_dicom_paths, rgx_sequence if stops_at_match else None))
+
+    if classify_workers > 1 and len(classify_tasks) > 1:
+        with ProcessPoolExecutor(max_workers=classify_workers) as process_pool:
+            task_series_descrips = list(process_pool.map(read_series_descrips, *zip(*classify_tasks),
+                                                         chunksize=classify_chunksize))
+    else:
+        task_series_descrips = [read_series_descrips(*classify_task) for classify_task in classify_tasks]
+
+    n_headers_parsed = 0
+    for series_descrips in task_series_descrips:
+        for dicom_path, series_descrip in series_descrips:
+            den_file = unindexed_file_nodes[dicom_path]
+            den_file.series_descrip = series_descrip
+            if header_index is not None:
+                header_dataset = pydicom.Dataset()
+                header_dataset.SeriesDescription = series_descrip
+                header_index.store_dicom_dataset(den_file.dir_entry, header_dataset, ["SeriesDescription"])
+        n_headers_parsed += len(series_descrips)
+
+    if is_verbose:
+        print(f"Classified", f"{n_files_classified + n_headers_parsed}", f"DICOM files in",
+              f"{len(candidate_file_groups)} folders;",
+              f"{n_headers_parsed} headers parsed on {max(classify_workers, 1)} worker(s)")
+    return n_headers_parsed
@@ -0,0 +1,153 @@
+import os
+import json
+import sqlite3
+import pydicom
+
+import ummap_mri_sync_to_box_helpers as hlps
+
+###########
+# Globals #
+
+# Number of newly parsed headers to hold before committing them to the index
+commit_every = 500
+
+
+class DicomHeaderIndex:
+    """An on-disk SQLite index of DICOM header tags, keyed by file path, inode, size, and modified time"""
+
+    def __init__(self, db_path, header_tags=hlps.dicom_header_tags):
+        """Instantiation method for DicomHeaderIndex class
+
+        :param db_path: A path to the SQLite database file; it is created if it doesn't exist
+        :type  db_path: str
+        :param header_tags: A list of DICOM tag keywords to read and store for each file
+        :type  header_tags: list[str], optional
+        """
+        self.db_path = db_path
+        self.header_tags = list(header_tags)
+        self.header_tags_key = ",".join(sorted(self.header_tags))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncommitted = 0
+        self.visited_paths = set()
+
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS dicom_headers ("
+                                "  path TEXT PRIMARY KEY,"
+                                "  inode INTEGER NOT NULL,"
+                                "  size INTEGER NOT NULL,"
+                                "  mtime_ns INTEGER NOT NULL,"
+                                "  header_tags TEXT NOT NULL,"
+                                "  header_json TEXT NOT NULL"
+                                ")")
+        self.connection.commit()
+
+    def get_dicom_dataset(self, dir_entry_file):
+        """Get the header-only DICOM Dataset of a file, from the index if its row is still valid
+
+        A row is valid when the file's inode, size, and modified time, and the indexed tag list, all match.
+        Otherwise the header is parsed from the file and its row is written (or replaced).
+
+        :param dir_entry_file: A DirEntry file of a DICOM Dataset
+        :type  dir_entry_file: DirEntry
+
+        :return: A pydicom Dataset holding only the indexed header tags
+        :rtype: pydicom Dataset
+        """
+        header_dataset = self.lookup_dicom_dataset(dir_entry_file)
+        if header_dataset is not None:
+            return header_dataset
+
+        dicom_dataset = hlps.read_local_dicom_header(dir_entry_file.path, self.header_tags)
+        header_dataset = pydicom.Dataset()
+        for header_tag in self.header_tags:
+            if header_tag in dicom_dataset:
+                header_dataset[header_tag] = dicom_dataset[header_tag]
+        self.store_dicom_dataset(dir_entry_file, header_dataset)
+
+        return header_dataset
+
+    def lookup_dicom_dataset(self, dir_entry_file):
+        """Get the header-only DICOM Dataset of a file from the index, without ever parsing the file
+
+        :param dir_entry_file: A DirEntry file of a DICOM Dataset
+        :type  dir_entry_file: DirEntry
+
+        :return: A pydicom Dataset holding the indexed header tags, or None if the file has no valid row
+        :rtype: pydicom Dataset
+        """
+        self.visited_paths.add(dir_entry_file.path)
+        stat = dir_entry_file.stat()
+        row = self.connection.execute("SELECT header_json FROM dicom_headers "
+                                      "WHERE path = ? AND inode = ? AND size = ? AND mtime_ns = ? "
+                                      "AND header_tags = ?",
+                                      (dir_entry_file.path, stat.st_ino, stat.st_size, stat.st_mtime_ns,
+                                       self.header_tags_key)).fetchone()
+        if row:
+            self.hits += 1
+            return pydicom.Dataset.from_json(json.loads(row[0]))
+
+        self.misses += 1
+        return None
+
+    def store_dicom_dataset(self, dir_entry_file, header_dataset, header_tags=None):
+        """Write (or replace) a file's row with header tags parsed elsewhere, e.g., in a worker process
+
+        :param dir_entry_file: A DirEntry file of a DICOM Dataset
+        :type  dir_entry_file: DirEntry
+        :param header_dataset: A pydicom Dataset holding the parsed header tags
+        :type  header_dataset: pydicom Dataset
+        :param header_tags: A list of the tag keywords that were parsed; the index's own tags if None
+        :type  header_tags: list[str], optional
+        """
+        header_tags_key = self.header_tags_key if header_tags is None else ",".join(sorted(header_tags))
+        self.visited_paths.add(dir_entry_file.path)
+        stat = dir_entry_file.stat()
+        self.connection.execute("INSERT OR REPLACE INTO dicom_headers VALUES (?, ?, ?, ?, ?, ?)",
+                                (dir_entry_file.path, stat.st_ino, stat.st_size, stat.st_mtime_ns,
+                                 header_tags_key, json.dumps(header_dataset.to_json_dict())))
+        self.uncommitted += 1
+        if self.uncommitted >= commit_every:
+            self.commit()
+
+    def evict_unvisited_files(self, path_prefix=""):
+        """Delete rows of files under a path that weren't looked up or stored this run, e.g., deleted ones
+
+        Files are never stat'ed here, so on a network filesystem eviction costs no metadata round-trips. Call it only
+        after pruning the whole tree under `path_prefix`.
+
+        :param path_prefix: A directory path limiting which rows are checked to the files below it, e.g., the MRI
+                            folder path; every row is checked if empty
+        :type  path_prefix: str, optional
+
+        :return: A number of rows evicted
+        :rtype: int
+        """
+        path_prefix = path_prefix.rstrip(os.sep)
+        subdir_prefix = path_prefix + os.sep  # so "/data/mri" doesn't match rows under "/data/mri2"
+        paths = [row[0] for row in
+                 self.connection.execute("SELECT path FROM dicom_headers WHERE ? = '' OR substr(path, 1, ?) = ?",
+                                         (path_prefix, len(subdir_prefix), subdir_prefix))]
+        unvisited_paths = [(path,) for path in paths if path not in self.visited_paths]
+        self.connection.executemany("DELETE FROM dicom_headers WHERE path = ?", unvisited_paths)
+        self.commit()
+        self.evictions += len(unvisited_paths)
+        return len(unvisited_paths)
+
+    def commit(self):
+        """Commit newly written rows to the SQLite database file"""
+        self.connection.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        """Commit and close the SQLite database connection"""
+        self.commit()
+        self.connection.close()
+
+    def print_summary(self):
+        """Print hit, miss, and eviction counts for this run"""
+        print(f"DICOM header cache:",
+              f"{self.hits} hits,",
+              f"{self.misses} misses,",
+              f"{self.evictions} evicted")
@@ -1,12 +1,14 @@
 import os
 import re
-import pydicom
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
 from pytz import timezone
 from colored import fg, attr
 from boxsdk import JWTAuth, Client
 
 import ummap_mri_sync_to_box_helpers as hlps
+import box_folder_index as bfi
 
 ###########
 # Globals #
@@ -15,21 +17,99 @@ import ummap_mri_sync_to_box_helpers as hlps
 tz_east = timezone("US/Eastern")
 
 
+class NodeStat(namedtuple("NodeStat", ["st_ino", "st_size", "st_mtime_ns"])):
+    """The stat fields a DirEntryNode caches, with the same names as on an os.stat_result"""
+
+    __slots__ = ()
+
+    @property
+    def st_mtime(self):
+        return self.st_mtime_ns / 1e9
+
+
 class DirEntryNode:
-    """"""
+    """A compact node of a local folder or file tree
+
+    Nodes don't hold on to their os.DirEntry. Each keeps only its name, a parent link to build its path from, a
+    folder/file flag, and stat fields cached on first use, in `__slots__` rather than a per-instance `__dict__`.
+    Children are kept in dicts keyed by name, so adding, removing, and looking up a child by name are O(1). A node
+    stands in for its own DirEntry: `dir_entry` returns the node, which has `name`, `path`, `is_dir()`, `is_file()`,
+    and `stat()`.
+    """
+
+    __slots__ = ("name", "parent", "path_component", "depth", "is_folder", "st_ino", "st_size", "st_mtime_ns",
+                 "child_folders_by_name", "child_files_by_name", "series_descrip")
 
-    def __init__(self, dir_entry, depth=0):
+    def __init__(self, dir_entry, depth=0, parent=None):
         """Instantiation method for DirEntryNode class
 
         :param dir_entry: A DirEntry folder or file that is the primary data in the node
         :type  dir_entry: DirEntry
         :param depth: A depth of the node within its tree
         :type  depth: int
+        :param parent: A parent DirEntryNode object to build this node's path from; None for a root node
+        :type  parent: DirEntryNode, optional
         """
-        self.dir_entry = dir_entry
+        self.name = dir_entry.name
+        self.parent = parent
+        # A root node keeps the path of the directory holding it; other nodes' paths are built from their parents'
+        self.path_component = os.path.dirname(dir_entry.path) if parent is None else None
         self.depth = depth
-        self.child_dir_entry_node_folders = []
-        self.child_dir_entry_node_files = []
+        self.is_folder = dir_entry.is_dir()
+        self.st_ino = self.st_size = self.st_mtime_ns = None
+        # File nodes never get children, so they don't get dicts for them
+        self.child_folders_by_name = {} if self.is_folder else None
+        self.child_files_by_name = {} if self.is_folder else None
+        self.series_descrip = None  # DICOM Dataset Series Description, once a file node has been classified
+
+    @property
+    def dir_entry(self):
+        """The node itself, which answers the os.DirEntry calls made on it"""
+        return self
+
+    @property
+    def path(self):
+        if self.parent is None:
+            return os.path.join(self.path_component, self.name)
+        return os.path.join(self.parent.path, self.name)
+
+    def __fspath__(self):
+        return self.path
+
+    def is_dir(self, follow_symlinks=True):
+        return self.is_folder
+
+    def is_file(self, follow_symlinks=True):
+        return not self.is_folder
+
+    def stat(self, follow_symlinks=True):
+        """Get the node's inode, size, and modified time, statting the file only on first call
+
+        :return: A NodeStat
+        :rtype: NodeStat
+        """
+        if self.st_mtime_ns is None:
+            stat = os.stat(self.path)
+            self.st_ino, self.st_size, self.st_mtime_ns = stat.st_ino, stat.st_size, stat.st_mtime_ns
+        return NodeStat(self.st_ino, self.st_size, self.st_mtime_ns)
+
+    @property
+    def child_dir_entry_node_folders(self):
+        """A list of child folder DirEntryNode objects, in the order they were added"""
+        return list(self.child_folders_by_name.values()) if self.is_folder else []
+
+    @child_dir_entry_node_folders.setter
+    def child_dir_entry_node_folders(self, dir_entry_node_folders):
+        self.child_folders_by_name = {den_folder.name: den_folder for den_folder in dir_entry_node_folders}
+
+    @property
+    def child_dir_entry_node_files(self):
+        """A list of child file DirEntryNode objects, in the order they were added"""
+        return list(self.child_files_by_name.values()) if self.is_folder else []
+
+    @child_dir_entry_node_files.setter
+    def child_dir_entry_node_files(self, dir_entry_node_files):
+        self.child_files_by_name = {den_file.name: den_file for den_file in dir_entry_node_files}
 
     def add_child(self, dir_entry_node):
         """Add a passed child DirEntryNode object to the calling DirEntryNode object
@@ -37,10 +117,10 @@ class DirEntryNode:
         :param dir_entry_node: A DirEntryNode object to add as a child
         :type  dir_entry_node: DirEntry Node
         """
-        if dir_entry_node.dir_entry.is_dir():
-            self.child_dir_entry_node_folders.append(dir_entry_node)
-        if dir_entry_node.dir_entry.is_file():
-            self.child_dir_entry_node_files.append(dir_entry_node)
+        if dir_entry_node.is_folder:
+            self.child_folders_by_name[dir_entry_node.name] = dir_entry_node
+        else:
+            self.child_files_by_name[dir_entry_node.name] = dir_entry_node
 
     def remove_child(self, dir_entry_node):
         """Remove a padded child DirEntryNode object from the calling DirEntryNode object
@@ -48,12 +128,10 @@ class DirEntryNode:
         :param dir_entry_node: A DirEntryNode object to remove
         :type  dir_entry_node: DirEntryNode
         """
-        if dir_entry_node.dir_entry.is_dir():
-            self.child_dir_entry_node_folders = \
-                [child for child in self.child_dir_entry_node_folders if child != dir_entry_node]
-        elif dir_entry_node.dir_entry.is_file():
-            self.child_dir_entry_node_files = \
-                [child for child in self.child_dir_entry_node_files if child != dir_entry_node]
+        if dir_entry_node.is_folder:
+            self.child_folders_by_name.pop(dir_entry_node.name, None)
+        else:
+            self.child_files_by_name.pop(dir_entry_node.name, None)
 
     def search_at_or_below_for_file(self, rgx_file=r'^i\d+\.MRDC\.\d+$'):
         """Search for a file matching the passed Regex at or below the calling DirEntryNode object
@@ -105,64 +183,237 @@ class DirEntryNode:
 
         return found_series_descrip
 
-    def prune_nodes_without_dicom_dataset_series_descrip(self, rgx_sequence):
+    def prune_nodes_without_dicom_dataset_series_descrip(self, rgx_sequence,
+                                                         series_sample_size=0, series_verify_size=0,
+                                                         header_index=None):
         """Prune file nodes from calling DirEntryObject whose DICOM Data Series Descriptions don't match passed Regex
 
         :param rgx_sequence: A Regex for matching a DICOM Dataset at or below the calling DirEntryNode object
         :type  rgx_sequence: Regex
+        :param series_sample_size: A number of files to read per series folder; 0 reads files until one matches
+        :type  series_sample_size: int
+        :param series_verify_size: A number of the remaining files per series folder to check against the sample
+        :type  series_verify_size: int
+        :param header_index: An on-disk index to serve DICOM header reads from, if its rows are still valid
+        :type  header_index: DicomHeaderIndex, optional
         """
-        for dir_entry_node_folder in self.child_dir_entry_node_folders:
-            if dir_entry_node_folder.search_at_or_below_for_dicom_dataset_series_descrip(rgx_sequence):
-                dir_entry_node_folder.prune_nodes_without_dicom_dataset_series_descrip(rgx_sequence)
-            else:
-                self.remove_child(dir_entry_node_folder)
+        self.prune_tree_post_order(rgx_sequence, series_sample_size, series_verify_size, header_index)
+
+    def prune_tree_post_order(self, rgx_sequence, series_sample_size=0, series_verify_size=0, header_index=None):
+        """Prune child folder nodes without a matching DICOM Dataset Series Description in one post-order pass
+
+        Child folders are pruned before the calling DirEntryNode object is classified, and whether each child keeps
+        something is passed back up, so every DICOM file is read at most once no matter how deep it is in the tree.
+
+        :param rgx_sequence: A Regex for matching a DICOM Dataset at or below the calling DirEntryNode object
+        :type  rgx_sequence: Regex
+        :param series_sample_size: A number of files to read per series folder; 0 reads files until one matches
+        :type  series_sample_size: int
+        :param series_verify_size: A number of the remaining files per series folder to check against the sample
+        :type  series_verify_size: int
+        :param header_index: An on-disk index to serve DICOM header reads from, if its rows are still valid
+        :type  header_index: DicomHeaderIndex, optional
+
+        :return: A boolean whether a DICOM Dataset with passed Regex is kept at or below calling DirEntryNode object
+        :rtype: boolean
+        """
+        # Build a new dict instead of removing from the dict being looped over
+        self.child_folders_by_name = \
+            {name: dir_entry_node_folder for name, dir_entry_node_folder in self.child_folders_by_name.items()
+             if dir_entry_node_folder.prune_tree_post_order(rgx_sequence, series_sample_size, series_verify_size,
+                                                            header_index)}
+
+        if self.child_folders_by_name:
+            return True
+
+        if series_sample_size > 0 and re.match(r'^s\d{5}$', self.dir_entry.name):
+            return self.classify_series_by_sample(rgx_sequence, series_sample_size, series_verify_size, header_index)
 
-    def build_tree_from_node(self, rgx_folder, rgx_file):
+        for dir_entry_node_file in self.child_dir_entry_node_files:
+            if dir_entry_node_file.match_dicom_dataset_series_descrip(rgx_sequence, header_index):  # short circuit
+                return True
+
+        return False
+
+    def classify_series_by_sample(self, rgx_sequence, series_sample_size, series_verify_size=0, header_index=None):
+        """Classify a whole series folder from the DICOM Dataset Series Descriptions of its first few files
+
+        Every file in a GE series folder (e.g., s00003) shares one Series Description, so the first
+        `series_sample_size` files by instance number stand in for the rest. If `series_verify_size` is positive,
+        that many of the remaining files, evenly spaced, are checked too, and a warning is printed if any disagree.
+
+        :param rgx_sequence: A Regex for matching a DICOM Dataset Series Description
+        :type  rgx_sequence: Regex
+        :param series_sample_size: A number of files to read as the representative sample
+        :type  series_sample_size: int
+        :param series_verify_size: A number of the remaining files to check against the sample
+        :type  series_verify_size: int
+        :param header_index: An on-disk index to serve DICOM header reads from, if its rows are still valid
+        :type  header_index: DicomHeaderIndex, optional
+
+        :return: A boolean whether the series folder has a DICOM Dataset with passed Regex
+        :rtype: boolean
+        """
+        sample_files, verify_files = self.get_series_sample_files(series_sample_size, series_verify_size)
+
+        sample_matches = [den_file.match_dicom_dataset_series_descrip(rgx_sequence, header_index)
+                          for den_file in sample_files]
+        series_matches = any(sample_matches)
+
+        if not verify_files:
+            return series_matches
+
+        verify_matches = [den_file.match_dicom_dataset_series_descrip(rgx_sequence, header_index)
+                          for den_file in verify_files]
+
+        if all(match == series_matches for match in sample_matches + verify_matches):
+            return series_matches
+
+        # A disagreement means at least one file matched, which is enough to keep the series
+        print(f"Series Descriptions differ within", f"'{self.dir_entry.path}';", f"keeping whole series")
+        return True
+
+    def get_series_sample_files(self, series_sample_size, series_verify_size=0):
+        """Helper function: Get the file nodes of a series folder that stand in for the whole series
+
+        :param series_sample_size: A number of files, first by instance number, to use as the representative sample
+        :type  series_sample_size: int
+        :param series_verify_size: A number of the remaining files, evenly spaced, to check against the sample
+        :type  series_verify_size: int
+
+        :return: A tuple of lists of the sample file DirEntryNode objects and the verification file DirEntryNode objects
+        :rtype: ([DirEntryNode], [DirEntryNode])
+        """
+        sorted_dir_entry_node_files = sorted(self.child_dir_entry_node_files,
+                                             key=lambda den_file: int(den_file.dir_entry.name.split(".")[-1]))
+        sample_files = sorted_dir_entry_node_files[:series_sample_size]
+        remaining_files = sorted_dir_entry_node_files[series_sample_size:]
+
+        if series_verify_size <= 0 or not remaining_files:
+            return sample_files, []
+
+        verify_count = min(series_verify_size, len(remaining_files))
+        verify_files = [remaining_files[i * len(remaining_files) // verify_count] for i in range(verify_count)]
+        return sample_files, verify_files
+
+    def match_dicom_dataset_series_descrip(self, rgx_sequence, header_index=None):
+        """Check whether the calling file DirEntryNode object's DICOM Dataset Series Description matches passed Regex
+
+        :param rgx_sequence: A Regex for matching a DICOM Dataset Series Description
+        :type  rgx_sequence: Regex
+        :param header_index: An on-disk index to serve DICOM header reads from, if its rows are still valid
+        :type  header_index: DicomHeaderIndex, optional
+
+        :return: A boolean whether the DICOM Dataset Series Description matches the passed Regex
+        :rtype: boolean
+        """
+        if self.series_descrip is None:
+            dicom_dataset = self.get_local_dicom_dataset(header_index=header_index)
+            self.series_descrip = dicom_dataset.get("SeriesDescription", "")
+        return bool(re.match(rgx_sequence, self.series_descrip))
+
+    def build_tree_from_node(self, rgx_folder, rgx_file, dir_scan_snapshot=None, shard=None):
         """Build a DirEntryNode tree by adding children folders and files to the calling DirEntryNode object
 
         :param rgx_folder: A Regex for filtering which folders to add as children to the calling DirEntryNode
         :type  rgx_folder: Regex
         :param rgx_file: A Regex for filtering which files to add as children to the calling DirEntryNode
         :type  rgx_file: Regex
+        :param dir_scan_snapshot: A snapshot of directory listings to reuse for directories that haven't changed
+        :type  dir_scan_snapshot: DirScanSnapshot, optional
+        :param shard: A shard whose share of the calling DirEntryNode's children is the only share added
+        :type  shard: SyncShard, optional
         """
-        if not re.match(r'^s\d{5}$', self.dir_entry.name):
-            dir_entries = list(os.scandir(self.dir_entry))  # each item in called twice, so list is needed
+        dir_entry_folders, dir_entry_files = self.scan_child_dir_entries(rgx_folder, rgx_file, dir_scan_snapshot)
+        if shard is not None:
+            dir_entry_folders, dir_entry_files = shard.filter_dir_entries(dir_entry_folders, dir_entry_files)
 
-            dir_entry_folders = [dir_entry for dir_entry in dir_entries
-                                 if dir_entry.is_dir() and re.match(rgx_folder, dir_entry.name)]  # filter
-            dir_entry_files = [dir_entry for dir_entry in dir_entries
-                               if dir_entry.is_file() and re.match(rgx_file, dir_entry.name)]  # filter
+        for dir_entry_folder in dir_entry_folders:
+            new_dir_entry_node_folder = DirEntryNode(dir_entry_folder, depth=self.depth + 1, parent=self)
+            self.add_child(new_dir_entry_node_folder)
+            new_dir_entry_node_folder.build_tree_from_node(rgx_folder, rgx_file, dir_scan_snapshot)
 
-            for dir_entry_folder in dir_entry_folders:
-                new_dir_entry_node_folder = DirEntryNode(dir_entry_folder, depth=self.depth + 1)
-                self.add_child(new_dir_entry_node_folder)
-                new_dir_entry_node_folder.build_tree_from_node(rgx_folder, rgx_file)
+        for dir_entry_file in dir_entry_files:
+            new_dir_entry_node_file = DirEntryNode(dir_entry_file, depth=self.depth + 1, parent=self)
+            self.add_child(new_dir_entry_node_file)
 
-            for dir_entry_file in dir_entry_files:
-                new_dir_entry_node_file = DirEntryNode(dir_entry_file, depth=self.depth + 1)
-                self.add_child(new_dir_entry_node_file)
+    def build_tree_from_node_parallel(self, rgx_folder, rgx_file, max_workers=8, dir_scan_snapshot=None,
+                                      shard=None):
+        """Build the same DirEntryNode tree as `build_tree_from_node`, listing many directories at once
 
-        else:
+        Each directory is listed on a thread pool as soon as its parent has been listed, so sibling subject/session
+        directories are listed at the same time. Children are still added in each directory's own listing order, so
+        the tree is identical to the one the serial builder makes.
+
+        :param rgx_folder: A Regex for filtering which folders to add as children to the calling DirEntryNode
+        :type  rgx_folder: Regex
+        :param rgx_file: A Regex for filtering which files to add as children to the calling DirEntryNode
+        :type  rgx_file: Regex
+        :param max_workers: A number of directories to list at once
+        :type  max_workers: int
+        :param dir_scan_snapshot: A snapshot of directory listings to reuse for directories that haven't changed
+        :type  dir_scan_snapshot: DirScanSnapshot, optional
+        :param shard: A shard whose share of the calling DirEntryNode's children is the only share added
+        :type  shard: SyncShard, optional
+        """
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scandir") as thread_pool:
+            pending_scans = {thread_pool.submit(self.scan_child_dir_entries, rgx_folder, rgx_file,
+                                                dir_scan_snapshot): self}
+
+            while pending_scans:
+                done_scans, _ = wait(pending_scans, return_when=FIRST_COMPLETED)
+                for done_scan in done_scans:
+                    dir_entry_node = pending_scans.pop(done_scan)
+                    dir_entry_folders, dir_entry_files = done_scan.result()
+                    if shard is not None and dir_entry_node is self:
+                        dir_entry_folders, dir_entry_files = shard.filter_dir_entries(dir_entry_folders,
+                                                                                      dir_entry_files)
+
+                    for dir_entry_folder in dir_entry_folders:
+                        new_dir_entry_node_folder = DirEntryNode(dir_entry_folder, depth=dir_entry_node.depth + 1,
+                                                                 parent=dir_entry_node)
+                        dir_entry_node.add_child(new_dir_entry_node_folder)
+                        pending_scans[thread_pool.submit(new_dir_entry_node_folder.scan_child_dir_entries,
+                                                         rgx_folder, rgx_file, dir_scan_snapshot)] = \
+                            new_dir_entry_node_folder
+
+                    for dir_entry_file in dir_entry_files:
+                        new_dir_entry_node_file = DirEntryNode(dir_entry_file, depth=dir_entry_node.depth + 1,
+                                                               parent=dir_entry_node)
+                        dir_entry_node.add_child(new_dir_entry_node_file)
+
+    def scan_child_dir_entries(self, rgx_folder, rgx_file, dir_scan_snapshot=None):
+        """Helper function: List the child folders and files of the calling DirEntryNode object that match Regexes
+
+        :param rgx_folder: A Regex for filtering which folders to return
+        :type  rgx_folder: Regex
+        :param rgx_file: A Regex for filtering which files to return
+        :type  rgx_file: Regex
+        :param dir_scan_snapshot: A snapshot to return the stored listing from, if the directory hasn't changed
+        :type  dir_scan_snapshot: DirScanSnapshot, optional
+
+        :return: A tuple of lists of child DirEntry folders and DirEntry files, in listing order
+        :rtype: ([DirEntry], [DirEntry])
+        """
+        if dir_scan_snapshot is not None:
+            return dir_scan_snapshot.scan_child_dir_entries(self, rgx_folder, rgx_file)
+
+        if re.match(r'^s\d{5}$', self.dir_entry.name):
             # Ensure there are fewer than 250 files in the directory; T1s and T2 Flairs have no more than ~200 files
             item_count = len(os.listdir(self.dir_entry.path))
             # print(f"Number of items in {self.dir_entry.name}: {item_count}")
 
-            if item_count < 250:
-                dir_entries = list(os.scandir(self.dir_entry))  # each item in called twice, so list is needed
+            if item_count >= 250:
+                return [], []
 
-                dir_entry_folders = [dir_entry for dir_entry in dir_entries
-                                     if dir_entry.is_dir() and re.match(rgx_folder, dir_entry.name)]  # filter
-                dir_entry_files = [dir_entry for dir_entry in dir_entries
-                                   if dir_entry.is_file() and re.match(rgx_file, dir_entry.name)]  # filter
+        dir_entries = list(os.scandir(self.dir_entry))  # each item in called twice, so list is needed
 
-                for dir_entry_folder in dir_entry_folders:
-                    new_dir_entry_node_folder = DirEntryNode(dir_entry_folder, depth=self.depth + 1)
-                    self.add_child(new_dir_entry_node_folder)
-                    new_dir_entry_node_folder.build_tree_from_node(rgx_folder, rgx_file)
+        dir_entry_folders = [dir_entry for dir_entry in dir_entries
+                             if dir_entry.is_dir() and re.match(rgx_folder, dir_entry.name)]  # filter
+        dir_entry_files = [dir_entry for dir_entry in dir_entries
+                           if dir_entry.is_file() and re.match(rgx_file, dir_entry.name)]  # filter
 
-                for dir_entry_file in dir_entry_files:
-                    new_dir_entry_node_file = DirEntryNode(dir_entry_file, depth=self.depth + 1)
-                    self.add_child(new_dir_entry_node_file)
+        return dir_entry_folders, dir_entry_files
 
     def print_node(self):
         """Print a hierarchical representation of the calling DirEntryNode object"""
@@ -174,7 +425,9 @@ class DirEntryNode:
         for dir_entry_node_file in self.child_dir_entry_node_files:
             print("  " * dir_entry_node_file.depth + dir_entry_node_file.dir_entry.name)
 
-    def sync_tree_object_items(self, box_folder, update_files=False, remove_items=False, is_verbose=False):
+    def sync_tree_object_items(self, box_folder, update_files=False, remove_items=False, is_verbose=False,
+                               box_index=None, upload_executor=None, chunked_uploader=None, series_bundler=None,
+                               hash_index=None):
         """Sync to box the folders and files in the tree composed of the calling DirEntry object
 
         :param box_folder: A Box Folder to sync the calling DirEntryNode object's contents into
@@ -185,22 +438,41 @@ class DirEntryNode:
         :type  remove_items: boolean
         :param is_verbose: A boolean flag for verbosity
         :type  is_verbose: boolean
+        :param box_index: A per-run index of Box Folder listings; a new one is started if none is passed
+        :type  box_index: BoxFolderIndex, optional
+        :param upload_executor: A thread pool to run uploads on; uploads run one at a time on this thread if None
+        :type  upload_executor: BoxUploadExecutor, optional
+        :param chunked_uploader: An uploader sending large files in parts through resumable Box upload sessions
+        :type  chunked_uploader: ChunkedUploader, optional
+        :param series_bundler: A bundler uploading each series folder as one archive; series are walked if None
+        :type  series_bundler: SeriesBundler, optional
+        :param hash_index: An index of local SHA-1s to update Box Files by content; timestamps are compared if None
+        :type  hash_index: FileHashIndex, optional
         """
-        box_subitems = hlps.get_box_subitems(box_folder)
+        if box_index is None:
+            box_index = bfi.BoxFolderIndex()
+
+        box_subitems = box_index.get_subitems(box_folder)
         box_subfolders = hlps.get_box_subfolders(box_subitems)
         box_subfiles = hlps.get_box_subfiles(box_subitems)
 
         if remove_items:
-            self.remove_box_subfolders(box_subfolders, is_verbose)
-            self.remove_box_subfiles(box_subfiles, is_verbose)
+            self.remove_box_subfolders(box_subfolders, is_verbose, box_index)
+            self.remove_box_subfiles(box_subfiles, is_verbose, box_index, series_bundler)
 
-        self.create_box_subfolders(box_folder, box_subfolders, remove_items, update_files, is_verbose)
-        self.create_box_subfiles(box_folder, box_subfiles, is_verbose)
+        self.create_box_subfolders(box_folder, box_subfolders, update_files=update_files, remove_items=remove_items,
+                                   is_verbose=is_verbose, box_index=box_index, upload_executor=upload_executor,
+                                   chunked_uploader=chunked_uploader, series_bundler=series_bundler,
+                                   hash_index=hash_index)
+        self.create_box_subfiles(box_folder, box_subfiles, is_verbose, box_index, upload_executor, chunked_uploader)
 
         if update_files:
-            self.update_box_subfiles(box_folder, box_subfiles, is_verbose)
+            self.update_box_subfiles(box_folder, box_subfiles, is_verbose, box_index, upload_executor,
+                                     chunked_uploader, hash_index)
 
-    def create_box_subfolders(self, box_folder, box_subfolders, update_files, remove_items, is_verbose):
+    def create_box_subfolders(self, box_folder, box_subfolders, update_files, remove_items, is_verbose,
+                              box_index, upload_executor=None, chunked_uploader=None, series_bundler=None,
+                              hash_index=None):
         """Helper function: Create Box subFolders based on child folders in calling DirEntryNode object
 
         :param box_folder: A Box Folder to sync the calling DirEntryNode object's contents into
@@ -213,45 +485,104 @@ class DirEntryNode:
         :type  remove_items: boolean
         :param is_verbose: A boolean flag for verbosity
         :type  is_verbose: boolean
+        :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+        :type  box_index: BoxFolderIndex
+        :param upload_executor: A thread pool to run uploads on; uploads run one at a time on this thread if None
+        :type  upload_executor: BoxUploadExecutor, optional
+        :param chunked_uploader: An uploader sending large files in parts through resumable Box upload sessions
+        :type  chunked_uploader: ChunkedUploader, optional
+        :param series_bundler: A bundler uploading each series folder as one archive; series are walked if None
+        :type  series_bundler: SeriesBundler, optional
+        :param hash_index: An index of local SHA-1s to update Box Files by content; timestamps are compared if None
+        :type  hash_index: FileHashIndex, optional
         """
-        box_subfolder_names = [box_subfolder.name for box_subfolder in box_subfolders]
+        box_subfolder_names = {box_subfolder.name for box_subfolder in box_subfolders}
+
+        if series_bundler is not None:
+            for dir_entry_node_folder in self.child_dir_entry_node_folders:
+                if series_bundler.is_series_node(dir_entry_node_folder):
+                    dir_entry_node_folder.upload_series_bundle(box_folder, series_bundler, update_files, is_verbose,
+                                                               box_index, upload_executor)
 
         subfolders_in_treeobj_not_in_box = \
             [dir_entry_node_subfolder for dir_entry_node_subfolder in self.child_dir_entry_node_folders
-             if dir_entry_node_subfolder.dir_entry.name not in box_subfolder_names]  # filter
+             if dir_entry_node_subfolder.dir_entry.name not in box_subfolder_names and
+             not (series_bundler is not None and series_bundler.is_series_node(dir_entry_node_subfolder))]  # filter
 
         subfolders_in_treeobj_in_box = \
             [dir_entry_node_subfolder for dir_entry_node_subfolder in self.child_dir_entry_node_folders
-             if dir_entry_node_subfolder.dir_entry.name in box_subfolder_names]  # filter
+             if dir_entry_node_subfolder.dir_entry.name in box_subfolder_names and
+             not (series_bundler is not None and series_bundler.is_series_node(dir_entry_node_subfolder))]  # filter
 
         for dir_entry_node_folder in subfolders_in_treeobj_not_in_box:  # depth-first
-            box_subfolder = box_folder.create_subfolder(dir_entry_node_folder.dir_entry.name)
+            # Created on this thread, so the Box subFolder exists before any upload into it is submitted
+            box_subfolder, is_new = hlps.create_box_subfolder(box_folder, dir_entry_node_folder.dir_entry.name)
+            box_index.add_new_folder(box_folder, box_subfolder, is_new)
             if is_verbose:
                 dir_entry_node_folder.print_subitem_action(box_subfolder, "Creating")
-            dir_entry_node_folder.sync_tree_object_items(box_subfolder, update_files, remove_items, is_verbose)
+            dir_entry_node_folder.sync_tree_object_items(box_subfolder, update_files, remove_items, is_verbose,
+                                                         box_index, upload_executor, chunked_uploader, series_bundler,
+                                                         hash_index)
 
         for dir_entry_node_folder in subfolders_in_treeobj_in_box:
-            box_subfolder = hlps.get_corresponding_box_subfolder(dir_entry_node_folder.dir_entry, box_folder)
-            dir_entry_node_folder.sync_tree_object_items(box_subfolder, update_files, remove_items, is_verbose)
+            box_subfolder = hlps.get_corresponding_box_subfolder(dir_entry_node_folder.dir_entry, box_folder,
+                                                                 box_index)
+            dir_entry_node_folder.sync_tree_object_items(box_subfolder, update_files, remove_items, is_verbose,
+                                                         box_index, upload_executor, chunked_uploader, series_bundler,
+                                                         hash_index)
 
-    def remove_box_subfolders(self, box_subfolders, is_verbose):
+    def upload_series_bundle(self, box_folder, series_bundler, update_files, is_verbose, box_index,
+                             upload_executor=None):
+        """Helper function: Upload the calling series DirEntryNode object as one archive into its parent's Box Folder
+
+        :param box_folder: A Box Folder corresponding to the calling DirEntryNode object's parent
+        :type  box_folder: Box Folder
+        :param series_bundler: A bundler uploading each series folder as one archive
+        :type  series_bundler: SeriesBundler
+        :param update_files: A boolean flag for replacing archives whose local files changed
+        :type  update_files: boolean
+        :param is_verbose: A boolean flag for verbosity
+        :type  is_verbose: boolean
+        :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+        :type  box_index: BoxFolderIndex
+        :param upload_executor: A thread pool to run uploads on; uploads run one at a time on this thread if None
+        :type  upload_executor: BoxUploadExecutor, optional
+        """
+        box_subitems_by_name = dict(box_index.get_subitems_by_name(box_folder))
+
+        def on_result(uploaded):
+            for action_str, box_subfile in uploaded:
+                box_index.add_item(box_folder, box_subfile)
+                if is_verbose:
+                    self.print_subitem_action(box_subfile, action_str)
+
+        def upload_series():
+            return series_bundler.upload_series(box_folder, self, box_subitems_by_name, update_files)
+
+        if upload_executor is not None:
+            upload_executor.submit(upload_series, on_result)
+        else:
+            on_result(upload_series())
+
+    def remove_box_subfolders(self, box_subfolders, is_verbose, box_index):
         """Helper function: Remove Box subFolders based on absent child folders in calling DirEntryNode object
 
         :param box_subfolders: A list of child Box Folders in Box Folder corresponding to calling DirEntryNode object
         :type  box_subfolders: [Box Folder]
         :param is_verbose: A boolean flag for verbosity
         :type  is_verbose: boolean
+        :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+        :type  box_index: BoxFolderIndex
         """
-        dir_entry_node_subfolder_names = \
-            [dir_entry_node_subfolder.dir_entry.name for dir_entry_node_subfolder in self.child_dir_entry_node_folders]
-
         subfolders_in_box_not_in_treeobj = \
             [box_subfolder for box_subfolder in box_subfolders
-             if box_subfolder.name not in dir_entry_node_subfolder_names]
+             if box_subfolder.name not in self.child_folders_by_name]
 
         for box_subfolder in subfolders_in_box_not_in_treeobj:
             box_subfolder_id, box_subfolder_name = box_subfolder.id, box_subfolder.name
             box_subfolder_deleted = box_subfolder.delete(recursive=True)
+            if box_subfolder_deleted:
+                box_index.remove_item(box_subfolder)
             if box_subfolder_deleted and is_verbose:
                 print("  " * (self.depth + 1) +
                       f"Removed Box subFolder",
@@ -259,7 +590,8 @@ class DirEntryNode:
                       f"with ID",
                       f"'{box_subfolder_id}'")
 
-    def create_box_subfiles(self, box_folder, box_subfiles, is_verbose):
+    def create_box_subfiles(self, box_folder, box_subfiles, is_verbose, box_index, upload_executor=None,
+                            chunked_uploader=None):
         """
 
         :param box_folder: A Box Folder to sync the calling DirEntryNode object's contents into
@@ -267,20 +599,32 @@ class DirEntryNode:
         :param box_subfiles: A list of child Box Files in the Box Folder corresponding to calling DirEntryNode object
         :param is_verbose: A boolean flag for verbosity
         :type  is_verbose: boolean
+        :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+        :type  box_index: BoxFolderIndex
+        :param upload_executor: A thread pool to run uploads on; uploads run one at a time on this thread if None
+        :type  upload_executor: BoxUploadExecutor, optional
+        :param chunked_uploader: An uploader sending large files in parts through resumable Box upload sessions
+        :type  chunked_uploader: ChunkedUploader, optional
         """
-        box_subfile_names = [box_subfile.name for box_subfile in box_subfiles]
+        box_subfile_names = {box_subfile.name for box_subfile in box_subfiles}
 
         subfiles_in_treeobj_not_in_box = \
             [dir_entry_node_subfile for dir_entry_node_subfile in self.child_dir_entry_node_files
              if dir_entry_node_subfile.dir_entry.name not in box_subfile_names]  # filter
 
         for dir_entry_node_file in subfiles_in_treeobj_not_in_box:
-            box_subfile = box_folder.upload(dir_entry_node_file.dir_entry.path, preflight_check=True)
+            if upload_executor is not None:
+                upload_executor.submit_upload(box_folder, dir_entry_node_file, box_index, is_verbose,
+                                              chunked_uploader)
+                continue
+            box_subfile = hlps.upload_local_file(box_folder, dir_entry_node_file.dir_entry.path, chunked_uploader)
+            box_index.add_item(box_folder, box_subfile)
             if is_verbose:
                 dir_entry_node_file.print_subitem_action(box_subfile, "Creating")
 
-    def update_box_subfiles(self, box_folder, box_subfiles, is_verbose):
-        """Helper function: Update Box subFiles based on timestamps of child files in calling DirEntryNode object
+    def update_box_subfiles(self, box_folder, box_subfiles, is_verbose, box_index, upload_executor=None,
+                            chunked_uploader=None, hash_index=None):
+        """Helper function: Update Box subFiles whose child files in calling DirEntryNode object are newer or differ
 
         :param box_folder: A Box Folder to sync the calling DirEntryNode object's contents into
         :type  box_folder: Box Folder
@@ -288,8 +632,16 @@ class DirEntryNode:
         :type  box_subfiles: [Box File]
         :param is_verbose: A boolean flag for verbosity
         :type  is_verbose: boolean
+        :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+        :type  box_index: BoxFolderIndex
+        :param upload_executor: A thread pool to run uploads on; uploads run one at a time on this thread if None
+        :type  upload_executor: BoxUploadExecutor, optional
+        :param chunked_uploader: An uploader sending large files in parts through resumable Box upload sessions
+        :type  chunked_uploader: ChunkedUploader, optional
+        :param hash_index: An index of local SHA-1s to update Box Files by content; timestamps are compared if None
+        :type  hash_index: FileHashIndex, optional
         """
-        box_subfile_names = [box_subfile.name for box_subfile in box_subfiles]
+        box_subfile_names = {box_subfile.name for box_subfile in box_subfiles}
 
         subfiles_in_treeobj_in_box = \
             [dir_entry_node_subfile for dir_entry_node_subfile in self.child_dir_entry_node_files
@@ -297,32 +649,68 @@ class DirEntryNode:
 
         for dir_entry_node_file in subfiles_in_treeobj_in_box:
             den_file_de = dir_entry_node_file.dir_entry
-            corres_box_subfile = hlps.get_corresponding_box_subfile(den_file_de, box_folder)
+            corres_box_subfile = hlps.get_corresponding_box_subfile(den_file_de, box_folder, box_index)
+
+            # Update corres_box_subfile with contents of more recent (or, by hash, different) local_subfile
+            if dir_entry_node_file.differs_from_box_subfile(corres_box_subfile, hash_index):
+                if upload_executor is not None:
+                    upload_executor.submit_update(box_folder, corres_box_subfile, dir_entry_node_file, box_index,
+                                                  is_verbose, chunked_uploader)
+                    continue
+                box_subfile = hlps.update_box_file_contents(corres_box_subfile, den_file_de.path, chunked_uploader)
+                box_index.add_item(box_folder, box_subfile)
+                if is_verbose:
+                    dir_entry_node_file.print_subitem_action(box_subfile, "Updating")
 
-            # Local subfile modified timestamp
-            den_file_de_modified_psx = den_file_de.stat().st_mtime
-            den_file_de_modified_dt = datetime.fromtimestamp(den_file_de_modified_psx, tz=tz_east)
+    def differs_from_box_subfile(self, box_subfile, hash_index=None):
+        """Helper function: Check whether the calling file DirEntryNode object should replace its Box subFile
 
-            # Corresponding Box subFile modified timestamp
-            corres_box_subfile_modified_str = corres_box_subfile.modified_at
-            corres_box_subfile_modified_dt = datetime.fromisoformat(corres_box_subfile_modified_str)
+        :param box_subfile: A Box File corresponding to the calling DirEntryNode object
+        :type  box_subfile: Box File
+        :param hash_index: An index of local SHA-1s to compare against the Box File's; timestamps are compared if None
+        :type  hash_index: FileHashIndex, optional
 
-            # Update corres_box_subfile with contents of more recent local_subfile
-            if den_file_de_modified_dt > corres_box_subfile_modified_dt:
-                box_subfile = corres_box_subfile.update_contents(den_file_de.path, preflight_check=True)
-                if is_verbose:
-                    dir_entry_node_file.print_subitem_action(box_subfile, "Updating")
+        :return: A boolean whether the local file should be uploaded as a new version of the Box File
+        :rtype: boolean
+        """
+        if hash_index is None:
+            return self.is_newer_than_box_subfile(box_subfile)
+        return hash_index.differs_from_box_subfile(self.dir_entry, box_subfile)
 
-    def remove_box_subfiles(self, box_subfiles, is_verbose):
+    def is_newer_than_box_subfile(self, box_subfile):
+        """Helper function: Check whether the calling file DirEntryNode object was modified after its Box subFile
+
+        :param box_subfile: A Box File corresponding to the calling DirEntryNode object
+        :type  box_subfile: Box File
+
+        :return: A boolean whether the local file is more recent than the Box File
+        :rtype: boolean
+        """
+        # Local subfile modified timestamp
+        den_file_de_modified_psx = self.dir_entry.stat().st_mtime
+        den_file_de_modified_dt = datetime.fromtimestamp(den_file_de_modified_psx, tz=tz_east)
+
+        # Corresponding Box subFile modified timestamp
+        box_subfile_modified_str = box_subfile.modified_at
+        box_subfile_modified_dt = datetime.fromisoformat(box_subfile_modified_str)
+
+        return den_file_de_modified_dt > box_subfile_modified_dt
+
+    def remove_box_subfiles(self, box_subfiles, is_verbose, box_index, series_bundler=None):
         """Helper function: Remove Box subFiles based on absent child files in calling DirEntryNode object
 
         :param box_subfiles: A list of child Box Files in Box Folder corresponding to calling DirEntryNode object
         :type  box_subfiles: [Box File]
         :param is_verbose: A boolean flag for verbosity
         :type  is_verbose: boolean
+        :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+        :type  box_index: BoxFolderIndex
+        :param series_bundler: A bundler whose series archives and index sidecars are kept too
+        :type  series_bundler: SeriesBundler, optional
         """
-        dir_entry_node_subfile_names = \
-            [dir_entry_node_subfile.dir_entry.name for dir_entry_node_subfile in self.child_dir_entry_node_files]
+        dir_entry_node_subfile_names = set(self.child_files_by_name)
+        if series_bundler is not None:
+            dir_entry_node_subfile_names.update(series_bundler.get_bundle_names(self))
 
         subfiles_in_box_not_in_treeobj = \
             [box_subfile for box_subfile in box_subfiles
@@ -331,6 +719,8 @@ class DirEntryNode:
         for box_subfile in subfiles_in_box_not_in_treeobj:
             box_subfile_id, box_subfile_name = box_subfile.id, box_subfile.name
             box_subfile_deleted = box_subfile.delete()
+            if box_subfile_deleted:
+                box_index.remove_item(box_subfile)
             if box_subfile_deleted and is_verbose:
                 print("  " * (self.depth + 1) +
                       f"Removed Box subFile",
@@ -353,17 +743,18 @@ class DirEntryNode:
     ###########################
     # DICOM Handler Functions #
 
-    def get_local_dicom_dataset(self, rgx_dicom=re.compile(r'^i\d+\.MRDC\.\d+$')):
+    def get_local_dicom_dataset(self, rgx_dicom=re.compile(r'^i\d+\.MRDC\.\d+$'), header_only=True,
+                                header_index=None):
         """"Get the DICOM Dataset from the file that matches the provided Regex
 
         :param rgx_dicom: A Regex for matching a DICOM Dataset file
         :type  rgx_dicom: Regex
+        :param header_only: A boolean flag for reading only the header tags the filters need, skipping pixel data
+        :type  header_only: boolean
+        :param header_index: An on-disk index to serve DICOM header reads from, if its rows are still valid
+        :type  header_index: DicomHeaderIndex, optional
 
         :return: A pydicom Dataset
         :rtype: pydicom Dataset
         """
-        dicom_dataseries = pydicom.Dataset()
-        if re.match(rgx_dicom, self.dir_entry.name):
-            dicom_dataseries = pydicom.dcmread(self.dir_entry.path)
-
-        return dicom_dataseries
+        return hlps.get_local_dicom_dataset(self.dir_entry, rgx_dicom, header_only, header_index)
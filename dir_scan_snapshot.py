@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import namedtuple
+
+###########
+# Globals #
+
+# Number of newly scanned directories to hold before committing them to the snapshot
+commit_every = 500
+
+# A directory modified this close to when it was listed may have changed again within the same mtime tick, so its
+# listing isn't trusted (as with git's "racily clean" index entries); NFS and FAT mtimes can be this coarse
+racy_window_ns = 2 * 10 ** 9
+
+
+class SnapshotDirEntry(namedtuple("SnapshotDirEntry", ["name", "path", "is_folder"])):
+    """A stand-in for an os.DirEntry rebuilt from a stored directory listing, for making DirEntryNode objects"""
+
+    __slots__ = ()
+
+    def is_dir(self, follow_symlinks=True):
+        return self.is_folder
+
+    def is_file(self, follow_symlinks=True):
+        return not self.is_folder
+
+
+class DirScanSnapshot:
+    """An on-disk SQLite snapshot of local directory listings, keyed by directory path, inode, and modified time
+
+    Each row holds the names of a directory's child folders and files that matched the folder and file Regexes.
+    Creating, renaming, or deleting an entry changes a directory's modified time, so while a directory's inode and
+    modified time are unchanged, its stored listing is returned with one stat instead of listing it again. Child
+    folders are checked the same way when the tree is built down into them.
+    """
+
+    def __init__(self, db_path, rescan_all=False):
+        """Instantiation method for DirScanSnapshot class
+
+        :param db_path: A path to the SQLite database file; it is created if it doesn't exist
+        :type  db_path: str
+        :param rescan_all: A boolean flag for listing every directory again, while still writing a new snapshot
+        :type  rescan_all: boolean, optional
+        """
+        self.db_path = db_path
+        self.rescan_all = rescan_all
+        self.lock = threading.Lock()  # directories are listed from scan worker threads
+        self.visited_paths = set()
+        self.hits = 0
+        self.misses = 0
+        self.racy = 0
+        self.evictions = 0
+        self.uncommitted = 0
+
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS dir_listings ("
+                                "  path TEXT PRIMARY KEY,"
+                                "  inode INTEGER NOT NULL,"
+                                "  mtime_ns INTEGER NOT NULL,"
+                                "  scanned_at_ns INTEGER NOT NULL,"
+                                "  regexes TEXT NOT NULL,"
+                                "  folder_names_json TEXT NOT NULL,"
+                                "  file_names_json TEXT NOT NULL"
+                                ")")
+        self.connection.commit()
+
+    def scan_child_dir_entries(self, dir_entry_node, rgx_folder, rgx_file):
+        """List the child folders and files of a folder DirEntryNode object that match Regexes, from the snapshot if
+        its row is still valid
+
+        A row is valid when the directory's inode and modified time, and the Regexes, all match, and the directory
+        wasn't modified within `racy_window_ns` of being listed. Otherwise the directory is listed and its row is
+        written (or replaced).
+
+        :param dir_entry_node: A folder DirEntryNode object
+        :type  dir_entry_node: DirEntryNode
+        :param rgx_folder: A Regex for filtering which folders to return
+        :type  rgx_folder: Regex
+        :param rgx_file: A Regex for filtering which files to return
+        :type  rgx_file: Regex
+
+        :return: A tuple of lists of child DirEntry (or SnapshotDirEntry) folders and files, in listing order
+        :rtype: ([DirEntry], [DirEntry])
+        """
+        path = dir_entry_node.dir_entry.path
+        regexes = f"{rgx_folder.pattern}\n{rgx_file.pattern}"
+        stat = os.stat(path)  # before listing, so a change made while listing shows up as a new mtime next run
+
+        row = None
+        with self.lock:
+            self.visited_paths.add(path)
+            if not self.rescan_all:
+                row = self.connection.execute("SELECT scanned_at_ns, folder_names_json, file_names_json "
+                                              "FROM dir_listings "
+                                              "WHERE path = ? AND inode = ? AND mtime_ns = ? AND regexes = ?",
+                                              (path, stat.st_ino, stat.st_mtime_ns, regexes)).fetchone()
+            if row and stat.st_mtime_ns + racy_window_ns < row[0]:
+                self.hits += 1
+                return ([SnapshotDirEntry(name, os.path.join(path, name), True) for name in json.loads(row[1])],
+                        [SnapshotDirEntry(name, os.path.join(path, name), False) for name in json.loads(row[2])])
+            if row:
+                self.racy += 1
+            self.misses += 1
+
+        dir_entry_folders, dir_entry_files = dir_entry_node.scan_child_dir_entries(rgx_folder, rgx_file)
+
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO dir_listings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    (path, stat.st_ino, stat.st_mtime_ns, time.time_ns(), regexes,
+                                     json.dumps([dir_entry.name for dir_entry in dir_entry_folders]),
+                                     json.dumps([dir_entry.name for dir_entry in dir_entry_files])))
+            self.uncommitted += 1
+            if self.uncommitted >= commit_every:
+                self.commit()
+
+        return dir_entry_folders, dir_entry_files
+
+    def evict_unvisited_dirs(self, path_prefix=""):
+        """Delete rows of directories under a path that weren't listed or looked up this run, e.g., deleted ones
+
+        Call it only after building the whole tree under `path_prefix`.
+
+        :param path_prefix: A directory path limiting which rows are checked to it and the directories below it, e.g.,
+                            the MRI folder path; every row is checked if empty
+        :type  path_prefix: str, optional
+
+        :return: A number of rows evicted
+        :rtype: int
+        """
+        path_prefix = path_prefix.rstrip(os.sep)
+        subdir_prefix = path_prefix + os.sep  # so "/data/mri" doesn't match rows under "/data/mri2"
+        with self.lock:
+            paths = [row[0] for row in
+                     self.connection.execute("SELECT path FROM dir_listings "
+                                             "WHERE ? = '' OR path = ? OR substr(path, 1, ?) = ?",
+                                             (path_prefix, path_prefix, len(subdir_prefix), subdir_prefix))]
+            unvisited_paths = [(path,) for path in paths if path not in self.visited_paths]
+            self.connection.executemany("DELETE FROM dir_listings WHERE path = ?", unvisited_paths)
+            self.commit()
+            self.evictions += len(unvisited_paths)
+        return len(unvisited_paths)
+
+    def commit(self):
+        """Commit newly written rows to the SQLite database file"""
+        self.connection.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        """Commit and close the SQLite database connection"""
+        self.commit()
+        self.connection.close()
+
+    def print_summary(self):
+        """Print reused, rescanned, and evicted directory counts for this run"""
+        print(f"Directory scan snapshot:",
+              f"{self.hits} reused,",
+              f"{self.misses} listed" + (f" (all, by request)," if self.rescan_all else
+                                         f" ({self.racy} modified too recently to trust),"),
+              f"{self.evictions} evicted")
@@ -0,0 +1,108 @@
+import hashlib
+import sqlite3
+import threading
+
+###########
+# Globals #
+
+# Number of bytes to read from a file at a time while hashing it
+hash_read_size = 1024 * 1024
+
+# Number of newly hashed files to hold before committing them to the index
+commit_every = 500
+
+
+class FileHashIndex:
+    """An SQLite index of local files' SHA-1 hashes, keyed by file path, inode, size, and modified time
+
+    A file is read and hashed only when it's new or its inode, size, or modified time changed since it was last
+    hashed. Passing ":memory:" as the path keeps the index for this run only. Hashes may be requested from several
+    threads at once.
+    """
+
+    def __init__(self, db_path=":memory:"):
+        """Instantiation method for FileHashIndex class
+
+        :param db_path: A path to the SQLite database file; it is created if it doesn't exist
+        :type  db_path: str, optional
+        """
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self.bytes_hashed = 0
+        self.uncommitted = 0
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS file_hashes ("
+                                "  path TEXT PRIMARY KEY,"
+                                "  inode INTEGER NOT NULL,"
+                                "  size INTEGER NOT NULL,"
+                                "  mtime_ns INTEGER NOT NULL,"
+                                "  sha1 TEXT NOT NULL"
+                                ")")
+        self.connection.commit()
+
+    def get_sha1(self, dir_entry_file):
+        """Get the hex SHA-1 of a local file, from the index if its row is still valid
+
+        :param dir_entry_file: A DirEntry file
+        :type  dir_entry_file: DirEntry
+
+        :return: A lowercase hex SHA-1 digest of the file's contents
+        :rtype: str
+        """
+        stat = dir_entry_file.stat()
+        with self.lock:
+            row = self.connection.execute("SELECT sha1 FROM file_hashes "
+                                          "WHERE path = ? AND inode = ? AND size = ? AND mtime_ns = ?",
+                                          (dir_entry_file.path, stat.st_ino, stat.st_size, stat.st_mtime_ns)).fetchone()
+            if row:
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+
+        file_sha1 = hashlib.sha1()
+        with open(dir_entry_file.path, 'rb') as local_file:
+            for chunk in iter(lambda: local_file.read(hash_read_size), b''):
+                file_sha1.update(chunk)
+
+        with self.lock:
+            self.bytes_hashed += stat.st_size
+            self.connection.execute("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?, ?)",
+                                    (dir_entry_file.path, stat.st_ino, stat.st_size, stat.st_mtime_ns,
+                                     file_sha1.hexdigest()))
+            self.uncommitted += 1
+            if self.uncommitted >= commit_every:
+                self.connection.commit()
+                self.uncommitted = 0
+
+        return file_sha1.hexdigest()
+
+    def differs_from_box_subfile(self, dir_entry_file, box_subfile):
+        """Check whether a local file's contents differ from a Box File's, by size first and then by SHA-1
+
+        :param dir_entry_file: A DirEntry file
+        :type  dir_entry_file: DirEntry
+        :param box_subfile: A Box File listed with its "size" and "sha1" fields
+        :type  box_subfile: File
+
+        :return: A boolean whether the contents differ
+        :rtype: boolean
+        """
+        if dir_entry_file.stat().st_size != box_subfile.size:
+            return True
+        return self.get_sha1(dir_entry_file) != box_subfile.sha1
+
+    def close(self):
+        """Commit and close the SQLite database connection"""
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+    def print_summary(self):
+        """Print hit and miss counts, and bytes read, for this run"""
+        print(f"File hash cache:",
+              f"{self.hits} hits,",
+              f"{self.misses} misses,",
+              f"{self.bytes_hashed} bytes hashed")
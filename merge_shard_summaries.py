@@ -0,0 +1,91 @@
+#!/usr/bin/env Python3
+
+##################
+# Import Modules #
+
+import sys
+import json
+import argparse
+
+import sync_metrics as sm
+
+
+def print_shard_line(label, sync_metrics):
+    """Print one line of a shard's (or the whole run's) wall time, counts, and Box API request errors
+
+    :param label: A label to start the line with, e.g., "Shard 2/4"
+    :type  label: str
+    :param sync_metrics: A SyncMetrics object whose run is over
+    :type  sync_metrics: SyncMetrics
+    """
+    counters = sync_metrics.counters
+    print(f"{label}:",
+          f"{sync_metrics.finished_at - sync_metrics.started_at:.1f} s,",
+          f"{counters['local_files_kept']} of {counters['local_files_found']} files kept,",
+          f"{counters['box_folders_created']} Box Folders created,",
+          f"{counters['box_files_put']} Box Files put ({counters['box_bytes_uploaded'] / 1024 / 1024:.1f} MB),",
+          f"{counters['box_items_deleted']} Box items deleted,",
+          f"{sum(requests['errors'] for requests in sync_metrics.box_requests.values())} Box API errors")
+
+
+########
+# Main #
+
+def main():
+
+    ##############
+    # Parse Args #
+
+    parser = argparse.ArgumentParser(description="Merge the `metrics_json` files of `shard K/N` runs into one summary.")
+
+    parser.add_argument('metrics_json_paths', nargs='+', metavar='SHARD_METRICS_JSON',
+                        help=f"required: one `metrics_json` file written by each shard")
+
+    parser.add_argument('--metrics_json', '--metrics-json', metavar='PATH',
+                        help=f"write the merged metrics to a JSON file")
+
+    parser.add_argument('--metrics_textfile', '--metrics-textfile', metavar='PATH',
+                        help=f"write the merged metrics to a Prometheus textfile-collector file, e.g., "
+                             f"`ummap_mri_sync.prom`")
+
+    args = parser.parse_args()
+
+    ######################
+    # Read Shard Metrics #
+
+    shard_metrics = {}  # shard index -> SyncMetrics
+    shard_counts = set()
+    for metrics_json_path in args.metrics_json_paths:
+        with open(metrics_json_path) as metrics_file:
+            sync_metrics = sm.SyncMetrics.from_dict(json.load(metrics_file))
+        if not sync_metrics.shard:
+            parser.error(f"'{metrics_json_path}' wasn't written by a run with `shard`")
+        shard_index, shard_count = map(int, sync_metrics.shard.split("/"))
+        if shard_index in shard_metrics:
+            parser.error(f"'{metrics_json_path}' is a second file for shard {sync_metrics.shard}")
+        shard_metrics[shard_index] = sync_metrics
+        shard_counts.add(shard_count)
+    if len(shard_counts) > 1:
+        parser.error(f"files come from runs split into different numbers of shards: {sorted(shard_counts)}")
+
+    ##########################
+    # Print and Write Merged #
+
+    for shard_index, sync_metrics in sorted(shard_metrics.items()):
+        print_shard_line(f"Shard {sync_metrics.shard}", sync_metrics)
+    merged_metrics = sm.SyncMetrics.merge([sync_metrics for _, sync_metrics in sorted(shard_metrics.items())])
+    print_shard_line(f"All shards", merged_metrics)
+    merged_metrics.print_summary()
+
+    missing_shard_indexes = sorted(set(range(1, shard_counts.pop() + 1)) - set(shard_metrics))
+    if missing_shard_indexes:
+        # A partial total would look like a complete run to anything reading the merged files, so none are written
+        print(f"Missing shards:", ", ".join(str(shard_index) for shard_index in missing_shard_indexes),
+              f"- merged metrics not written")
+        sys.exit(1)
+    merged_metrics.write_outputs(args.metrics_json, args.metrics_textfile)
+    print(f"Done.\n")
+
+
+if __name__ == "__main__":
+    main()
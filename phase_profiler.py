@@ -0,0 +1,186 @@
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+
+###########
+# Globals #
+
+# Profiler modes: `cprofile` traces every call on the main thread; `sampling` snapshots every thread's stack
+profile_modes = ["cprofile", "sampling"]
+
+# Default seconds between stack snapshots in sampling mode
+default_sample_interval = 0.01
+
+# Default number of functions listed per phase in the hot-function summary
+default_top_n = 20
+
+
+class StackSampler:
+    """A low-overhead profiler that snapshots the stack of every thread at a fixed interval from a daemon thread
+
+    Each snapshot is one sample. A function's self samples are the samples with it on top of the stack, and its
+    total samples are those with it anywhere on the stack, so both approximate time spent in proportion.
+    """
+
+    def __init__(self, sample_interval=default_sample_interval):
+        """Instantiation method for StackSampler class
+
+        :param sample_interval: Seconds between stack snapshots
+        :type  sample_interval: float, optional
+        """
+        self.sample_interval = sample_interval
+        self.stack_counts = Counter()  # tuple of (file, line, function) frames, outermost first -> samples
+        self.n_samples = 0
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+
+    def run(self):
+        sampler_thread_id = threading.get_ident()
+        while not self.stopping.wait(self.sample_interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_thread_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                self.stack_counts[tuple(reversed(stack))] += 1
+            self.n_samples += 1
+
+    def get_function_counts(self):
+        """Count self and total samples per function
+
+        :return: A tuple of Counters of (file, line, function) to self samples and to total samples
+        :rtype: (Counter, Counter)
+        """
+        self_counts, total_counts = Counter(), Counter()
+        for stack, count in self.stack_counts.items():
+            self_counts[stack[-1]] += count
+            for function in set(stack):
+                total_counts[function] += count
+        return self_counts, total_counts
+
+    def write_folded_stacks(self, path):
+        """Write samples as folded stacks, one `outer;...;inner count` line per stack, for flame graph tools
+
+        :param path: A path to write to
+        :type  path: str
+        """
+        with open(path, 'w') as folded_file:
+            for stack, count in self.stack_counts.most_common():
+                folded_file.write(";".join(f"{function} ({os.path.basename(filename)}:{line})"
+                                           for filename, line, function in stack) + f" {count}\n")
+
+    def format_summary(self, top_n):
+        """Format the `top_n` functions with the most self samples
+
+        :param top_n: A number of functions to list
+        :type  top_n: int
+
+        :return: A text table of self and total samples per function
+        :rtype: str
+        """
+        self_counts, total_counts = self.get_function_counts()
+        n_samples = max(sum(self.stack_counts.values()), 1)
+        lines = [f"{sum(self.stack_counts.values())} thread samples every {self.sample_interval * 1000:.0f} ms",
+                 f"{'self %':>7} {'total %':>7}  function"]
+        for function, count in self_counts.most_common(top_n):
+            filename, line, function_name = function
+            lines.append(f"{100.0 * count / n_samples:7.1f} {100.0 * total_counts[function] / n_samples:7.1f}  "
+                         f"{function_name} ({filename}:{line})")
+        return "\n".join(lines) + "\n"
+
+
+class PhaseProfiler:
+    """Profiles each phase of a run separately, writing per-phase profile files and a hot-function summary
+
+    In `cprofile` mode, each phase's calls on the main thread are traced with cProfile and saved as a pstats file,
+    `<phase>.pstats`, which can be loaded with `pstats.Stats` or viewers like snakeviz. Work on upload and scan
+    thread pools isn't traced. In `sampling` mode, every thread's stack is snapshotted at a fixed interval instead,
+    and saved as folded stacks, `<phase>.folded`, for flame graph tools. Sampling costs little enough to leave on in
+    production. Either way, `summary.txt` lists each phase's top functions.
+    """
+
+    def __init__(self, profile_dir, profile_mode="cprofile", top_n=default_top_n,
+                 sample_interval=default_sample_interval):
+        """Instantiation method for PhaseProfiler class
+
+        :param profile_dir: A directory to write profile files into; it is created if it doesn't exist
+        :type  profile_dir: str
+        :param profile_mode: A profiler mode from `profile_modes`
+        :type  profile_mode: str, optional
+        :param top_n: A number of functions to list per phase in the summary
+        :type  top_n: int, optional
+        :param sample_interval: Seconds between stack snapshots in sampling mode
+        :type  sample_interval: float, optional
+        """
+        self.profile_dir = profile_dir
+        self.profile_mode = profile_mode
+        self.top_n = top_n
+        self.sample_interval = sample_interval
+        self.summaries = {}  # phase name -> formatted top-N summary
+        self.running = {}  # phase name -> running StackSampler or cProfile.Profile
+        os.makedirs(profile_dir, exist_ok=True)
+
+    def start(self, phase_name):
+        """Start profiling a phase of the run
+
+        :param phase_name: A name for the phase, used to name its files
+        :type  phase_name: str
+        """
+        if self.profile_mode == "sampling":
+            stack_sampler = StackSampler(self.sample_interval)
+            stack_sampler.start()
+            self.running[phase_name] = stack_sampler
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            self.running[phase_name] = profiler
+
+    def stop(self, phase_name):
+        """Stop profiling a phase of the run and write its profile file and summary
+
+        :param phase_name: A name for the phase passed to `start`
+        :type  phase_name: str
+        """
+        if self.profile_mode == "sampling":
+            stack_sampler = self.running.pop(phase_name)
+            stack_sampler.stop()
+            stack_sampler.write_folded_stacks(os.path.join(self.profile_dir, f"{phase_name}.folded"))
+            self.summaries[phase_name] = stack_sampler.format_summary(self.top_n)
+        else:
+            profiler = self.running.pop(phase_name)
+            profiler.disable()
+            profiler.dump_stats(os.path.join(self.profile_dir, f"{phase_name}.pstats"))
+            summary_stream = io.StringIO()
+            pstats.Stats(profiler, stream=summary_stream).sort_stats("tottime").print_stats(self.top_n)
+            self.summaries[phase_name] = summary_stream.getvalue()
+        self.write_summary()
+
+    def write_summary(self):
+        """Write every profiled phase's top functions to `summary.txt`"""
+        with open(os.path.join(self.profile_dir, "summary.txt"), 'w') as summary_file:
+            summary_file.write(f"Profiled {time.strftime('%Y-%m-%d %H:%M:%S')} in {self.profile_mode} mode\n")
+            for phase_name, summary in self.summaries.items():
+                summary_file.write(f"\n===== {phase_name} =====\n{summary}")
+
+    def print_summary(self):
+        """Print where the profile files were written"""
+        print(f"Profiles:",
+              f"{len(self.summaries)} phases written to {self.profile_dir}",
+              f"({self.profile_mode}; top functions in summary.txt)")
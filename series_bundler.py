@@ -0,0 +1,304 @@
+import io
+import os
+import re
+import json
+import hashlib
+import tarfile
+import zipfile
+
+###########
+# Globals #
+
+# File extension of each archive format
+archive_extensions = {
+    "zip": "zip",
+    "tar": "tar",
+}
+
+# Suffix of the index sidecar uploaded next to each archive
+index_suffix = ".index.json"
+
+# Suffix of the directory, next to the upload session store, that archives uploaded in parts are staged in
+staging_suffix = ".bundles"
+
+
+class ArchiveChunkSink:
+    """A write-only, unseekable file object that collects what an archive writer writes until it's drained"""
+
+    def __init__(self):
+        """Instantiation method for ArchiveChunkSink class"""
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Hand over and forget everything written since the last drain
+
+        :return: The bytes written since the last drain
+        :rtype: bytes
+        """
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ArchiveStream(io.RawIOBase):
+    """A readable file object over an archive that is written one member at a time as it's read"""
+
+    def __init__(self, archive_chunks):
+        """Instantiation method for ArchiveStream class
+
+        :param archive_chunks: An iterator of the archive's bytes, in order
+        :type  archive_chunks: iterator[bytes]
+        """
+        super().__init__()
+        self.archive_chunks = archive_chunks
+        self.chunk = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.chunk:
+            self.chunk = next(self.archive_chunks, None)
+            if self.chunk is None:
+                self.chunk = b""
+                return 0
+        n_bytes = min(len(buffer), len(self.chunk))
+        buffer[:n_bytes] = self.chunk[:n_bytes]
+        self.chunk = self.chunk[n_bytes:]
+        return n_bytes
+
+
+class SeriesBundler:
+    """Uploads each kept `s#####` series folder as one archive Box File instead of one Box File per DICOM slice
+
+    A series' archive is written on the fly from its local files as it's uploaded. Archives whose members add up to
+    the chunked upload threshold are instead staged on disk and uploaded in parts, so they're never held in memory and
+    a cut-off upload resumes. Next to each archive goes an index sidecar listing its members' names, sizes, and
+    modified times. With `update_files`, a later run reads the sidecar back and replaces the archive only if a slice
+    was added, removed, or changed.
+    """
+
+    def __init__(self, archive_format="zip", rgx_series=re.compile(r'^s\d{5}$'), chunked_uploader=None):
+        """Instantiation method for SeriesBundler class
+
+        :param archive_format: An archive format: "zip" (stored, not compressed) or "tar"
+        :type  archive_format: str, optional
+        :param rgx_series: A Regex matching the series folder names to bundle
+        :type  rgx_series: Regex, optional
+        :param chunked_uploader: An uploader for large archives in parts; every archive is streamed if None
+        :type  chunked_uploader: ChunkedUploader, optional
+        """
+        self.archive_format = archive_format
+        self.rgx_series = rgx_series
+        self.chunked_uploader = chunked_uploader
+        self.staging_dir = chunked_uploader.db_path + staging_suffix if chunked_uploader is not None else None
+
+    def is_series_node(self, dir_entry_node):
+        """Check whether a folder DirEntryNode object is a series folder to bundle
+
+        :param dir_entry_node: A folder DirEntryNode object
+        :type  dir_entry_node: DirEntryNode
+
+        :return: A boolean whether the folder is bundled into one archive
+        :rtype: boolean
+        """
+        return bool(re.match(self.rgx_series, dir_entry_node.dir_entry.name)) and \
+            not dir_entry_node.child_dir_entry_node_folders
+
+    def get_archive_name(self, den_series):
+        return f"{den_series.dir_entry.name}.{archive_extensions[self.archive_format]}"
+
+    def get_index_name(self, den_series):
+        return self.get_archive_name(den_series) + index_suffix
+
+    def get_bundle_names(self, dir_entry_node):
+        """Get the Box File names the series folders under a folder DirEntryNode object are uploaded as
+
+        :param dir_entry_node: A folder DirEntryNode object
+        :type  dir_entry_node: DirEntryNode
+
+        :return: A set of archive and index sidecar names
+        :rtype: set[str]
+        """
+        bundle_names = set()
+        for den_folder in dir_entry_node.child_dir_entry_node_folders:
+            if self.is_series_node(den_folder):
+                bundle_names.update([self.get_archive_name(den_folder), self.get_index_name(den_folder)])
+        return bundle_names
+
+    @staticmethod
+    def get_member_file_nodes(den_series):
+        """Get a series folder's file DirEntryNode objects in archive order, by name, so the archive and its index
+        sidecar don't depend on directory listing order
+
+        :param den_series: A series folder DirEntryNode object
+        :type  den_series: DirEntryNode
+
+        :return: A list of file DirEntryNode objects
+        :rtype: [DirEntryNode]
+        """
+        return sorted(den_series.child_dir_entry_node_files, key=lambda den_file: den_file.dir_entry.name)
+
+    def get_member_index(self, den_series):
+        """Get the index sidecar contents for a series folder: its archive format and members
+
+        :param den_series: A series folder DirEntryNode object
+        :type  den_series: DirEntryNode
+
+        :return: A dict with the archive format and a list of member names, sizes, and modified times
+        :rtype: dict
+        """
+        members = []
+        for den_file in self.get_member_file_nodes(den_series):
+            stat = den_file.dir_entry.stat()
+            members.append({"name": den_file.dir_entry.name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+        return {"format": self.archive_format, "members": members}
+
+    def iter_archive_chunks(self, den_series):
+        """Write a series folder's archive one member at a time, yielding the bytes written after each
+
+        :param den_series: A series folder DirEntryNode object
+        :type  den_series: DirEntryNode
+
+        :return: An iterator of the archive's bytes, in order
+        :rtype: iterator[bytes]
+        """
+        sink = ArchiveChunkSink()
+        if self.archive_format == "tar":
+            archive = tarfile.open(fileobj=sink, mode="w|")
+            add_member = archive.add
+        else:
+            archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, strict_timestamps=False)
+            add_member = archive.write
+        with archive:
+            for den_file in self.get_member_file_nodes(den_series):
+                add_member(den_file.dir_entry.path, arcname=den_file.dir_entry.name)
+                yield sink.drain()
+        yield sink.drain()
+
+    def is_staged(self, member_index):
+        """Check whether a series folder's archive is big enough to stage on disk and upload in parts
+
+        :param member_index: The series folder's index sidecar contents
+        :type  member_index: dict
+
+        :return: A boolean whether the archive goes through a Box upload session
+        :rtype: boolean
+        """
+        return self.chunked_uploader is not None and \
+            sum(member["size"] for member in member_index["members"]) >= self.chunked_uploader.threshold
+
+    def stage_archive(self, box_folder, den_series, member_index):
+        """Write a series folder's archive to the staging directory
+
+        The staged path is named after the Box Folder and the member index, and the staged file gets its newest
+        member's modified time, so re-staging an unchanged series gives the same path, size, and modified time and the
+        chunked uploader resumes its upload session. Any change to the series gives a new path and a new session.
+
+        :param box_folder: A Box Folder corresponding to the series folder's parent
+        :type  box_folder: Folder
+        :param den_series: A series folder DirEntryNode object
+        :type  den_series: DirEntryNode
+        :param member_index: The series folder's index sidecar contents
+        :type  member_index: dict
+
+        :return: A path to the staged archive, named as the archive
+        :rtype: str
+        """
+        index_digest = hashlib.sha1(json.dumps(member_index, sort_keys=True).encode()).hexdigest()
+        staged_dir = os.path.join(self.staging_dir, box_folder.object_id, index_digest)
+        os.makedirs(staged_dir, exist_ok=True)
+        staged_path = os.path.join(staged_dir, self.get_archive_name(den_series))
+
+        partial_path = staged_path + ".partial"
+        with open(partial_path, 'wb') as staged_file:
+            for archive_chunk in self.iter_archive_chunks(den_series):
+                staged_file.write(archive_chunk)
+        newest_mtime_ns = max((member["mtime_ns"] for member in member_index["members"]), default=0)
+        os.utime(partial_path, ns=(newest_mtime_ns, newest_mtime_ns))
+        os.replace(partial_path, staged_path)
+        return staged_path
+
+    @staticmethod
+    def remove_staged_archive(staged_path):
+        """Remove a staged archive once it's on Box, along with its staging folders if they're left empty
+
+        :param staged_path: A path to the staged archive
+        :type  staged_path: str
+        """
+        os.remove(staged_path)
+        for staged_dir in (os.path.dirname(staged_path), os.path.dirname(os.path.dirname(staged_path))):
+            try:
+                os.rmdir(staged_dir)
+            except OSError:  # not empty, e.g., another series of the same folder is staged
+                break
+
+    def upload_series(self, box_folder, den_series, box_subitems_by_name, update_files=False):
+        """Upload a series folder's archive and index sidecar into its parent's Box Folder, if they need it
+
+        The archive is uploaded when it isn't on Box yet, when its sidecar is missing, or, with `update_files`, when
+        its sidecar no longer matches the local files. Only Box calls are made here, so this may run on any thread.
+        Small archives are streamed in one request; large ones are staged and uploaded in parts.
+
+        :param box_folder: A Box Folder corresponding to the series folder's parent
+        :type  box_folder: Folder
+        :param den_series: A series folder DirEntryNode object
+        :type  den_series: DirEntryNode
+        :param box_subitems_by_name: A dict of the Box Folder's subitem names to Box Files and Folders
+        :type  box_subitems_by_name: dict[str, Folder/File]
+        :param update_files: A boolean flag for replacing archives whose local files changed
+        :type  update_files: boolean
+
+        :return: A list of (action, Box File) tuples uploaded, e.g., ("Creating", archive Box File)
+        :rtype: [(str, File)]
+        """
+        box_archive = box_subitems_by_name.get(self.get_archive_name(den_series))
+        box_index_file = box_subitems_by_name.get(self.get_index_name(den_series))
+        member_index = self.get_member_index(den_series)
+
+        if box_archive is not None and box_index_file is not None:
+            if not update_files:
+                return []
+            box_member_index = json.loads(box_index_file.content())
+            # Sidecars written before members were sorted by name list them in listing order
+            box_member_index["members"] = sorted(box_member_index.get("members", []),
+                                                 key=lambda member: member["name"])
+            if box_member_index == member_index:
+                return []
+
+        uploaded = []
+        if self.is_staged(member_index):
+            # A multipart request reads its whole body into memory, so large archives go up from disk in parts
+            staged_path = self.stage_archive(box_folder, den_series, member_index)
+            if box_archive is None:
+                uploaded.append(("Creating", self.chunked_uploader.upload(box_folder, staged_path)))
+            else:
+                uploaded.append(("Updating", self.chunked_uploader.update(box_archive, staged_path)))
+            self.remove_staged_archive(staged_path)
+        else:
+            archive_stream = ArchiveStream(self.iter_archive_chunks(den_series))
+            if box_archive is None:
+                uploaded.append(("Creating", box_folder.upload_stream(archive_stream,
+                                                                      self.get_archive_name(den_series))))
+            else:
+                uploaded.append(("Updating", box_archive.update_contents_with_stream(archive_stream)))
+
+        index_stream = io.BytesIO(json.dumps(member_index, indent=1).encode())
+        if box_index_file is None:
+            uploaded.append(("Creating", box_folder.upload_stream(index_stream, self.get_index_name(den_series))))
+        else:
+            uploaded.append(("Updating", box_index_file.update_contents_with_stream(index_stream)))
+
+        return uploaded
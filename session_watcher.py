@@ -0,0 +1,595 @@
+import os
+import re
+import time
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+
+import ummap_mri_sync_to_box_helpers as hlps
+import dir_entry_node as den
+import dicom_header_index as dhi
+import dicom_classifier as dcl
+import box_folder_index as bfi
+import box_upload_executor as bue
+import sync_metrics as sm
+
+###########
+# Globals #
+
+# Watch modes: `auto` uses inotify unless `mri_path` is on a network filesystem, whose remote changes inotify misses
+watch_modes = ["auto", "inotify", "poll"]
+
+# Default seconds a session directory must go without changes before it's synced, so a session still being
+# written isn't picked up half-finished
+default_debounce_seconds = 120.0
+
+# Default seconds between directory snapshots in polling mode
+default_poll_interval = 60.0
+
+# Filesystem types inotify can't see remote changes on
+network_fs_types = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "afs", "lustre", "gpfs", "fuse.sshfs"}
+
+# inotify event masks, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+inotify_watch_mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | \
+    IN_MOVE_SELF | IN_ONLYDIR
+
+# struct inotify_event: int wd; uint32_t mask, cookie, len; char name[len]
+inotify_event_header = struct.Struct("iIII")
+
+
+def get_fs_type(path):
+    """Get the type of the filesystem a path is on, from the longest matching mount point in /proc/mounts
+
+    :param path: A local path
+    :type  path: str
+
+    :return: A filesystem type, e.g., "ext4" or "nfs4", or None if it can't be told
+    :rtype: str
+    """
+    real_path = os.path.realpath(path)
+    fs_type, mount_point_length = None, -1
+    try:
+        with open("/proc/mounts") as mounts_file:
+            for line in mounts_file:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1].replace("\\040", " ")
+                if (real_path == mount_point or real_path.startswith(mount_point.rstrip("/") + "/")) and \
+                        len(mount_point) > mount_point_length:
+                    fs_type, mount_point_length = fields[2], len(mount_point)
+    except OSError:
+        return None
+    return fs_type
+
+
+def iter_watched_dirs(path, rgx_folder):
+    """Walk the directories at or below a path whose names match a Regex, as `build_tree_from_node` would
+
+    :param path: A path to a directory
+    :type  path: str
+    :param rgx_folder: A Regex for filtering which subdirectories to walk
+    :type  rgx_folder: Regex
+
+    :return: A generator of DirEntry directories, not including `path` itself
+    """
+    try:
+        dir_entries = list(os.scandir(path))
+    except OSError:  # removed since it was found
+        return
+    for dir_entry in dir_entries:
+        if dir_entry.is_dir() and re.match(rgx_folder, dir_entry.name):
+            yield dir_entry
+            yield from iter_watched_dirs(dir_entry.path, rgx_folder)
+
+
+class InotifyWatcher:
+    """Reports which session directories under `mri_path` changed, using Linux inotify
+
+    inotify only watches single directories, so every directory matching `rgx_folder` under `mri_path` gets its own
+    watch, and new ones get a watch as soon as they're created. A session directory changes when anything is
+    created, written, moved, or deleted in it or below it. If the kernel's event queue overflows, every session is
+    reported as changed.
+    """
+
+    def __init__(self, mri_path, rgx_folder):
+        """Instantiation method for InotifyWatcher class
+
+        :param mri_path: A path to the local directory containing session directories
+        :type  mri_path: str
+        :param rgx_folder: A Regex for filtering which directories are session (and series, ...) directories
+        :type  rgx_folder: Regex
+        """
+        self.mri_path = mri_path
+        self.rgx_folder = rgx_folder
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify isn't available")
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self.watches = {}  # watch descriptor -> (directory path, session name or None for `mri_path`)
+        try:
+            self.add_watch(mri_path, None)
+            for dir_entry in os.scandir(mri_path):
+                if dir_entry.is_dir() and re.match(rgx_folder, dir_entry.name):
+                    self.add_session_watches(dir_entry.path, dir_entry.name)
+        except OSError:
+            self.close()
+            raise
+
+    def add_watch(self, path, session_name):
+        watch_descriptor = self.libc.inotify_add_watch(self.fd, os.fsencode(path), inotify_watch_mask)
+        if watch_descriptor < 0:
+            error_number = ctypes.get_errno()
+            if error_number == errno.ENOENT:  # removed since it was found
+                return
+            raise OSError(error_number, f"can't watch '{path}': {os.strerror(error_number)}"
+                                        + ("; raise fs.inotify.max_user_watches" if error_number == errno.ENOSPC
+                                           else ""))
+        self.watches[watch_descriptor] = (path, session_name)
+
+    def add_session_watches(self, session_path, session_name):
+        """Watch a session directory and every matching directory below it
+
+        :param session_path: A path to a session directory, or to a directory below one
+        :type  session_path: str
+        :param session_name: A name of the session directory
+        :type  session_name: str
+        """
+        self.add_watch(session_path, session_name)
+        for dir_entry in iter_watched_dirs(session_path, self.rgx_folder):
+            self.add_watch(dir_entry.path, session_name)
+
+    def get_session_names(self):
+        return {dir_entry.name for dir_entry in os.scandir(self.mri_path)
+                if dir_entry.is_dir() and re.match(self.rgx_folder, dir_entry.name)}
+
+    def wait_for_changes(self, timeout):
+        """Wait for filesystem events, returning the names of the session directories they touched
+
+        :param timeout: Seconds to wait for a first event; None waits until one comes
+        :type  timeout: float
+
+        :return: A set of session directory names; empty if none changed before the timeout
+        :rtype: set[str]
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed_session_names = set()
+        while True:
+            try:
+                event_bytes = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed_session_names
+            offset = 0
+            while offset < len(event_bytes):
+                watch_descriptor, mask, _, name_length = inotify_event_header.unpack_from(event_bytes, offset)
+                offset += inotify_event_header.size
+                name = os.fsdecode(event_bytes[offset:offset + name_length].rstrip(b"\0"))
+                offset += name_length
+                changed_session_names.update(self.handle_event(watch_descriptor, mask, name))
+
+    def handle_event(self, watch_descriptor, mask, name):
+        """Helper function: Add watches for new directories and name the session directories an event touched
+
+        :param watch_descriptor: A watch descriptor of the directory the event happened in
+        :type  watch_descriptor: int
+        :param mask: The event's mask
+        :type  mask: int
+        :param name: A name of the directory entry the event happened to; "" for the watched directory itself
+        :type  name: str
+
+        :return: A set of session directory names
+        :rtype: set[str]
+        """
+        if mask & IN_Q_OVERFLOW:
+            print(f"inotify event queue overflowed; treating every session as changed")
+            return self.get_session_names()
+        if mask & IN_IGNORED:  # the watched directory is gone
+            self.watches.pop(watch_descriptor, None)
+            return set()
+        if watch_descriptor not in self.watches:
+            return set()
+
+        path, session_name = self.watches[watch_descriptor]
+        if session_name is None:  # an event in `mri_path` itself
+            if not name or not re.match(self.rgx_folder, name):
+                return set()
+            session_name = name
+        if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and re.match(self.rgx_folder, name):
+            self.add_session_watches(os.path.join(path, name), session_name)
+        return {session_name}
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class PollingWatcher:
+    """Reports which session directories under `mri_path` changed, by comparing snapshots of directory mtimes
+
+    For filesystems inotify can't watch, like NFS. Each snapshot lists every directory matching `rgx_folder` and
+    stats it, but reads no files. A directory's mtime changes when a file is created, renamed, or deleted in it, so a
+    session changes when any directory in it does; a file rewritten in place isn't noticed.
+    """
+
+    def __init__(self, mri_path, rgx_folder, poll_interval=default_poll_interval):
+        """Instantiation method for PollingWatcher class
+
+        :param mri_path: A path to the local directory containing session directories
+        :type  mri_path: str
+        :param rgx_folder: A Regex for filtering which directories are session (and series, ...) directories
+        :type  rgx_folder: Regex
+        :param poll_interval: Seconds between snapshots
+        :type  poll_interval: float, optional
+        """
+        self.mri_path = mri_path
+        self.rgx_folder = rgx_folder
+        self.poll_interval = poll_interval
+        self.snapshot = self.take_snapshot()
+        self.next_poll_at = time.monotonic() + poll_interval
+
+    def take_snapshot(self):
+        """Take a snapshot of the inode and mtime of every directory in each session
+
+        :return: A dict of session directory names to frozensets of (path, inode, mtime) tuples
+        :rtype: dict[str, frozenset]
+        """
+        snapshot = {}
+        for dir_entry in os.scandir(self.mri_path):
+            if not (dir_entry.is_dir() and re.match(self.rgx_folder, dir_entry.name)):
+                continue
+            try:
+                session_dirs = [dir_entry] + list(iter_watched_dirs(dir_entry.path, self.rgx_folder))
+                snapshot[dir_entry.name] = frozenset((session_dir.path, session_dir.inode(),
+                                                      session_dir.stat().st_mtime_ns)
+                                                     for session_dir in session_dirs)
+            except FileNotFoundError:  # removed while it was being listed
+                continue
+        return snapshot
+
+    def wait_for_changes(self, timeout):
+        """Wait until the next snapshot is due or the timeout passes, returning the session directories that changed
+
+        :param timeout: Seconds to wait at most; None waits for the next snapshot
+        :type  timeout: float
+
+        :return: A set of session directory names; empty if no snapshot was taken or nothing changed
+        :rtype: set[str]
+        """
+        wait_seconds = max(0.0, self.next_poll_at - time.monotonic())
+        if timeout is not None and timeout < wait_seconds:
+            time.sleep(timeout)
+            return set()
+        time.sleep(wait_seconds)
+        self.next_poll_at = time.monotonic() + self.poll_interval
+
+        snapshot = self.take_snapshot()
+        changed_session_names = {session_name for session_name in snapshot.keys() | self.snapshot.keys()
+                                 if snapshot.get(session_name) != self.snapshot.get(session_name)}
+        self.snapshot = snapshot
+        return changed_session_names
+
+    def close(self):
+        pass
+
+
+def make_session_watcher(mri_path, rgx_folder, watch_mode="auto", poll_interval=default_poll_interval):
+    """Make the session directory watcher for a watch mode, falling back to polling if inotify can't be used
+
+    :param mri_path: A path to the local directory containing session directories
+    :type  mri_path: str
+    :param rgx_folder: A Regex for filtering which directories are session (and series, ...) directories
+    :type  rgx_folder: Regex
+    :param watch_mode: A watch mode from `watch_modes`
+    :type  watch_mode: str, optional
+    :param poll_interval: Seconds between snapshots in polling mode
+    :type  poll_interval: float, optional
+
+    :return: An InotifyWatcher or PollingWatcher
+    :rtype: InotifyWatcher/PollingWatcher
+    """
+    if watch_mode == "auto":
+        fs_type = get_fs_type(mri_path)
+        if fs_type in network_fs_types:
+            print(f"'{mri_path}' is on {fs_type}, which inotify can't watch; polling every {poll_interval:.0f} s")
+            watch_mode = "poll"
+    if watch_mode != "poll":
+        try:
+            return InotifyWatcher(mri_path, rgx_folder)
+        except (OSError, AttributeError, TypeError) as error:
+            if watch_mode == "inotify":
+                raise
+            print(f"Can't use inotify ({error}); polling every {poll_interval:.0f} s")
+    return PollingWatcher(mri_path, rgx_folder, poll_interval)
+
+
+class SessionDebouncer:
+    """Holds back changed session directories until they've gone `debounce_seconds` without changing again"""
+
+    def __init__(self, debounce_seconds=default_debounce_seconds):
+        self.debounce_seconds = debounce_seconds
+        self.last_changed_at = {}  # session name -> time.monotonic() of its latest change
+
+    def note_changes(self, session_names):
+        now = time.monotonic()
+        for session_name in session_names:
+            self.last_changed_at[session_name] = now
+
+    def get_wait_seconds(self):
+        """Get the seconds until the next session is due, or None if no session is waiting
+
+        :rtype: float
+        """
+        if not self.last_changed_at:
+            return None
+        return max(0.0, min(self.last_changed_at.values()) + self.debounce_seconds - time.monotonic())
+
+    def pop_ready(self):
+        """Take the session directories that have been quiet for `debounce_seconds`
+
+        :return: A set of session directory names
+        :rtype: set[str]
+        """
+        ready_before = time.monotonic() - self.debounce_seconds
+        ready_session_names = {session_name for session_name, last_changed_at in self.last_changed_at.items()
+                               if last_changed_at <= ready_before}
+        for session_name in ready_session_names:
+            del self.last_changed_at[session_name]
+        return ready_session_names
+
+
+class SessionSyncer:
+    """Syncs a few session directories at a time through the same build, prune, and sync steps as a full run
+
+    Only the named sessions are scanned, classified, and synced into their Box subFolders, so the rest of the Box
+    Folder is never listed or touched. With `remove_items`, a session that's gone locally, or has nothing left
+    after pruning, has its Box subFolder removed.
+    """
+
+    def __init__(self, mri_dir_entry, box_folder, rgx_folder, rgx_file, rgx_sequence, update_files=False,
+                 remove_items=False, is_verbose=False, scan_workers=1, classify_workers=1, series_sample_size=0,
+                 series_verify_size=0, header_cache_path=None, upload_workers=None, chunked_uploader=None,
+                 series_bundler=None, hash_index=None, shard=None, sync_metrics=None, metrics_json_path=None,
+                 metrics_textfile_path=None):
+        """Instantiation method for SessionSyncer class
+
+        :param mri_dir_entry: A DirEntry of the local directory containing session directories
+        :type  mri_dir_entry: DirEntry
+        :param box_folder: A Box Folder to sync session directories into
+        :type  box_folder: Folder
+        :param rgx_folder: A Regex for filtering which folders to add to the tree
+        :type  rgx_folder: Regex
+        :param rgx_file: A Regex for filtering which files to add to the tree
+        :type  rgx_file: Regex
+        :param rgx_sequence: A Regex for matching a DICOM Dataset Series Description
+        :type  rgx_sequence: Regex
+        :param update_files: A boolean flag for updating Box Files from source based on timestamps
+        :type  update_files: boolean
+        :param remove_items: A boolean flag for removing Box Folders and Box Files not in tree object model
+        :type  remove_items: boolean
+        :param is_verbose: A boolean flag for verbosity
+        :type  is_verbose: boolean
+        :param scan_workers: A number of local directories to list at once
+        :type  scan_workers: int
+        :param classify_workers: A number of processes to parse DICOM headers on before pruning
+        :type  classify_workers: int
+        :param series_sample_size: A number of files to read per series folder; 0 reads files until one matches
+        :type  series_sample_size: int
+        :param series_verify_size: A number of the remaining files per series folder to check against the sample
+        :type  series_verify_size: int
+        :param header_cache_path: A path to an on-disk SQLite index of DICOM headers, opened for each batch
+        :type  header_cache_path: str, optional
+        :param upload_workers: A number of Box File uploads/updates to run at once
+        :type  upload_workers: int, optional
+        :param chunked_uploader: An uploader sending large files in parts through resumable Box upload sessions
+        :type  chunked_uploader: ChunkedUploader, optional
+        :param series_bundler: A bundler uploading each series folder as one archive; series are walked if None
+        :type  series_bundler: SeriesBundler, optional
+        :param hash_index: An index of local SHA-1s to update Box Files by content; timestamps are compared if None
+        :type  hash_index: FileHashIndex, optional
+        :param shard: A shard whose session directories are the only ones synced; changes to others are ignored
+        :type  shard: SyncShard, optional
+        :param sync_metrics: Run metrics to count each batch's directories, files, and Box changes in
+        :type  sync_metrics: SyncMetrics, optional
+        :param metrics_json_path: A path to rewrite the run metrics as JSON to after each batch
+        :type  metrics_json_path: str, optional
+        :param metrics_textfile_path: A path to rewrite the run metrics as a Prometheus textfile to after each batch
+        :type  metrics_textfile_path: str, optional
+        """
+        self.mri_dir_entry = mri_dir_entry
+        self.box_folder = box_folder
+        self.rgx_folder = rgx_folder
+        self.rgx_file = rgx_file
+        self.rgx_sequence = rgx_sequence
+        self.update_files = update_files
+        self.remove_items = remove_items
+        self.is_verbose = is_verbose
+        self.scan_workers = scan_workers
+        self.classify_workers = classify_workers
+        self.series_sample_size = series_sample_size
+        self.series_verify_size = series_verify_size
+        self.header_cache_path = header_cache_path
+        self.upload_workers = upload_workers
+        self.chunked_uploader = chunked_uploader
+        self.series_bundler = series_bundler
+        self.hash_index = hash_index
+        self.shard = shard
+        self.sync_metrics = sync_metrics
+        self.metrics_json_path = metrics_json_path
+        self.metrics_textfile_path = metrics_textfile_path
+        self.n_batches = 0
+        self.n_sessions_synced = 0
+        self.n_sessions_removed = 0
+
+    def build_pruned_tree(self, session_names):
+        """Build and prune a tree holding only the named session directories that still exist
+
+        :param session_names: A set of session directory names
+        :type  session_names: set[str]
+
+        :return: A root DirEntryNode object for `mri_path`
+        :rtype: DirEntryNode
+        """
+        root_node = den.DirEntryNode(self.mri_dir_entry, depth=0)
+        for dir_entry in os.scandir(self.mri_dir_entry.path):
+            if dir_entry.name in session_names and dir_entry.is_dir() and re.match(self.rgx_folder, dir_entry.name):
+                session_node = den.DirEntryNode(dir_entry, depth=1, parent=root_node)
+                root_node.add_child(session_node)
+                if self.scan_workers > 1:
+                    session_node.build_tree_from_node_parallel(self.rgx_folder, self.rgx_file,
+                                                               max_workers=self.scan_workers)
+                else:
+                    session_node.build_tree_from_node(self.rgx_folder, self.rgx_file)
+
+        n_folders_found, n_files_found = sm.SyncMetrics.count_tree(root_node)
+
+        header_index = None
+        if self.header_cache_path:
+            header_index = dhi.DicomHeaderIndex(self.header_cache_path)
+        dicom_headers_parsed_before = hlps.dicom_headers_parsed
+        n_headers_classified = 0
+        try:
+            if self.classify_workers > 1:
+                n_headers_classified = dcl.classify_tree(root_node,
+                                                         self.rgx_sequence,
+                                                         classify_workers=self.classify_workers,
+                                                         header_index=header_index,
+                                                         series_sample_size=self.series_sample_size,
+                                                         series_verify_size=self.series_verify_size,
+                                                         is_verbose=self.is_verbose)
+                # Headers parsed in worker processes never reach this process's count, so classify's own count is used
+                dicom_headers_parsed_before = hlps.dicom_headers_parsed
+            root_node.prune_nodes_without_dicom_dataset_series_descrip(self.rgx_sequence,
+                                                                       series_sample_size=self.series_sample_size,
+                                                                       series_verify_size=self.series_verify_size,
+                                                                       header_index=header_index)
+        finally:
+            if header_index is not None:
+                header_index.close()
+
+        if self.sync_metrics is not None:
+            _, n_files_kept = sm.SyncMetrics.count_tree(root_node)
+            self.sync_metrics.increment("directories_scanned", n_folders_found)
+            self.sync_metrics.increment("local_files_found", n_files_found)
+            self.sync_metrics.increment("local_files_kept", n_files_kept)
+            self.sync_metrics.increment("local_files_pruned", n_files_found - n_files_kept)
+            self.sync_metrics.increment("dicom_headers_parsed",
+                                        n_headers_classified + hlps.dicom_headers_parsed - dicom_headers_parsed_before)
+        return root_node
+
+    def sync_sessions(self, session_names):
+        """Build, prune, and sync the named session directories into their Box subFolders
+
+        :param session_names: A set of session directory names
+        :type  session_names: set[str]
+        """
+        if self.shard is not None:
+            session_names = {session_name for session_name in session_names if self.shard.owns_name(session_name)}
+            if not session_names:
+                return
+        self.n_batches += 1
+        print(f"Syncing {len(session_names)} changed session(s):", ", ".join(sorted(session_names)))
+        root_node = self.build_pruned_tree(session_names)
+        box_files_put_before = self.sync_metrics.counters["box_files_put"] if self.sync_metrics is not None else 0
+
+        box_index = bfi.BoxFolderIndex(metrics=self.sync_metrics)  # a fresh one per batch; Box may have changed
+        upload_executor = None
+        if self.upload_workers and self.upload_workers > 1:
+            upload_executor = bue.BoxUploadExecutor(self.upload_workers)
+        try:
+            for session_name in sorted(session_names):
+                session_node = root_node.child_folders_by_name.get(session_name)
+                box_subfolder = box_index.get_subfolder(self.box_folder, session_name)
+
+                if session_node is None:
+                    if self.remove_items and box_subfolder is not None:
+                        box_subfolder_id = box_subfolder.id
+                        if box_subfolder.delete(recursive=True):
+                            box_index.remove_item(box_subfolder)
+                            self.n_sessions_removed += 1
+                            if self.is_verbose:
+                                print(f"  Removed Box subFolder", f"'{session_name}'", f"with ID",
+                                      f"'{box_subfolder_id}'")
+                    continue
+
+                if box_subfolder is None:
+                    box_subfolder, is_new = hlps.create_box_subfolder(self.box_folder, session_name)
+                    box_index.add_new_folder(self.box_folder, box_subfolder, is_new)
+                    if self.is_verbose:
+                        session_node.print_subitem_action(box_subfolder, "Creating")
+                session_node.sync_tree_object_items(box_subfolder,
+                                                    update_files=self.update_files,
+                                                    remove_items=self.remove_items,
+                                                    is_verbose=self.is_verbose,
+                                                    box_index=box_index,
+                                                    upload_executor=upload_executor,
+                                                    chunked_uploader=self.chunked_uploader,
+                                                    series_bundler=self.series_bundler,
+                                                    hash_index=self.hash_index)
+                self.n_sessions_synced += 1
+        finally:
+            if upload_executor is not None:
+                upload_executor.shutdown()
+            if self.sync_metrics is not None:
+                if self.series_bundler is None:  # bundled series put one Box File per series
+                    _, n_files_kept = sm.SyncMetrics.count_tree(root_node)
+                    n_files_put = self.sync_metrics.counters["box_files_put"] - box_files_put_before
+                    self.sync_metrics.increment("local_files_unchanged", max(0, n_files_kept - n_files_put))
+                # Rewritten after each batch, failed or not, so the files stay current while watching
+                self.sync_metrics.write_outputs(self.metrics_json_path, self.metrics_textfile_path)
+        box_index.print_summary()
+
+    def print_summary(self):
+        """Print how many batches and sessions have been synced since watching started"""
+        print(f"Watch:",
+              f"{self.n_batches} batches,",
+              f"{self.n_sessions_synced} sessions synced,",
+              f"{self.n_sessions_removed} removed from Box")
+
+
+def watch_sessions(session_watcher, session_syncer, debounce_seconds=default_debounce_seconds):
+    """Sync session directories as they change, each once it has been quiet for `debounce_seconds`, until
+    interrupted
+
+    A batch that fails, e.g., on a Box outage, is retried once its sessions have been quiet for `debounce_seconds`
+    again.
+
+    :param session_watcher: A watcher reporting changed session directories
+    :type  session_watcher: InotifyWatcher/PollingWatcher
+    :param session_syncer: A syncer to sync changed session directories with
+    :type  session_syncer: SessionSyncer
+    :param debounce_seconds: Seconds a session directory must go without changes before it's synced
+    :type  debounce_seconds: float
+    """
+    session_debouncer = SessionDebouncer(debounce_seconds)
+    while True:
+        session_debouncer.note_changes(session_watcher.wait_for_changes(session_debouncer.get_wait_seconds()))
+        ready_session_names = session_debouncer.pop_ready()
+        if not ready_session_names:
+            continue
+        try:
+            session_syncer.sync_sessions(ready_session_names)
+        except Exception as exception:
+            print(f"Syncing changed sessions failed ({type(exception).__name__}: {exception});",
+                  f"retrying in {debounce_seconds:.0f} s")
+            session_debouncer.note_changes(ready_session_names)
@@ -0,0 +1,279 @@
+import time
+import queue
+import threading
+
+import ummap_mri_sync_to_box_helpers as hlps
+import dir_entry_node as den
+
+###########
+# Globals #
+
+# Default number of classified folder nodes allowed to wait for the sync thread
+default_queue_size = 16
+
+
+class StreamingSyncEngine:
+    """A streaming alternative to building, pruning, and then syncing the whole DirEntryNode tree
+
+    The local tree is walked depth-first by a generator that yields each folder as soon as everything below it has
+    been scanned and classified: a series folder right after its DICOM headers are read, and its session folder after
+    its last series. Kept folders go through a bounded queue to a sync thread, which syncs each one's files into its
+    Box Folder, creating Box Folders on the way down as needed, while the walk goes on. Uploads start with the first
+    kept series instead of after the last DICOM file has been scanned.
+
+    Pruned subtrees are dropped as soon as they are classified, and a kept folder's file nodes are dropped once they
+    have been synced, so memory depends on the number of folders and the queue size rather than the number of files.
+    When the queue is full, the walk waits for the sync thread to catch up.
+
+    The walk and classification run on the calling thread, since the DicomHeaderIndex's SQLite connection belongs to
+    it; BoxFolderIndex reads and writes all happen on the sync thread.
+    """
+
+    def __init__(self, box_index, update_files=False, remove_items=False, is_verbose=False, upload_executor=None,
+                 chunked_uploader=None, series_bundler=None, hash_index=None, queue_size=default_queue_size):
+        """Instantiation method for StreamingSyncEngine class
+
+        :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+        :type  box_index: BoxFolderIndex
+        :param update_files: A boolean flag for updating Box Files from source based on timestamps
+        :type  update_files: boolean
+        :param remove_items: A boolean flag for removing Box Folders and Box Files not in tree object model
+        :type  remove_items: boolean
+        :param is_verbose: A boolean flag for verbosity
+        :type  is_verbose: boolean
+        :param upload_executor: A thread pool to run uploads on; uploads run one at a time on the sync thread if None
+        :type  upload_executor: BoxUploadExecutor, optional
+        :param chunked_uploader: An uploader sending large files in parts through resumable Box upload sessions
+        :type  chunked_uploader: ChunkedUploader, optional
+        :param series_bundler: A bundler uploading each series folder as one archive; series are walked if None
+        :type  series_bundler: SeriesBundler, optional
+        :param hash_index: An index of local SHA-1s to update Box Files by content; timestamps are compared if None
+        :type  hash_index: FileHashIndex, optional
+        :param queue_size: A number of kept folder nodes allowed to wait for the sync thread
+        :type  queue_size: int, optional
+        """
+        self.box_index = box_index
+        self.update_files = update_files
+        self.remove_items = remove_items
+        self.is_verbose = is_verbose
+        self.upload_executor = upload_executor
+        self.chunked_uploader = chunked_uploader
+        self.series_bundler = series_bundler
+        self.hash_index = hash_index
+        self.node_queue = queue.Queue(maxsize=queue_size)
+        self.box_folders = {}  # folder DirEntryNode -> Box Folder, for folders whose own node hasn't been synced yet
+        self.sync_error = None
+        self.started_at = None
+        self.first_sync_seconds = None
+        self.n_folders_scanned = 0
+        self.n_files_found = 0
+        self.n_files_kept = 0
+        self.n_folders_kept = 0
+        self.n_folders_synced = 0
+        self.max_queue_depth = 0
+
+    def run(self, root_node, box_folder, rgx_folder, rgx_file, rgx_sequence, series_sample_size=0,
+            series_verify_size=0, header_index=None, dir_scan_snapshot=None, shard=None):
+        """Walk, classify, and sync the tree under a root DirEntryNode object into a Box Folder, returning once every
+        kept folder has been synced
+
+        Uploads handed to an upload executor may still be running; shut it down to wait for them.
+
+        :param root_node: A root DirEntryNode object with no children yet
+        :type  root_node: DirEntryNode
+        :param box_folder: A Box Folder to sync the root DirEntryNode object's contents into
+        :type  box_folder: Folder
+        :param rgx_folder: A Regex for filtering which folders to walk
+        :type  rgx_folder: Regex
+        :param rgx_file: A Regex for filtering which files to keep
+        :type  rgx_file: Regex
+        :param rgx_sequence: A Regex for matching a DICOM Dataset Series Description
+        :type  rgx_sequence: Regex
+        :param series_sample_size: A number of files to read per series folder; 0 reads files until one matches
+        :type  series_sample_size: int
+        :param series_verify_size: A number of the remaining files per series folder to check against the sample
+        :type  series_verify_size: int
+        :param header_index: An on-disk index to serve DICOM header reads from, if its rows are still valid
+        :type  header_index: DicomHeaderIndex, optional
+        :param dir_scan_snapshot: A snapshot of directory listings to reuse for directories that haven't changed
+        :type  dir_scan_snapshot: DirScanSnapshot, optional
+        :param shard: A shard whose share of the root DirEntryNode's children is the only share walked
+        :type  shard: SyncShard, optional
+        """
+        self.started_at = time.perf_counter()
+        sync_thread = threading.Thread(target=self.sync_queued_nodes, args=(box_folder,), name="box-stream")
+        sync_thread.start()
+        try:
+            for dir_entry_node in self.iter_kept_nodes(root_node, rgx_folder, rgx_file, rgx_sequence,
+                                                       series_sample_size, series_verify_size, header_index,
+                                                       dir_scan_snapshot, shard):
+                self.node_queue.put(dir_entry_node)
+                self.max_queue_depth = max(self.max_queue_depth, self.node_queue.qsize())
+                if self.sync_error is not None:  # stop walking; the error is raised below
+                    break
+        finally:
+            self.node_queue.put(None)
+            sync_thread.join()
+        if self.sync_error is not None:
+            raise self.sync_error
+
+    def iter_kept_nodes(self, dir_entry_node, rgx_folder, rgx_file, rgx_sequence, series_sample_size=0,
+                        series_verify_size=0, header_index=None, dir_scan_snapshot=None, shard=None):
+        """Walk the local tree below a folder DirEntryNode object, yielding each kept folder after its subtree
+
+        A folder is kept if a child folder is kept or, failing that, if one of its own DICOM files has a matching
+        Series Description, just as in `prune_tree_post_order`. Kept child folders are added to their parent before
+        the parent is yielded; pruned ones are never added. The root is yielded even if nothing is kept, as the
+        recursive engine syncs it regardless, so `remove_items` still clears Box Folders with nothing left locally.
+
+        :param dir_entry_node: A folder DirEntryNode object with no children yet
+        :type  dir_entry_node: DirEntryNode
+        :param rgx_folder: A Regex for filtering which folders to walk
+        :type  rgx_folder: Regex
+        :param rgx_file: A Regex for filtering which files to keep
+        :type  rgx_file: Regex
+        :param rgx_sequence: A Regex for matching a DICOM Dataset Series Description
+        :type  rgx_sequence: Regex
+        :param series_sample_size: A number of files to read per series folder; 0 reads files until one matches
+        :type  series_sample_size: int
+        :param series_verify_size: A number of the remaining files per series folder to check against the sample
+        :type  series_verify_size: int
+        :param header_index: An on-disk index to serve DICOM header reads from, if its rows are still valid
+        :type  header_index: DicomHeaderIndex, optional
+        :param dir_scan_snapshot: A snapshot of directory listings to reuse for directories that haven't changed
+        :type  dir_scan_snapshot: DirScanSnapshot, optional
+        :param shard: A shard whose share of this folder's children is the only share walked; for the root only
+        :type  shard: SyncShard, optional
+
+        :return: A boolean whether the folder DirEntryNode object is kept
+        :rtype: boolean
+        """
+        dir_entry_folders, dir_entry_files = dir_entry_node.scan_child_dir_entries(rgx_folder, rgx_file,
+                                                                                   dir_scan_snapshot)
+        if shard is not None:
+            dir_entry_folders, dir_entry_files = shard.filter_dir_entries(dir_entry_folders, dir_entry_files)
+        self.n_folders_scanned += 1
+        self.n_files_found += len(dir_entry_files)
+
+        for dir_entry_file in dir_entry_files:
+            dir_entry_node.add_child(den.DirEntryNode(dir_entry_file, depth=dir_entry_node.depth + 1,
+                                                      parent=dir_entry_node))
+
+        for dir_entry_folder in dir_entry_folders:  # depth-first
+            new_dir_entry_node_folder = den.DirEntryNode(dir_entry_folder, depth=dir_entry_node.depth + 1,
+                                                         parent=dir_entry_node)
+            folder_is_kept = yield from self.iter_kept_nodes(new_dir_entry_node_folder, rgx_folder, rgx_file,
+                                                             rgx_sequence, series_sample_size, series_verify_size,
+                                                             header_index, dir_scan_snapshot)
+            if folder_is_kept:
+                dir_entry_node.add_child(new_dir_entry_node_folder)
+
+        # Kept child folders are already classified, so only a folder without any has its own files read
+        is_kept = bool(dir_entry_node.child_folders_by_name) or \
+            dir_entry_node.prune_tree_post_order(rgx_sequence, series_sample_size, series_verify_size, header_index)
+
+        if is_kept or dir_entry_node.parent is None:
+            self.n_folders_kept += 1
+            self.n_files_kept += len(dir_entry_node.child_files_by_name)
+            yield dir_entry_node
+        return is_kept
+
+    def sync_queued_nodes(self, root_box_folder):
+        """Sync folder DirEntryNode objects off the queue until the walk is done; runs on the sync thread
+
+        After an error, the rest of the queue is drained without syncing, so the walk is never left blocked on it.
+
+        :param root_box_folder: A Box Folder corresponding to the root DirEntryNode object
+        :type  root_box_folder: Folder
+        """
+        while True:
+            dir_entry_node = self.node_queue.get()
+            if dir_entry_node is None:
+                return
+            if self.sync_error is not None:
+                continue
+            try:
+                self.sync_node(dir_entry_node, root_box_folder)
+            except Exception as exception:
+                self.sync_error = exception
+
+    def sync_node(self, dir_entry_node, root_box_folder):
+        """Sync a kept folder DirEntryNode object's files into its Box Folder, then drop its file nodes
+
+        Its kept child folders were synced before it, so with `remove_items`, only Box subFolders it doesn't keep are
+        removed.
+
+        :param dir_entry_node: A kept folder DirEntryNode object whose subtree has been synced
+        :type  dir_entry_node: DirEntryNode
+        :param root_box_folder: A Box Folder corresponding to the root DirEntryNode object
+        :type  root_box_folder: Folder
+        """
+        if self.first_sync_seconds is None:
+            self.first_sync_seconds = time.perf_counter() - self.started_at
+        self.n_folders_synced += 1
+
+        if self.series_bundler is not None and dir_entry_node.parent is not None and \
+                self.series_bundler.is_series_node(dir_entry_node):
+            dir_entry_node.upload_series_bundle(self.get_box_folder(dir_entry_node.parent, root_box_folder),
+                                                self.series_bundler, self.update_files, self.is_verbose,
+                                                self.box_index, self.upload_executor)
+            if self.upload_executor is None:  # a queued bundle upload reads the file nodes when it runs
+                dir_entry_node.child_files_by_name = {}
+            return
+
+        box_folder = self.get_box_folder(dir_entry_node, root_box_folder)
+        box_subitems = self.box_index.get_subitems(box_folder)
+        box_subfolders = hlps.get_box_subfolders(box_subitems)
+        box_subfiles = hlps.get_box_subfiles(box_subitems)
+
+        if self.remove_items:
+            dir_entry_node.remove_box_subfolders(box_subfolders, self.is_verbose, self.box_index)
+            dir_entry_node.remove_box_subfiles(box_subfiles, self.is_verbose, self.box_index, self.series_bundler)
+
+        dir_entry_node.create_box_subfiles(box_folder, box_subfiles, self.is_verbose, self.box_index,
+                                           self.upload_executor, self.chunked_uploader)
+
+        if self.update_files:
+            dir_entry_node.update_box_subfiles(box_folder, box_subfiles, self.is_verbose, self.box_index,
+                                               self.upload_executor, self.chunked_uploader, self.hash_index)
+
+        # Queued uploads hold on to their own file nodes
+        self.box_folders.pop(dir_entry_node, None)
+        dir_entry_node.child_files_by_name = {}
+
+    def get_box_folder(self, dir_entry_node, root_box_folder):
+        """Get the Box Folder corresponding to a folder DirEntryNode object, creating it and its parents if needed
+
+        :param dir_entry_node: A folder DirEntryNode object
+        :type  dir_entry_node: DirEntryNode
+        :param root_box_folder: A Box Folder corresponding to the root DirEntryNode object
+        :type  root_box_folder: Folder
+
+        :return: A Box Folder
+        :rtype: Folder
+        """
+        if dir_entry_node.parent is None:
+            return root_box_folder
+        box_folder = self.box_folders.get(dir_entry_node)
+        if box_folder is not None:
+            return box_folder
+
+        parent_box_folder = self.get_box_folder(dir_entry_node.parent, root_box_folder)
+        box_folder = self.box_index.get_subfolder(parent_box_folder, dir_entry_node.dir_entry.name)
+        if box_folder is None:
+            box_folder, is_new = hlps.create_box_subfolder(parent_box_folder, dir_entry_node.dir_entry.name)
+            self.box_index.add_new_folder(parent_box_folder, box_folder, is_new)
+            if self.is_verbose:
+                dir_entry_node.print_subitem_action(box_folder, "Creating")
+        self.box_folders[dir_entry_node] = box_folder
+        return box_folder
+
+    def print_summary(self):
+        """Print walk, classification, and sync counts, and how soon syncing started"""
+        first_sync = "never" if self.first_sync_seconds is None else f"after {self.first_sync_seconds:.2f} s"
+        print(f"Streaming sync:",
+              f"{self.n_folders_scanned} folders scanned,",
+              f"{self.n_files_kept} of {self.n_files_found} files kept in {self.n_folders_kept} folders,",
+              f"{self.n_folders_synced} folders synced;",
+              f"first sync {first_sync},",
+              f"queue depth peaked at {self.max_queue_depth}")
@@ -0,0 +1,313 @@
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from datetime import datetime
+
+###########
+# Globals #
+
+# Upper bounds in seconds of the Box API request latency histogram buckets; the last bucket is unbounded
+latency_bucket_bounds = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+# Prefix of every metric name in the Prometheus textfile
+prometheus_metric_prefix = "ummap_mri_sync"
+
+# Help text for each counter in the Prometheus textfile
+counter_help = {
+    "directories_scanned": "Local directories in the tree built, listed or reused from the scan snapshot.",
+    "directories_from_snapshot": "Local directories whose listings were reused from the scan snapshot.",
+    "local_files_found": "Local files matching the file regex found while building the tree.",
+    "local_files_kept": "Local files left in the tree after pruning.",
+    "local_files_pruned": "Local files dropped by pruning.",
+    "dicom_headers_parsed": "DICOM file headers parsed from disk.",
+    "box_folders_created": "Box Folders created.",
+    "box_files_put": "Box Files uploaded or updated.",
+    "box_bytes_uploaded": "Bytes of Box Files uploaded or updated.",
+    "box_items_deleted": "Box Files and Folders deleted.",
+    "local_files_unchanged": "Local files left in the tree that already matched Box and were skipped.",
+}
+
+
+class SyncMetrics:
+    """Per-run timings and counters: phase wall and CPU times, tree and DICOM counts, and Box API calls and bytes
+
+    Phases are timed with `phase`, and profiled too if a PhaseProfiler is passed. Box API requests are reported by a
+    BoxRequestScheduler, and Box Folders created, Box Files put, and Box items deleted by a BoxFolderIndex; both must
+    be given this object. Metrics can be written as JSON and as a Prometheus textfile-collector file. The JSON of
+    each shard of a sharded run can be read back with `from_dict` and combined with `merge`.
+    """
+
+    def __init__(self, profiler=None, shard=None):
+        """Instantiation method for SyncMetrics class
+
+        :param profiler: A profiler to profile each timed phase with
+        :type  profiler: PhaseProfiler, optional
+        :param shard: A shard label, e.g., "2/4", if this run syncs one shard
+        :type  shard: str, optional
+        """
+        self.profiler = profiler
+        self.shard = shard
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.finished_at = None  # set only on metrics read back from JSON; a live run is timed up to now
+        self.phases = {}  # phase name -> {"wall_seconds": float, "cpu_seconds": float}
+        self.counters = {counter: 0 for counter in counter_help}
+        self.box_requests = {}  # endpoint -> {"count", "errors", "latency_seconds_sum", "latency_buckets"}
+
+    def phase(self, phase_name):
+        """Time a phase of the run, adding to the phase's times if it runs more than once
+
+        CPU time is the whole process's, so it includes worker threads.
+
+        :param phase_name: A name for the phase, e.g., "build_tree", "prune", or "sync"
+        :type  phase_name: str
+
+        :return: A context manager timing the code it wraps
+        :rtype: PhaseTimer
+        """
+        return PhaseTimer(self, phase_name)
+
+    def increment(self, counter, amount=1):
+        """Add to a counter, from any thread
+
+        :param counter: A counter name from `counter_help`
+        :type  counter: str
+        :param amount: An amount to add
+        :type  amount: int, optional
+        """
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    @staticmethod
+    def count_tree(root_node):
+        """Count the directories and files in a DirEntryNode tree
+
+        :param root_node: A root DirEntryNode object
+        :type  root_node: DirEntryNode
+
+        :return: A tuple of directory and file counts
+        :rtype: (int, int)
+        """
+        n_folders, n_files = 0, 0
+        dir_entry_nodes = [root_node]
+        while dir_entry_nodes:
+            dir_entry_node = dir_entry_nodes.pop()
+            n_folders += 1
+            n_files += len(dir_entry_node.child_dir_entry_node_files)
+            dir_entry_nodes.extend(dir_entry_node.child_dir_entry_node_folders)
+        return n_folders, n_files
+
+    def observe_box_request(self, endpoint, status_code, seconds):
+        """Record one Box API request's endpoint, outcome, and latency
+
+        :param endpoint: An endpoint name from `get_box_endpoint`, e.g., "list" or "upload"
+        :type  endpoint: str
+        :param status_code: An HTTP status code, or None if the request raised
+        :type  status_code: int
+        :param seconds: Seconds the request took
+        :type  seconds: float
+        """
+        with self.lock:
+            endpoint_requests = self.box_requests.get(endpoint)
+            if endpoint_requests is None:
+                endpoint_requests = self.box_requests[endpoint] = {
+                    "count": 0, "errors": 0, "latency_seconds_sum": 0.0,
+                    "latency_buckets": [0] * (len(latency_bucket_bounds) + 1)}
+            endpoint_requests["count"] += 1
+            if status_code is None or status_code >= 400:
+                endpoint_requests["errors"] += 1
+            endpoint_requests["latency_seconds_sum"] += seconds
+            endpoint_requests["latency_buckets"][bisect_left(latency_bucket_bounds, seconds)] += 1
+
+    def record_box_put(self, box_subitem):
+        """Count a Box Folder created or a Box File uploaded or updated, with its bytes
+
+        :param box_subitem: A Box File or Folder just created, uploaded, or updated
+        :type  box_subitem: Folder/File
+        """
+        if box_subitem.type == "folder":
+            self.increment("box_folders_created")
+        else:
+            with self.lock:
+                self.counters["box_files_put"] += 1
+                self.counters["box_bytes_uploaded"] += getattr(box_subitem, "size", None) or 0
+
+    def to_dict(self):
+        """Get every metric as a JSON-ready dict
+
+        :return: A dict of run times, phases, counters, and Box API requests by endpoint
+        :rtype: dict
+        """
+        with self.lock:
+            box_requests = {}
+            for endpoint, endpoint_requests in sorted(self.box_requests.items()):
+                bucket_bounds = [str(bound) for bound in latency_bucket_bounds] + ["+Inf"]
+                box_requests[endpoint] = {
+                    "count": endpoint_requests["count"],
+                    "errors": endpoint_requests["errors"],
+                    "latency_seconds_sum": round(endpoint_requests["latency_seconds_sum"], 6),
+                    "latency_buckets": dict(zip(bucket_bounds, endpoint_requests["latency_buckets"]))}
+            metrics = {"shard": self.shard} if self.shard else {}
+            metrics.update({
+                "started_at": datetime.fromtimestamp(self.started_at).astimezone().isoformat(timespec="milliseconds"),
+                "wall_seconds": round((self.finished_at or time.time()) - self.started_at, 6),
+                "phases": {phase_name: {times_name: round(seconds, 6) for times_name, seconds in times.items()}
+                           for phase_name, times in self.phases.items()},
+                "counters": dict(self.counters),
+                "box_requests": box_requests})
+            return metrics
+
+    @classmethod
+    def from_dict(cls, metrics_dict):
+        """Read back metrics written by `to_dict`, e.g., from one shard's `metrics_json` file
+
+        :param metrics_dict: A dict from `to_dict`
+        :type  metrics_dict: dict
+
+        :return: A SyncMetrics object whose run is over
+        :rtype: SyncMetrics
+        """
+        sync_metrics = cls(shard=metrics_dict.get("shard"))
+        sync_metrics.started_at = datetime.fromisoformat(metrics_dict["started_at"]).timestamp()
+        sync_metrics.finished_at = sync_metrics.started_at + metrics_dict["wall_seconds"]
+        sync_metrics.phases = {phase_name: dict(times) for phase_name, times in metrics_dict["phases"].items()}
+        sync_metrics.counters.update(metrics_dict["counters"])
+        sync_metrics.box_requests = {
+            endpoint: {"count": endpoint_requests["count"],
+                       "errors": endpoint_requests["errors"],
+                       "latency_seconds_sum": endpoint_requests["latency_seconds_sum"],
+                       "latency_buckets": list(endpoint_requests["latency_buckets"].values())}
+            for endpoint, endpoint_requests in metrics_dict["box_requests"].items()}
+        return sync_metrics
+
+    @classmethod
+    def merge(cls, shard_metrics):
+        """Combine the metrics of shards that ran side by side into metrics for the whole run
+
+        Counters, Box API requests, and CPU times are summed. The run spans the earliest start to the latest finish,
+        and each phase's wall time is its longest across shards, since that's how long the phase held up the run.
+
+        :param shard_metrics: A list of SyncMetrics objects, one per shard, from `from_dict`
+        :type  shard_metrics: list[SyncMetrics]
+
+        :return: A SyncMetrics object for the whole run
+        :rtype: SyncMetrics
+        """
+        merged_metrics = cls(shard=",".join(str(sync_metrics.shard) for sync_metrics in shard_metrics))
+        merged_metrics.started_at = min(sync_metrics.started_at for sync_metrics in shard_metrics)
+        merged_metrics.finished_at = max(sync_metrics.finished_at for sync_metrics in shard_metrics)
+        for sync_metrics in shard_metrics:
+            for phase_name, times in sync_metrics.phases.items():
+                phase_times = merged_metrics.phases.setdefault(phase_name, {"wall_seconds": 0.0, "cpu_seconds": 0.0})
+                phase_times["wall_seconds"] = max(phase_times["wall_seconds"], times["wall_seconds"])
+                phase_times["cpu_seconds"] += times["cpu_seconds"]
+            for counter, value in sync_metrics.counters.items():
+                merged_metrics.increment(counter, value)
+            for endpoint, endpoint_requests in sync_metrics.box_requests.items():
+                merged_requests = merged_metrics.box_requests.setdefault(endpoint, {
+                    "count": 0, "errors": 0, "latency_seconds_sum": 0.0,
+                    "latency_buckets": [0] * (len(latency_bucket_bounds) + 1)})
+                merged_requests["count"] += endpoint_requests["count"]
+                merged_requests["errors"] += endpoint_requests["errors"]
+                merged_requests["latency_seconds_sum"] += endpoint_requests["latency_seconds_sum"]
+                merged_requests["latency_buckets"] = [merged_count + count for merged_count, count in
+                                                      zip(merged_requests["latency_buckets"],
+                                                          endpoint_requests["latency_buckets"])]
+        return merged_metrics
+
+    def to_prometheus_text(self):
+        """Get every metric in the Prometheus text exposition format
+
+        :return: Metric lines, with HELP and TYPE comments
+        :rtype: str
+        """
+        metrics = self.to_dict()
+        prefix = prometheus_metric_prefix
+        lines = [f"# HELP {prefix}_last_run_timestamp_seconds Unix time the last run finished.",
+                 f"# TYPE {prefix}_last_run_timestamp_seconds gauge",
+                 f"{prefix}_last_run_timestamp_seconds {self.finished_at or time.time():.3f}",
+                 f"# HELP {prefix}_run_wall_seconds Wall time of the last run.",
+                 f"# TYPE {prefix}_run_wall_seconds gauge",
+                 f"{prefix}_run_wall_seconds {metrics['wall_seconds']}"]
+        for times_name, times_label in [("wall_seconds", "Wall"), ("cpu_seconds", "Process CPU")]:
+            lines += [f"# HELP {prefix}_phase_{times_name} {times_label} seconds per phase of the last run.",
+                      f"# TYPE {prefix}_phase_{times_name} gauge"]
+            lines += [f'{prefix}_phase_{times_name}{{phase="{phase_name}"}} {times[times_name]}'
+                      for phase_name, times in metrics["phases"].items()]
+        for counter, value in metrics["counters"].items():
+            lines += [f"# HELP {prefix}_{counter} {counter_help.get(counter, counter)}",
+                      f"# TYPE {prefix}_{counter} gauge",
+                      f"{prefix}_{counter} {value}"]
+
+        lines += [f"# HELP {prefix}_box_request_errors Box API requests that failed or got an error status.",
+                  f"# TYPE {prefix}_box_request_errors gauge"]
+        lines += [f'{prefix}_box_request_errors{{endpoint="{endpoint}"}} {endpoint_requests["errors"]}'
+                  for endpoint, endpoint_requests in metrics["box_requests"].items()]
+        lines += [f"# HELP {prefix}_box_request_seconds Box API request latency by endpoint.",
+                  f"# TYPE {prefix}_box_request_seconds histogram"]
+        for endpoint, endpoint_requests in metrics["box_requests"].items():
+            cumulative_count = 0
+            for bound, count in endpoint_requests["latency_buckets"].items():
+                cumulative_count += count
+                lines.append(f'{prefix}_box_request_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} '
+                             f'{cumulative_count}')
+            lines += [f'{prefix}_box_request_seconds_sum{{endpoint="{endpoint}"}} '
+                      f'{endpoint_requests["latency_seconds_sum"]}',
+                      f'{prefix}_box_request_seconds_count{{endpoint="{endpoint}"}} {endpoint_requests["count"]}']
+        return "\n".join(lines) + "\n"
+
+    def write_outputs(self, json_path=None, textfile_path=None):
+        """Write metrics as JSON and as a Prometheus textfile, to whichever paths are passed
+
+        Each file is written beside its path and renamed into place, so a reader (e.g., node_exporter's textfile
+        collector) never sees half a file.
+
+        :param json_path: A path to write JSON metrics to
+        :type  json_path: str, optional
+        :param textfile_path: A path to write Prometheus metrics to; it should end in `.prom`
+        :type  textfile_path: str, optional
+        """
+        for path, make_text in [(json_path, lambda: json.dumps(self.to_dict(), indent=2) + "\n"),
+                                (textfile_path, self.to_prometheus_text)]:
+            if path:
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                with open(temp_path, 'w') as metrics_file:
+                    metrics_file.write(make_text())
+                os.replace(temp_path, path)
+
+    def print_summary(self):
+        """Print wall and CPU time per phase"""
+        print(f"Phase times:",
+              ", ".join(f"{phase_name} {times['wall_seconds']:.2f} s ({times['cpu_seconds']:.2f} s CPU)"
+                        for phase_name, times in self.phases.items()))
+
+
+class PhaseTimer:
+    """A context manager timing, and profiling if a profiler is set, one phase of a run for SyncMetrics
+
+    It is a class rather than a `contextlib.contextmanager` generator because those set `__traceback__` on the
+    exceptions passing through them, which boxsdk's frozen BoxAPIException doesn't allow; the Box error would be
+    replaced by a FrozenInstanceError.
+    """
+
+    def __init__(self, sync_metrics, phase_name):
+        self.sync_metrics = sync_metrics
+        self.phase_name = phase_name
+        self.wall_started_at = None
+        self.cpu_started_at = None
+
+    def __enter__(self):
+        if self.sync_metrics.profiler is not None:
+            self.sync_metrics.profiler.start(self.phase_name)
+        self.wall_started_at, self.cpu_started_at = time.perf_counter(), time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        phase_times = self.sync_metrics.phases.setdefault(self.phase_name, {"wall_seconds": 0.0, "cpu_seconds": 0.0})
+        phase_times["wall_seconds"] += time.perf_counter() - self.wall_started_at
+        phase_times["cpu_seconds"] += time.process_time() - self.cpu_started_at
+        if self.sync_metrics.profiler is not None:
+            self.sync_metrics.profiler.stop(self.phase_name)
+        return False
@@ -0,0 +1,359 @@
+import json
+from datetime import datetime
+
+import ummap_mri_sync_to_box_helpers as hlps
+
+###########
+# Globals #
+
+# Version of the plan JSON layout, bumped when it changes incompatibly
+plan_format_version = 1
+
+# Kinds of operation a plan may hold, in the order their counts are reported
+operation_types = ["create_folder", "upload", "update", "delete"]
+
+
+class SyncPlan:
+    """A serializable list of Box operations that syncs a pruned DirEntryNode tree into a Box Folder
+
+    Each operation is a dict with an "id" (its position in the list), an "op" ("create_folder", "upload", "update",
+    or "delete"), the "name" and "type" of the Box item it touches, and its "depth" in the tree for printing. Its
+    target Box Folder is either an existing one, "box_folder_id", or one that an earlier create_folder operation
+    makes, "parent_op"; in that case "depends_on" lists that operation. Uploads and updates carry the "local_path"
+    and "size" of the local file, updates and deletes the "box_id" of the Box item. Operations are listed so that
+    every dependency comes before the operations that depend on it.
+    """
+
+    def __init__(self, root_box_folder_id, operations=None, created_at=None):
+        """Instantiation method for SyncPlan class
+
+        :param root_box_folder_id: A Box Folder ID the plan syncs into
+        :type  root_box_folder_id: str
+        :param operations: A list of operation dicts
+        :type  operations: list[dict], optional
+        :param created_at: An ISO timestamp of when the plan was made; now if None
+        :type  created_at: str, optional
+        """
+        self.root_box_folder_id = root_box_folder_id
+        self.operations = operations or []
+        self.created_at = created_at or datetime.now().astimezone().isoformat(timespec="seconds")
+
+    def add_operation(self, op_type, name, item_type, depth, box_folder_id=None, parent_op=None, **op_fields):
+        """Append an operation, filling in its ID and dependencies
+
+        :param op_type: A kind of operation: "create_folder", "upload", "update", or "delete"
+        :type  op_type: str
+        :param name: A name of the Box item the operation touches
+        :type  name: str
+        :param item_type: A type of the Box item: "folder" or "file"
+        :type  item_type: str
+        :param depth: A depth in the DirEntryNode tree of the Box item, for printing
+        :type  depth: int
+        :param box_folder_id: An existing Box Folder ID the operation targets
+        :type  box_folder_id: str, optional
+        :param parent_op: An ID of the create_folder operation whose new Box Folder the operation targets
+        :type  parent_op: int, optional
+        :param op_fields: Further fields, e.g., "local_path", "size", or "box_id"
+
+        :return: The new operation's ID
+        :rtype: int
+        """
+        operation = {"id": len(self.operations), "op": op_type, "name": name, "type": item_type, "depth": depth}
+        if parent_op is not None:
+            operation["parent_op"] = parent_op
+            operation["depends_on"] = [parent_op]
+        else:
+            operation["box_folder_id"] = box_folder_id
+            operation["depends_on"] = []
+        operation.update(op_fields)
+        self.operations.append(operation)
+        return operation["id"]
+
+    def get_summary(self):
+        """Get operation counts and byte totals by kind of operation
+
+        :return: A dict of "counts" and "bytes" dicts, each keyed by kind of operation plus "total"
+        :rtype: dict[str, dict[str, int]]
+        """
+        counts = {op_type: 0 for op_type in operation_types}
+        byte_totals = {op_type: 0 for op_type in operation_types}
+        for operation in self.operations:
+            counts[operation["op"]] += 1
+            byte_totals[operation["op"]] += operation.get("size") or 0
+        counts["total"] = sum(counts.values())
+        byte_totals["total"] = byte_totals["upload"] + byte_totals["update"]  # bytes sent to Box
+        return {"counts": counts, "bytes": byte_totals}
+
+    def to_json(self):
+        """Serialize the plan, with its summary, as a JSON string
+
+        :return: A JSON string
+        :rtype: str
+        """
+        return json.dumps({"version": plan_format_version,
+                           "created_at": self.created_at,
+                           "root_box_folder_id": self.root_box_folder_id,
+                           "summary": self.get_summary(),
+                           "operations": self.operations},
+                          indent=1)
+
+    @classmethod
+    def from_json(cls, plan_json):
+        """Deserialize a plan written by `to_json`
+
+        :param plan_json: A JSON string
+        :type  plan_json: str
+
+        :return: A SyncPlan object
+        :rtype: SyncPlan
+        """
+        plan_dict = json.loads(plan_json)
+        if plan_dict.get("version") != plan_format_version:
+            raise ValueError(f"Unsupported sync plan version: {plan_dict.get('version')}")
+        return cls(plan_dict["root_box_folder_id"], plan_dict["operations"], plan_dict["created_at"])
+
+    def print_summary(self):
+        """Print operation counts and byte totals"""
+        summary = self.get_summary()
+        print(f"Sync plan:",
+              ", ".join(f"{summary['counts'][op_type]} {op_type}" for op_type in operation_types) + ";",
+              f"{summary['bytes']['total']} bytes to send")
+
+
+class SyncPlanner:
+    """Diffs a pruned DirEntryNode tree against Box Folder listings into a SyncPlan, without changing anything
+
+    Box Folders are listed through a BoxFolderIndex, so a BoxManifest-seeded index plans without any Box API calls
+    for unchanged folders. Folders the plan creates aren't listed at all; everything under them is an upload.
+    """
+
+    def __init__(self, box_index, update_files=False, remove_items=False, hash_index=None):
+        """Instantiation method for SyncPlanner class
+
+        :param box_index: A per-run index of Box Folder listings to diff against
+        :type  box_index: BoxFolderIndex
+        :param update_files: A boolean flag for updating Box Files from source
+        :type  update_files: boolean
+        :param remove_items: A boolean flag for removing Box Folders and Box Files not in tree object model
+        :type  remove_items: boolean
+        :param hash_index: An index of local SHA-1s to update Box Files by content; timestamps are compared if None
+        :type  hash_index: FileHashIndex, optional
+        """
+        self.box_index = box_index
+        self.update_files = update_files
+        self.remove_items = remove_items
+        self.hash_index = hash_index
+
+    def make_plan(self, root_node, box_folder):
+        """Plan the sync of the tree composed of a DirEntryNode object into a Box Folder
+
+        :param root_node: A pruned root DirEntryNode object
+        :type  root_node: DirEntryNode
+        :param box_folder: A Box Folder to sync the root DirEntryNode object's contents into
+        :type  box_folder: Folder
+
+        :return: A SyncPlan object
+        :rtype: SyncPlan
+        """
+        sync_plan = SyncPlan(box_folder.id)
+        self.plan_existing_folder(sync_plan, root_node, box_folder)
+        return sync_plan
+
+    def plan_existing_folder(self, sync_plan, dir_entry_node, box_folder):
+        """Plan the sync of a folder DirEntryNode object's children into its existing Box Folder
+
+        :param sync_plan: A SyncPlan to append operations to
+        :type  sync_plan: SyncPlan
+        :param dir_entry_node: A folder DirEntryNode object
+        :type  dir_entry_node: DirEntryNode
+        :param box_folder: A Box Folder corresponding to the DirEntryNode object
+        :type  box_folder: Folder
+        """
+        box_subitems_by_name = self.box_index.get_subitems_by_name(box_folder)
+        child_folder_names = {den_folder.dir_entry.name for den_folder in dir_entry_node.child_dir_entry_node_folders}
+        child_file_names = {den_file.dir_entry.name for den_file in dir_entry_node.child_dir_entry_node_files}
+        depth = dir_entry_node.depth + 1
+
+        if self.remove_items:
+            for box_subitem in box_subitems_by_name.values():
+                if box_subitem.type == "folder" and box_subitem.name not in child_folder_names or \
+                        box_subitem.type == "file" and box_subitem.name not in child_file_names:
+                    sync_plan.add_operation("delete", box_subitem.name, box_subitem.type, depth,
+                                            box_folder_id=box_folder.id, box_id=box_subitem.id,
+                                            size=getattr(box_subitem, "size", None))
+
+        for den_folder in dir_entry_node.child_dir_entry_node_folders:
+            box_subitem = box_subitems_by_name.get(den_folder.dir_entry.name)
+            if box_subitem is not None and box_subitem.type == "folder":
+                self.plan_existing_folder(sync_plan, den_folder, box_subitem)
+            else:
+                op_id = sync_plan.add_operation("create_folder", den_folder.dir_entry.name, "folder", depth,
+                                                box_folder_id=box_folder.id)
+                self.plan_new_folder(sync_plan, den_folder, op_id)
+
+        for den_file in dir_entry_node.child_dir_entry_node_files:
+            box_subitem = box_subitems_by_name.get(den_file.dir_entry.name)
+            if box_subitem is None:
+                sync_plan.add_operation("upload", den_file.dir_entry.name, "file", depth, box_folder_id=box_folder.id,
+                                        local_path=den_file.dir_entry.path, size=den_file.dir_entry.stat().st_size)
+            elif self.update_files and box_subitem.type == "file" and \
+                    den_file.differs_from_box_subfile(box_subitem, self.hash_index):
+                sync_plan.add_operation("update", den_file.dir_entry.name, "file", depth, box_folder_id=box_folder.id,
+                                        box_id=box_subitem.id, local_path=den_file.dir_entry.path,
+                                        size=den_file.dir_entry.stat().st_size)
+
+    def plan_new_folder(self, sync_plan, dir_entry_node, parent_op):
+        """Plan the sync of a folder DirEntryNode object's children into the Box Folder an earlier operation creates
+
+        :param sync_plan: A SyncPlan to append operations to
+        :type  sync_plan: SyncPlan
+        :param dir_entry_node: A folder DirEntryNode object
+        :type  dir_entry_node: DirEntryNode
+        :param parent_op: An ID of the create_folder operation for the DirEntryNode object
+        :type  parent_op: int
+        """
+        depth = dir_entry_node.depth + 1
+        for den_folder in dir_entry_node.child_dir_entry_node_folders:
+            op_id = sync_plan.add_operation("create_folder", den_folder.dir_entry.name, "folder", depth,
+                                            parent_op=parent_op)
+            self.plan_new_folder(sync_plan, den_folder, op_id)
+        for den_file in dir_entry_node.child_dir_entry_node_files:
+            sync_plan.add_operation("upload", den_file.dir_entry.name, "file", depth, parent_op=parent_op,
+                                    local_path=den_file.dir_entry.path, size=den_file.dir_entry.stat().st_size)
+
+
+class SyncPlanExecutor:
+    """Runs the operations of a SyncPlan against Box, recording what changed in a BoxFolderIndex
+
+    Box Folders are created on this thread, in plan order, so each exists before any operation that depends on it
+    runs. Uploads, updates, and deletes run on a BoxUploadExecutor if one is passed, one at a time otherwise.
+    """
+
+    def __init__(self, box_folder, box_index, upload_executor=None, chunked_uploader=None, is_verbose=False):
+        """Instantiation method for SyncPlanExecutor class
+
+        :param box_folder: Any Box Folder from the authenticated client, used for its session and translator
+        :type  box_folder: Folder
+        :param box_index: A per-run index of Box Folder listings to record changes in
+        :type  box_index: BoxFolderIndex
+        :param upload_executor: A thread pool to run uploads, updates, and deletes on
+        :type  upload_executor: BoxUploadExecutor, optional
+        :param chunked_uploader: An uploader sending large files in parts through resumable Box upload sessions
+        :type  chunked_uploader: ChunkedUploader, optional
+        :param is_verbose: A boolean flag for verbosity
+        :type  is_verbose: boolean
+        """
+        self.box_folder = box_folder
+        self.box_index = box_index
+        self.upload_executor = upload_executor
+        self.chunked_uploader = chunked_uploader
+        self.is_verbose = is_verbose
+        self.created_folders = {}  # create_folder operation ID -> new Box Folder
+
+    def make_box_item(self, item_type, item_id, name=None):
+        """Make a Box File or Folder object from its ID without calling the Box API
+
+        :param item_type: A Box item type: "folder" or "file"
+        :type  item_type: str
+        :param item_id: A Box item ID
+        :type  item_id: str
+        :param name: A Box item name
+        :type  name: str, optional
+
+        :return: A Box File or Folder
+        :rtype: File/Folder
+        """
+        response_object = {"type": item_type, "id": item_id}
+        if name is not None:
+            response_object["name"] = name
+        return self.box_folder.translator.translate(self.box_folder.session, response_object)
+
+    def get_target_folder(self, operation):
+        """Get the Box Folder an operation targets: an existing one, or one an earlier operation created
+
+        :param operation: An operation dict
+        :type  operation: dict
+
+        :return: A Box Folder
+        :rtype: Folder
+        """
+        if "parent_op" in operation:
+            return self.created_folders[operation["parent_op"]]
+        return self.make_box_item("folder", operation["box_folder_id"])
+
+    def run(self, sync_plan):
+        """Run every operation of a SyncPlan, returning once they've all finished
+
+        :param sync_plan: A SyncPlan object
+        :type  sync_plan: SyncPlan
+        """
+        for operation in sync_plan.operations:
+            box_folder = self.get_target_folder(operation)
+            if operation["op"] == "create_folder":
+                box_subfolder, is_new = hlps.create_box_subfolder(box_folder, operation["name"])
+                self.created_folders[operation["id"]] = box_subfolder
+                self.on_result(operation, box_folder, box_subfolder, is_new)
+            else:
+                self.submit(operation, box_folder)
+        if self.upload_executor is not None:
+            self.upload_executor.wait()
+
+    def submit(self, operation, box_folder):
+        """Run an upload, update, or delete operation, on the BoxUploadExecutor if there is one
+
+        :param operation: An operation dict
+        :type  operation: dict
+        :param box_folder: The Box Folder the operation targets
+        :type  box_folder: Folder
+        """
+        if operation["op"] == "upload":
+            def box_call():
+                return hlps.upload_local_file(box_folder, operation["local_path"], self.chunked_uploader)
+        elif operation["op"] == "update":
+            box_file = self.make_box_item("file", operation["box_id"], operation["name"])
+
+            def box_call():
+                return hlps.update_box_file_contents(box_file, operation["local_path"], self.chunked_uploader)
+        else:
+            box_subitem = self.make_box_item(operation["type"], operation["box_id"], operation["name"])
+
+            def box_call():
+                if box_subitem.type == "folder":
+                    return box_subitem if box_subitem.delete(recursive=True) else None
+                return box_subitem if box_subitem.delete() else None
+
+        if self.upload_executor is not None:
+            self.upload_executor.submit(box_call, lambda box_subitem: self.on_result(operation, box_folder,
+                                                                                     box_subitem))
+        else:
+            self.on_result(operation, box_folder, box_call())
+
+    def on_result(self, operation, box_folder, box_subitem, is_new=True):
+        """Record a finished operation's Box item in the BoxFolderIndex and print it if verbose
+
+        :param operation: An operation dict
+        :type  operation: dict
+        :param box_folder: The Box Folder the operation targeted
+        :type  box_folder: Folder
+        :param box_subitem: The created, uploaded, updated, or deleted Box item; None if a delete failed
+        :type  box_subitem: Folder/File
+        :param is_new: For a create_folder operation, False if the Box subFolder was already there
+        :type  is_new: boolean, optional
+        """
+        if box_subitem is None:
+            return
+        if operation["op"] == "create_folder":
+            self.box_index.add_new_folder(box_folder, box_subitem, is_new)
+        elif operation["op"] == "delete":
+            self.box_index.remove_item(box_subitem)
+        else:
+            self.box_index.add_item(box_folder, box_subitem)
+
+        if self.is_verbose:
+            action_str = {"create_folder": "Creating", "upload": "Creating", "update": "Updating",
+                          "delete": "Removed Box"}[operation["op"]]
+            print("  " * operation["depth"] +
+                  f"{action_str} sub{box_subitem.type.capitalize()}",
+                  f"'{box_subitem.name}'",
+                  f"with ID",
+                  f"'{box_subitem.id}'")
@@ -0,0 +1,122 @@
+import re
+import hashlib
+import argparse
+
+###########
+# Globals #
+
+# Bytes of a name's SHA-1 digest read as the number its shard is picked by
+shard_hash_bytes = 8
+
+
+def parse_shard(val):
+    """Parse a `K/N` shard argument, for argparse
+
+    :param val: A shard argument, e.g., "2/4" for the second of four shards
+    :type  val: str
+
+    :return: A SyncShard object
+    :rtype: SyncShard
+    """
+    match = re.match(r'^(\d+)/(\d+)$', val)
+    if not match:
+        raise argparse.ArgumentTypeError(f"Shard expected as K/N, e.g., 2/4.")
+    index, count = int(match.group(1)), int(match.group(2))
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"Shard K/N needs 1 <= K <= N.")
+    return SyncShard(index, count)
+
+
+def get_shard_index(name, count):
+    """Get the shard a top-level folder name belongs to, from a hash that's the same on every host and Python version
+
+    :param name: A name of a subject/session folder directly under the MRI folder
+    :type  name: str
+    :param count: A number of shards
+    :type  count: int
+
+    :return: A 1-based shard index
+    :rtype: int
+    """
+    digest = hashlib.sha1(name.encode("utf-8")).digest()
+    return int.from_bytes(digest[:shard_hash_bytes], "big") % count + 1
+
+
+class SyncShard:
+    """One of N cooperating runs that each sync a share of the subject/session folders under the same MRI folder
+
+    Each folder directly under the MRI folder belongs to exactly one shard, by a stable hash of its name, so shards
+    can run as separate processes or on separate hosts without talking to each other. A shard scans, classifies, and
+    syncs only its own folders, plus any matching files directly under the MRI folder if it's shard 1.
+
+    On Box, the Box Folder being synced into is shared, so the other shards' Box subitems are hidden from its listing
+    in the BoxFolderIndex: nothing of theirs is created, updated, or removed, even with `remove_items`.
+    """
+
+    def __init__(self, index, count):
+        """Instantiation method for SyncShard class
+
+        :param index: A 1-based index of this shard
+        :type  index: int
+        :param count: A number of shards
+        :type  count: int
+        """
+        self.index = index
+        self.count = count
+        self.n_folders_owned = 0
+        self.n_folders_skipped = 0
+        self.n_box_items_hidden = 0
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+    def owns_name(self, name):
+        """Check whether a subject/session folder belongs to this shard
+
+        :param name: A name of a folder directly under the MRI folder, or of its Box subFolder
+        :type  name: str
+
+        :return: A boolean whether this shard syncs the folder
+        :rtype: boolean
+        """
+        return get_shard_index(name, self.count) == self.index
+
+    def filter_dir_entries(self, dir_entry_folders, dir_entry_files):
+        """Keep the child folders and files of the root DirEntryNode object that belong to this shard
+
+        :param dir_entry_folders: A list of DirEntry folders listed directly under the MRI folder
+        :type  dir_entry_folders: list[DirEntry]
+        :param dir_entry_files: A list of DirEntry files listed directly under the MRI folder
+        :type  dir_entry_files: list[DirEntry]
+
+        :return: A tuple of lists of this shard's DirEntry folders and DirEntry files
+        :rtype: ([DirEntry], [DirEntry])
+        """
+        owned_dir_entry_folders = [dir_entry for dir_entry in dir_entry_folders if self.owns_name(dir_entry.name)]
+        self.n_folders_owned += len(owned_dir_entry_folders)
+        self.n_folders_skipped += len(dir_entry_folders) - len(owned_dir_entry_folders)
+        return owned_dir_entry_folders, (dir_entry_files if self.index == 1 else [])
+
+    def hide_unowned_box_items(self, box_index, box_folder):
+        """Drop other shards' Box subitems from the BoxFolderIndex listing of the Box Folder being synced into
+
+        Call it once Box state is loaded (from a BoxManifest or BoxSyncJournal, if used) and before syncing.
+
+        :param box_index: A per-run index of Box Folder listings
+        :type  box_index: BoxFolderIndex
+        :param box_folder: The Box Folder corresponding to the MRI folder
+        :type  box_folder: Folder
+        """
+        box_subitems = box_index.get_subitems(box_folder)
+        owned_box_subitems = [box_subitem for box_subitem in box_subitems
+                              if (self.owns_name(box_subitem.name) if box_subitem.type == "folder"
+                                  else self.index == 1)]
+        box_index.seed_listing(box_folder.id, owned_box_subitems)
+        self.n_box_items_hidden += len(box_subitems) - len(owned_box_subitems)
+
+    def print_summary(self):
+        """Print how many top-level folders this shard took and left to the others"""
+        print(f"Shard {self}:",
+              f"{self.n_folders_owned} top-level folders synced here,",
+              f"{self.n_folders_skipped} left to other shards,",
+              f"{self.n_box_items_hidden} of their Box items left alone")
@@ -5,10 +5,29 @@
 
 import os
 import re
+import signal
 import argparse
 
 import ummap_mri_sync_to_box_helpers as hlps
 import dir_entry_node as den
+import dir_scan_snapshot as dss
+import dicom_header_index as dhi
+import dicom_classifier as dcl
+import box_folder_index as bfi
+import box_manifest as bm
+import box_upload_executor as bue
+import async_sync_engine as ase
+import box_chunked_upload as bcu
+import series_bundler as sb
+import file_hash_index as fhi
+import sync_plan as sp
+import box_sync_journal as bsj
+import box_request_scheduler as brs
+import sync_metrics as sm
+import phase_profiler as pp
+import streaming_sync_engine as sse
+import session_watcher as sw
+import sync_shard as ss
 
 
 def str2bool(val):
@@ -56,85 +75,513 @@ def main():
                         type=str2bool, nargs='?', const=True, default=False,
                         help=f"danger: remove items not in model tree of folders/files defined by `subfolder_regex`")
 
+    parser.add_argument('--scan_workers', type=int, default=1,
+                        help=f"number of local directories to list at once while building the tree")
+
+    parser.add_argument('--scan_snapshot', '--scan-snapshot', metavar='PATH',
+                        help=f"path to an on-disk SQLite snapshot of local directory listings; directories whose "
+                             f"modified time hasn't changed since the last run aren't listed again")
+
+    parser.add_argument('--rescan_all', '--rescan-all',
+                        type=str2bool, nargs='?', const=True, default=False,
+                        help=f"with `scan_snapshot`: list every directory again, then write a fresh snapshot")
+
+    parser.add_argument('--classify_workers', '--classify-workers', type=int, default=1,
+                        help=f"number of processes to parse DICOM headers on before pruning; "
+                             f"1 parses them in-process while pruning")
+
+    parser.add_argument('--series_sample_size', type=int, default=0,
+                        help=f"number of DICOM headers to read per `s#####` series folder to classify the whole "
+                             f"series; 0 reads files until one matches")
+
+    parser.add_argument('--series_verify_size', type=int, default=0,
+                        help=f"number of the remaining DICOM headers per series folder to check against the sample")
+
+    parser.add_argument('--header_cache', '--header-cache', metavar='PATH',
+                        help=f"path to an on-disk SQLite index of DICOM headers reused across runs")
+
+    parser.add_argument('--box_manifest', '--box-manifest', metavar='PATH',
+                        help=f"path to an on-disk SQLite manifest of Box Folder listings from the last successful "
+                             f"sync; Box Folders untouched since then aren't listed again")
+
+    parser.add_argument('--full_reconcile', '--full-reconcile',
+                        type=str2bool, nargs='?', const=True, default=False,
+                        help=f"ignore the Box manifest and list every Box Folder")
+
+    parser.add_argument('--engine', choices=['recursive', 'async', 'plan', 'stream'], default='recursive',
+                        help=f"sync engine: `recursive` walks one Box Folder at a time; "
+                             f"`async` keeps the whole tree in flight at once; "
+                             f"`plan` diffs the whole tree first, then runs the resulting plan; "
+                             f"`stream` syncs each series folder as soon as it's scanned and classified")
+
+    parser.add_argument('--stream_queue_size', type=int, default=sse.default_queue_size,
+                        help=f"stream engine: number of classified folders allowed to wait to be synced before "
+                             f"scanning pauses")
+
+    parser.add_argument('--plan_only', '--plan-only', metavar='PATH',
+                        help=f"write the sync plan as JSON, with operation counts and byte totals, to PATH "
+                             f"and exit without changing Box")
+
+    parser.add_argument('--apply_plan', '--apply-plan', metavar='FILE',
+                        help=f"run a sync plan written by `plan_only` instead of scanning local folders")
+
+    parser.add_argument('--upload_workers', '--upload-workers', type=int,
+                        help=f"number of Box File uploads/updates to run at once across all folders "
+                             f"(default: 1 for the recursive engine, "
+                             f"{ase.default_concurrency_limits['upload']} for the async engine)")
+
+    parser.add_argument('--list_workers', '--list-workers', type=int,
+                        help=f"async engine: number of Box Folder listings to run at once "
+                             f"(default: {ase.default_concurrency_limits['list']})")
+
+    parser.add_argument('--mkdir_workers', '--mkdir-workers', type=int,
+                        help=f"async engine: number of Box Folder creations to run at once "
+                             f"(default: {ase.default_concurrency_limits['mkdir']})")
+
+    parser.add_argument('--upload_sessions', '--upload-sessions', metavar='PATH',
+                        help=f"path to an on-disk SQLite store of Box upload sessions; files at or above "
+                             f"`chunked_upload_threshold` are uploaded in parts and resumed after an interrupted run")
+
+    parser.add_argument('--chunked_upload_threshold', type=int,
+                        default=bcu.default_chunked_upload_threshold // (1024 * 1024),
+                        help=f"with `upload_sessions`: file size in MB at or above which files are uploaded in parts "
+                             f"(Box's minimum is {bcu.box_min_upload_session_size // (1024 * 1024)} MB)")
+
+    parser.add_argument('--part_workers', type=int, default=bcu.default_part_workers,
+                        help=f"with `upload_sessions`: number of parts of one file to upload at once")
+
+    parser.add_argument('--bundle_series', '--bundle-series', choices=['zip', 'tar'],
+                        help=f"upload each kept `s#####` series folder as one archive Box File, built on the fly, "
+                             f"with an index sidecar listing its members")
+
+    parser.add_argument('--update_mode', '--update-mode', choices=['mtime', 'sha1'], default='mtime',
+                        help=f"with `update_files`: `mtime` updates Box files older than their local copies; "
+                             f"`sha1` updates only Box files whose SHA-1 differs from their local copies'")
+
+    parser.add_argument('--hash_cache', '--hash-cache', metavar='PATH',
+                        help=f"with `update_mode sha1`: path to an on-disk SQLite index of local file SHA-1s "
+                             f"reused across runs")
+
+    parser.add_argument('--journal', metavar='PATH',
+                        help=f"path to an append-only journal of completed Box operations, cleared when a run "
+                             f"finishes")
+
+    parser.add_argument('--resume',
+                        type=str2bool, nargs='?', const=True, default=False,
+                        help=f"with `journal`: replay the journal of a run that died instead of listing the Box "
+                             f"Folders it created again")
+
+    parser.add_argument('--box_requests_per_second', type=float, default=brs.default_requests_per_second,
+                        help=f"budget for Box API requests other than uploads")
+
+    parser.add_argument('--box_uploads_per_second', type=float, default=brs.default_uploads_per_second,
+                        help=f"budget for Box File uploads and updates")
+
+    parser.add_argument('--box_max_concurrency', type=int, default=brs.default_max_concurrency,
+                        help=f"most Box API requests in flight at once; the limit adapts below this to latency "
+                             f"and throttling")
+
+    parser.add_argument('--metrics_json', '--metrics-json', metavar='PATH',
+                        help=f"write per-phase times, tree and DICOM counts, and Box API request metrics to a JSON "
+                             f"file")
+
+    parser.add_argument('--metrics_textfile', '--metrics-textfile', metavar='PATH',
+                        help=f"write the same metrics to a Prometheus textfile-collector file, e.g., "
+                             f"`ummap_mri_sync.prom`")
+
+    parser.add_argument('--profile', metavar='DIR',
+                        help=f"profile each phase (build tree, classify, prune, sync, ...), writing per-phase profile "
+                             f"files and a top-function summary into DIR")
+
+    parser.add_argument('--profile_mode', '--profile-mode', choices=pp.profile_modes, default='cprofile',
+                        help=f"with `profile`: `cprofile` traces every main-thread call into pstats files; "
+                             f"`sampling` snapshots every thread's stack into folded-stack files at low overhead")
+
+    parser.add_argument('--profile_top', type=int, default=pp.default_top_n,
+                        help=f"with `profile`: number of functions per phase in the summary")
+
+    parser.add_argument('--shard', type=ss.parse_shard, metavar='K/N',
+                        help=f"sync only shard K of N: the subject/session folders directly under `mri_path` are "
+                             f"split among N runs by a stable hash of their names, so N processes or hosts can sync "
+                             f"the same folder at once; merge their `metrics_json` files with "
+                             f"`merge_shard_summaries.py`")
+
+    parser.add_argument('--watch',
+                        type=str2bool, nargs='?', const=True, default=False,
+                        help=f"after the full sync, keep running and sync each session folder that changes once it "
+                             f"has been quiet for `watch_debounce` seconds")
+
+    parser.add_argument('--watch_mode', '--watch-mode', choices=sw.watch_modes, default='auto',
+                        help=f"with `watch`: `inotify` watches folders for changes; `poll` compares folder modified "
+                             f"times every `watch_poll_interval` seconds; `auto` polls on NFS and uses inotify "
+                             f"elsewhere")
+
+    parser.add_argument('--watch_debounce', '--watch-debounce', type=float, default=sw.default_debounce_seconds,
+                        help=f"with `watch`: seconds a session folder must go without changes before it's synced")
+
+    parser.add_argument('--watch_poll_interval', type=float, default=sw.default_poll_interval,
+                        help=f"with `watch_mode poll`: seconds between folder snapshots")
+
     parser.add_argument('-v', '--verbose',
                         type=str2bool, nargs='?', const=True, default=False,
                         help=f"print actions to stdout")
 
     args = parser.parse_args()
 
+    if args.engine == 'stream' and args.plan_only:
+        parser.error(f"`plan_only` needs the whole tree, so it can't be used with `engine stream`")
+    if args.watch and (args.plan_only or args.apply_plan):
+        parser.error(f"`watch` can't be used with `plan_only` or `apply_plan`")
+    if args.bundle_series and (args.engine == 'plan' or args.plan_only or args.apply_plan):
+        parser.error(f"sync plans upload series file by file, so `bundle_series` can't be used with `engine plan`, "
+                     f"`plan_only`, or `apply_plan`")
+    if args.resume and args.apply_plan:
+        parser.error(f"a saved plan's operations all run as written, so `resume` can't be used with `apply_plan`; "
+                     f"write a new plan with `plan_only` instead")
+
     #################
     # Configuration #
 
+    # Start timing (and, if asked, profiling) phases and counting work; DICOM headers parsed before this run aren't
+    # counted
+    phase_profiler = None
+    if args.profile:
+        phase_profiler = pp.PhaseProfiler(args.profile, profile_mode=args.profile_mode, top_n=args.profile_top)
+    sync_metrics = sm.SyncMetrics(profiler=phase_profiler, shard=args.shard and str(args.shard))
+    dicom_headers_parsed_before = hlps.dicom_headers_parsed
+
     # Access args.update_files, args.remove_items, and args.verbose once
     update_files = args.update_files
     remove_items = args.remove_items
     is_verbose = args.verbose
 
-    # Set the path of the folder whose MRI contents should be copied to Box
-    mri_path_split = args.mri_path.split('/')
-    if mri_path_split[-1] == '':
-        del mri_path_split[-1]
-    mri_base_path = '/'.join(mri_path_split[:-1] + [''])
-    mri_dir = mri_path_split[-1]
-    # Using os.DirEntry object initially b/c os.scandir is better directory iterator.
-    # See https://www.python.org/dev/peps/pep-0471/ for details
-    dir_entries = os.scandir(mri_base_path)
-    mri_dir_entry = list(filter(lambda dir_entry: dir_entry.name == mri_dir, dir_entries))[0]
-    if is_verbose:
-        print(f"Path to MRI folders:", f"{mri_dir_entry.path}")
-
-    # Set the path to your JWT app config JSON file
-    jwt_cfg_path = args.jwt_cfg
-    if is_verbose:
-        print(f"Path to Box JWT config:", f"{jwt_cfg_path}")
-
-    # Set the path to the folder that will hold the upload
-    box_folder_id = args.box_folder_id
-
-    # Set regexes of subfolders and subfiles to sync
-    rgx_subfolder = re.compile(r'^hlp17umm\d{5}_\d{5}$|^dicom$|^s\d{5}$')  # e.g., hlp17umm00700_06072, dicom, s00003
-    args_subfolder_regex = args.subfolder_regex
-    if args_subfolder_regex:
-        rgx_subfolder = re.compile("|".join(args_subfolder_regex))
-    if is_verbose:
-        print(f"Folder regex(es):", f"{rgx_subfolder}")
-
-    rgx_subfile = re.compile(r'^i\d+\.MRDC\.\d+$')  # e.g., 'i53838914.MRDC.3'
-
-    # Set regexes of dicom dataset sequence series descriptions to sync
-    rgx_sequence = re.compile(r'^t1sag.*$|^t2flairsag.*$')
-    args_sequence_regex = args.sequence_regex
-    if args_sequence_regex:
-        rgx_sequence = re.compile("|".join(args_sequence_regex))
-    if is_verbose:
-        print(f"Sequence regex(es):", f"{rgx_sequence}")
-
-    ############################
-    # Establish Box Connection #
-
-    # Get authenticated Box client
-    box_client = hlps.get_box_authenticated_client(jwt_cfg_path, is_verbose=is_verbose)
-
-    # Create Box Folder object with authenticated client
-    box_folder = box_client.folder(folder_id=box_folder_id).get()
-
-    #########################################################
-    # Recurse Through Directories to Sync Files/Directories #
-
-    print(f"Building DirEntryNode tree from root node...")
-    root_node = den.DirEntryNode(mri_dir_entry, depth=0)
-    # Traverse local source directory to build tree object
-    root_node.build_tree_from_node(rgx_subfolder, rgx_subfile)
-
-    print(f"Pruning nodes...")
-    root_node.prune_nodes_without_dicom_dataset_series_descrip(rgx_sequence)
-
-    print(f"Syncing nodes to Box...")
-    root_node.sync_tree_object_items(box_folder,
-                                     update_files=update_files,
-                                     remove_items=remove_items,
-                                     is_verbose=is_verbose)
-    print(f"Done.\n")
+    # Access args.series_sample_size and args.series_verify_size once
+    series_sample_size = args.series_sample_size
+    series_verify_size = args.series_verify_size
+
+    # Set up optional upload, bundling, and hashing helpers
+    chunked_uploader = None
+    if args.upload_sessions:
+        chunked_uploader = bcu.ChunkedUploader(args.upload_sessions,
+                                               threshold=args.chunked_upload_threshold * 1024 * 1024,
+                                               part_workers=args.part_workers)
+    series_bundler = None
+    if args.bundle_series:
+        series_bundler = sb.SeriesBundler(args.bundle_series, chunked_uploader=chunked_uploader)
+    hash_index = None
+    if update_files and args.update_mode == 'sha1':
+        hash_index = fhi.FileHashIndex(args.hash_cache or ":memory:")
+    upload_executor = None
+    if args.engine != 'async' and args.upload_workers and args.upload_workers > 1:
+        upload_executor = bue.BoxUploadExecutor(args.upload_workers)
+
+    try:
+        # Open the directory scan snapshot if one is passed (a saved sync plan doesn't scan local folders)
+        dir_scan_snapshot = None
+        if args.scan_snapshot and not args.apply_plan:
+            dir_scan_snapshot = dss.DirScanSnapshot(args.scan_snapshot, rescan_all=args.rescan_all)
+            if is_verbose:
+                print(f"Path to directory scan snapshot:", f"{args.scan_snapshot}")
+
+        # Open the DICOM header index if one is passed (a saved sync plan doesn't read DICOM headers)
+        header_index = None
+        if args.header_cache and not args.apply_plan:
+            header_index = dhi.DicomHeaderIndex(args.header_cache)
+            if is_verbose:
+                print(f"Path to DICOM header cache:", f"{args.header_cache}")
+
+        # Set the path of the folder whose MRI contents should be copied to Box
+        mri_path_split = args.mri_path.split('/')
+        if mri_path_split[-1] == '':
+            del mri_path_split[-1]
+        mri_base_path = '/'.join(mri_path_split[:-1] + [''])
+        mri_dir = mri_path_split[-1]
+        # Using os.DirEntry object initially b/c os.scandir is better directory iterator.
+        # See https://www.python.org/dev/peps/pep-0471/ for details
+        dir_entries = os.scandir(mri_base_path)
+        mri_dir_entry = list(filter(lambda dir_entry: dir_entry.name == mri_dir, dir_entries))[0]
+        if is_verbose:
+            print(f"Path to MRI folders:", f"{mri_dir_entry.path}")
+
+        # Set the path to your JWT app config JSON file
+        jwt_cfg_path = args.jwt_cfg
+        if is_verbose:
+            print(f"Path to Box JWT config:", f"{jwt_cfg_path}")
+
+        # Set the path to the folder that will hold the upload
+        box_folder_id = args.box_folder_id
+
+        # Set regexes of subfolders and subfiles to sync
+        # e.g., hlp17umm00700_06072, dicom, s00003
+        rgx_subfolder = re.compile(r'^hlp17umm\d{5}_\d{5}$|^dicom$|^s\d{5}$')
+        args_subfolder_regex = args.subfolder_regex
+        if args_subfolder_regex:
+            rgx_subfolder = re.compile("|".join(args_subfolder_regex))
+        if is_verbose:
+            print(f"Folder regex(es):", f"{rgx_subfolder}")
+
+        rgx_subfile = re.compile(r'^i\d+\.MRDC\.\d+$')  # e.g., 'i53838914.MRDC.3'
+
+        # Set regexes of dicom dataset sequence series descriptions to sync
+        rgx_sequence = re.compile(r'^t1sag.*$|^t2flairsag.*$')
+        args_sequence_regex = args.sequence_regex
+        if args_sequence_regex:
+            rgx_sequence = re.compile("|".join(args_sequence_regex))
+        if is_verbose:
+            print(f"Sequence regex(es):", f"{rgx_sequence}")
+
+        # Start watching for changed session folders before the full sync, so changes made during it aren't missed
+        session_watcher = None
+        if args.watch:
+            session_watcher = sw.make_session_watcher(mri_dir_entry.path, rgx_subfolder, watch_mode=args.watch_mode,
+                                                      poll_interval=args.watch_poll_interval)
+            signal.signal(signal.SIGTERM, signal.default_int_handler)  # stop watching on SIGTERM as on Ctrl-C
+
+        ############################
+        # Establish Box Connection #
+
+        # Get authenticated Box client whose every API request goes through one shared scheduler
+        box_request_scheduler = brs.BoxRequestScheduler(requests_per_second=args.box_requests_per_second,
+                                                        uploads_per_second=args.box_uploads_per_second,
+                                                        max_concurrency=args.box_max_concurrency,
+                                                        metrics=sync_metrics)
+        with sync_metrics.phase("connect"):
+            box_client = hlps.get_box_authenticated_client(jwt_cfg_path, is_verbose=is_verbose,
+                                                           network_layer=box_request_scheduler)
+
+            # Create Box Folder object with authenticated client
+            box_folder = box_client.folder(folder_id=box_folder_id).get()
+
+        ##########################
+        # Read a Saved Sync Plan #
+
+        # A saved plan is run in place of scanning, with the same Box state, journal, and metrics as any other sync
+        sync_plan = None
+        if args.apply_plan:
+            with open(args.apply_plan) as plan_file:
+                sync_plan = sp.SyncPlan.from_json(plan_file.read())
+            if sync_plan.root_box_folder_id != box_folder.id:
+                parser.error(f"sync plan was made for Box Folder '{sync_plan.root_box_folder_id}', "
+                             f"not '{box_folder.id}'")
+            sync_plan.print_summary()
+
+        #########################################################
+        # Recurse Through Directories to Sync Files/Directories #
+
+        root_node = den.DirEntryNode(mri_dir_entry, depth=0)
+        n_files_kept = None
+        if args.engine != 'stream' and sync_plan is None:  # the stream engine scans, classifies, and prunes as it syncs
+            print(f"Building DirEntryNode tree from root node...")
+            # Traverse local source directory to build tree object
+            with sync_metrics.phase("build_tree"):
+                if args.scan_workers > 1:
+                    root_node.build_tree_from_node_parallel(rgx_subfolder, rgx_subfile, max_workers=args.scan_workers,
+                                                            dir_scan_snapshot=dir_scan_snapshot, shard=args.shard)
+                else:
+                    root_node.build_tree_from_node(rgx_subfolder, rgx_subfile, dir_scan_snapshot=dir_scan_snapshot,
+                                                   shard=args.shard)
+                if dir_scan_snapshot is not None:
+                    dir_scan_snapshot.evict_unvisited_dirs(mri_dir_entry.path)
+                    dir_scan_snapshot.close()
+                    sync_metrics.increment("directories_from_snapshot", dir_scan_snapshot.hits)
+            n_folders_found, n_files_found = sync_metrics.count_tree(root_node)
+            sync_metrics.increment("directories_scanned", n_folders_found)
+            sync_metrics.increment("local_files_found", n_files_found)
+
+            if args.classify_workers > 1:
+                print(f"Classifying DICOM headers...")
+                with sync_metrics.phase("classify"):
+                    n_headers_classified = dcl.classify_tree(root_node,
+                                                             rgx_sequence,
+                                                             classify_workers=args.classify_workers,
+                                                             header_index=header_index,
+                                                             series_sample_size=series_sample_size,
+                                                             series_verify_size=series_verify_size,
+                                                             is_verbose=is_verbose)
+                # Headers parsed in worker processes never reach this process's count, so classify's own count is taken,
+                # and only the headers pruning parses are counted from here
+                sync_metrics.increment("dicom_headers_parsed", n_headers_classified)
+                dicom_headers_parsed_before = hlps.dicom_headers_parsed
+
+            print(f"Pruning nodes...")
+            with sync_metrics.phase("prune"):
+                root_node.prune_nodes_without_dicom_dataset_series_descrip(rgx_sequence,
+                                                                           series_sample_size=series_sample_size,
+                                                                           series_verify_size=series_verify_size,
+                                                                           header_index=header_index)
+                if header_index is not None:
+                    header_index.evict_unvisited_files(mri_dir_entry.path)
+                    header_index.close()
+            _, n_files_kept = sync_metrics.count_tree(root_node)
+            sync_metrics.increment("local_files_kept", n_files_kept)
+            sync_metrics.increment("local_files_pruned", n_files_found - n_files_kept)
+            sync_metrics.increment("dicom_headers_parsed", hlps.dicom_headers_parsed - dicom_headers_parsed_before)
+
+        print(f"Syncing nodes to Box...")
+        box_index = bfi.BoxFolderIndex(metrics=sync_metrics)
+        box_manifest = None
+        sync_journal = None
+        with sync_metrics.phase("load_box_state"):
+            if args.box_manifest:
+                box_manifest = bm.BoxManifest(args.box_manifest)
+                box_manifest.load_into_index(box_client, box_folder, box_index,
+                                             full_reconcile=args.full_reconcile, is_verbose=is_verbose)
+            if args.journal and not args.plan_only:
+                sync_journal = bsj.BoxSyncJournal(args.journal)
+                if args.resume:
+                    sync_journal.replay_into_index(box_folder, box_index, is_verbose=is_verbose)
+                sync_journal.start(box_folder, resume=args.resume)
+                box_index.journal = sync_journal
+            if args.shard is not None:
+                args.shard.hide_unowned_box_items(box_index, box_folder)
+        if (args.plan_only or args.engine == 'plan') and sync_plan is None:
+            with sync_metrics.phase("plan"):
+                sync_planner = sp.SyncPlanner(box_index, update_files=update_files, remove_items=remove_items,
+                                              hash_index=hash_index)
+                sync_plan = sync_planner.make_plan(root_node, box_folder)
+            sync_plan.print_summary()
+        if args.plan_only:
+            with open(args.plan_only, 'w') as plan_file:
+                plan_file.write(sync_plan.to_json())
+            if box_manifest is not None:
+                box_manifest.close()  # nothing changed on Box, so the manifest is left as it was
+            box_request_scheduler.print_summary()
+            sync_metrics.print_summary()
+            sync_metrics.write_outputs(args.metrics_json, args.metrics_textfile)
+            if phase_profiler is not None:
+                phase_profiler.print_summary()
+            print(f"Done.\n")
+            return
+        with sync_metrics.phase("sync"):
+            if sync_plan is not None:
+                sp.SyncPlanExecutor(box_folder, box_index, upload_executor, chunked_uploader, is_verbose).run(sync_plan)
+                if upload_executor is not None:
+                    upload_executor.shutdown()
+            elif args.engine == 'stream':
+                streaming_sync_engine = sse.StreamingSyncEngine(box_index,
+                                                                update_files=update_files,
+                                                                remove_items=remove_items,
+                                                                is_verbose=is_verbose,
+                                                                upload_executor=upload_executor,
+                                                                chunked_uploader=chunked_uploader,
+                                                                series_bundler=series_bundler,
+                                                                hash_index=hash_index,
+                                                                queue_size=args.stream_queue_size)
+                streaming_sync_engine.run(root_node, box_folder, rgx_subfolder, rgx_subfile, rgx_sequence,
+                                          series_sample_size=series_sample_size,
+                                          series_verify_size=series_verify_size,
+                                          header_index=header_index,
+                                          dir_scan_snapshot=dir_scan_snapshot,
+                                          shard=args.shard)
+                if dir_scan_snapshot is not None:
+                    dir_scan_snapshot.evict_unvisited_dirs(mri_dir_entry.path)
+                    dir_scan_snapshot.close()
+                    sync_metrics.increment("directories_from_snapshot", dir_scan_snapshot.hits)
+                if upload_executor is not None:
+                    upload_executor.shutdown()
+                if header_index is not None:
+                    header_index.evict_unvisited_files(mri_dir_entry.path)
+                    header_index.close()
+                n_files_kept = streaming_sync_engine.n_files_kept
+                sync_metrics.increment("directories_scanned", streaming_sync_engine.n_folders_scanned)
+                sync_metrics.increment("local_files_found", streaming_sync_engine.n_files_found)
+                sync_metrics.increment("local_files_kept", n_files_kept)
+                sync_metrics.increment("local_files_pruned", streaming_sync_engine.n_files_found - n_files_kept)
+                sync_metrics.increment("dicom_headers_parsed", hlps.dicom_headers_parsed - dicom_headers_parsed_before)
+            elif args.engine == 'async':
+                async_sync_engine = ase.AsyncSyncEngine(box_index,
+                                                        concurrency_limits={"list": args.list_workers,
+                                                                            "mkdir": args.mkdir_workers,
+                                                                            "upload": args.upload_workers},
+                                                        update_files=update_files,
+                                                        remove_items=remove_items,
+                                                        is_verbose=is_verbose,
+                                                        chunked_uploader=chunked_uploader,
+                                                        series_bundler=series_bundler,
+                                                        hash_index=hash_index)
+                async_sync_engine.run(root_node, box_folder)
+            else:
+                root_node.sync_tree_object_items(box_folder,
+                                                 update_files=update_files,
+                                                 remove_items=remove_items,
+                                                 is_verbose=is_verbose,
+                                                 box_index=box_index,
+                                                 upload_executor=upload_executor,
+                                                 chunked_uploader=chunked_uploader,
+                                                 series_bundler=series_bundler,
+                                                 hash_index=hash_index)
+                if upload_executor is not None:
+                    upload_executor.shutdown()
+        if series_bundler is None and n_files_kept is not None:  # bundled series put one Box File per series
+            sync_metrics.increment("local_files_unchanged",
+                                   max(0, n_files_kept - sync_metrics.counters["box_files_put"]))
+        with sync_metrics.phase("save_box_state"):
+            if box_manifest is not None:
+                box_manifest.save_from_index(box_folder, box_index)
+                box_manifest.close()
+        if sync_journal is not None:
+            sync_journal.finish()
+
+        ##################################
+        # Watch for Changed Session Dirs #
+
+        if session_watcher is not None:
+            sync_metrics.write_outputs(args.metrics_json, args.metrics_textfile)  # rewritten after each watch batch
+            print(f"Watching for changed session folders in", f"{mri_dir_entry.path}...")
+            session_syncer = sw.SessionSyncer(mri_dir_entry, box_folder, rgx_subfolder, rgx_subfile, rgx_sequence,
+                                              update_files=update_files,
+                                              remove_items=remove_items,
+                                              is_verbose=is_verbose,
+                                              scan_workers=args.scan_workers,
+                                              classify_workers=args.classify_workers,
+                                              series_sample_size=series_sample_size,
+                                              series_verify_size=series_verify_size,
+                                              header_cache_path=args.header_cache,
+                                              upload_workers=args.upload_workers,
+                                              chunked_uploader=chunked_uploader,
+                                              series_bundler=series_bundler,
+                                              hash_index=hash_index,
+                                              shard=args.shard,
+                                              sync_metrics=sync_metrics,
+                                              metrics_json_path=args.metrics_json,
+                                              metrics_textfile_path=args.metrics_textfile)
+            try:
+                sw.watch_sessions(session_watcher, session_syncer, debounce_seconds=args.watch_debounce)
+            except KeyboardInterrupt:
+                print(f"Stopped watching.")
+            finally:
+                session_watcher.close()
+            session_syncer.print_summary()
+
+        box_request_scheduler.print_summary()
+        box_index.print_summary()
+        if args.shard is not None:
+            args.shard.print_summary()
+        if args.engine == 'stream' and not args.apply_plan:
+            streaming_sync_engine.print_summary()
+        if sync_journal is not None:
+            sync_journal.print_summary()
+        if chunked_uploader is not None:
+            chunked_uploader.print_summary()
+        if hash_index is not None:
+            hash_index.print_summary()
+        if header_index is not None:
+            header_index.print_summary()
+        if dir_scan_snapshot is not None:
+            dir_scan_snapshot.print_summary()
+        sync_metrics.print_summary()
+        sync_metrics.write_outputs(args.metrics_json, args.metrics_textfile)
+        if phase_profiler is not None:
+            phase_profiler.print_summary()
+        print(f"Done.\n")
+    finally:
+        # Run even if the sync raised, so upload threads stop and SQLite files are closed
+        if upload_executor is not None:
+            upload_executor.shutdown(raise_errors=False)
+        if chunked_uploader is not None:
+            chunked_uploader.close()
+        if hash_index is not None:
+            hash_index.close()
 
 
 if __name__ == "__main__":
@@ -3,9 +3,13 @@
 
 import re
 import os.path
+import hashlib
 import pydicom
 import functools
+import threading
 from boxsdk import JWTAuth, Client
+from boxsdk.exception import BoxAPIException
+from boxsdk.session.session import AuthorizedSession
 from datetime import datetime
 from pytz import timezone
 
@@ -17,13 +21,14 @@ from pytz import timezone
 box_folder_attrs = [
     "type",
     "id",
-    # "sequence_id",
-    # "etag",
+    "sequence_id",
+    "etag",
     "name",
     # "created_at",
     "modified_at",
     # "description",
     "size",
+    "sha1",
     # "path_collection",
     # "created_by",
     # "modified_by",
@@ -39,9 +44,20 @@ box_folder_attrs = [
     # "item_collection"
 ]
 
+# A list of DICOM Dataset tags to read from each DICOM file header
+# Only these tags are parsed; reading stops before pixel data
+# https://pydicom.github.io/pydicom/stable/reference/generated/pydicom.filereader.dcmread.html
+dicom_header_tags = [
+    "SeriesDescription",
+]
+
 # US Eastern timezone for comparing file timestamps
 tz_east = timezone("US/Eastern")
 
+# Number of DICOM file headers parsed from disk so far this run, from any thread, for run metrics
+dicom_headers_parsed = 0
+dicom_headers_parsed_lock = threading.Lock()
+
 
 ######################
 # Local OS Functions #
@@ -109,13 +125,15 @@ def get_local_subfiles(local_subitems, regex_subfile=None):
 # Box Client Functions #
 
 
-def get_box_authenticated_client(box_json_config_path, is_verbose=False):
+def get_box_authenticated_client(box_json_config_path, is_verbose=False, network_layer=None):
     """Get an authenticated Box client for a JWT service account
 
     :param box_json_config_path: A path to the JSON config file for your Box JWT app
     :type  box_json_config_path: str
     :param is_verbose: A flag for turning print statements on/off, optional
     :type  is_verbose: bool, optional
+    :param network_layer: A boxsdk network layer every API request of the client goes through, e.g., a scheduler
+    :type  network_layer: Network, optional
 
     :raises ValueError: if the box_json_config_path is empty or cannot be found
 
@@ -128,6 +146,8 @@ def get_box_authenticated_client(box_json_config_path, is_verbose=False):
     if is_verbose:
         print(f"Authenticating...")
     auth.authenticate_instance()
+    if network_layer is not None:
+        return Client(auth, session=AuthorizedSession(auth, network_layer=network_layer))
     return Client(auth)
 
 
@@ -162,6 +182,31 @@ def get_box_subitems(box_folder, fields=box_folder_attrs):
     return items
 
 
+def create_box_subfolder(box_folder, name):
+    """Create a Box subFolder, or get the one already there if a Box subFolder by that name exists
+
+    Box answers a duplicate name with a 409 conflict, so another process (e.g., another `shard`) creating the same
+    Box subFolder first is not an error; the Box Folder is listed to find it.
+
+    :param box_folder: A Box Folder to create the Box subFolder in
+    :type  box_folder: Folder
+    :param name: A name for the Box subFolder
+    :type  name: str
+
+    :return: A tuple of the Box subFolder and whether this call created it
+    :rtype: (Folder, boolean)
+    """
+    try:
+        return box_folder.create_subfolder(name), True
+    except BoxAPIException as box_api_exception:
+        if box_api_exception.status != 409:
+            raise
+        for box_subitem in get_box_subitems(box_folder):
+            if box_subitem.type == "folder" and box_subitem.name == name:
+                return box_subitem, False
+        raise  # the conflict is with a Box File of the same name
+
+
 def get_box_subfolders(box_subitems):
     """Filter for the Box subFolders from Box subitems
 
@@ -186,17 +231,22 @@ def get_box_subfiles(box_subitems):
     return [box_subitem for box_subitem in box_subitems if box_subitem.type == "file"]
 
 
-def get_corresponding_box_subfolder(local_subfolder, box_folder):
+def get_corresponding_box_subfolder(local_subfolder, box_folder, box_index=None):
     """Get box subfolder that corresponds BY NAME to local subfolder
 
     :param local_subfolder: A DirEntry subfolder whose corresponding Box subfolder we want to find
     :type  local_subfolder: DirEntry
     :param box_folder: A Box Folder whose contents may hold the corresponding Box subfolder
     :type  box_folder: Folder
+    :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+    :type  box_index: BoxFolderIndex, optional
 
     :return: A Box Folder we want to return
     :rtype: Folder
     """
+    if box_index is not None:
+        return box_index.get_subfolder(box_folder, local_subfolder.name) if local_subfolder.is_dir() else None
+
     box_subitems = get_box_subitems(box_folder)
     box_subfolders = get_box_subfolders(box_subitems)
     box_subfolder_target = None
@@ -206,17 +256,22 @@ def get_corresponding_box_subfolder(local_subfolder, box_folder):
     return box_subfolder_target
 
 
-def get_corresponding_box_subfile(local_subfile, box_folder):
+def get_corresponding_box_subfile(local_subfile, box_folder, box_index=None):
     """Get Box subFile that corresponds BY NAME to local subfile
 
     :param local_subfile: A DirEntry subfile whose corresponding Box subFile we want to find
     :type  local_subfile: DirEntry
     :param box_folder: A Box Folder whose contents may hold the corresponding Box subFile
     :type  box_folder: Folder
+    :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+    :type  box_index: BoxFolderIndex, optional
 
     :return: A Box File we want to return
     :rtype: File
     """
+    if box_index is not None:
+        return box_index.get_subfile(box_folder, local_subfile.name) if local_subfile.is_file() else None
+
     box_subitems = get_box_subitems(box_folder)
     box_subfiles = get_box_subfiles(box_subitems)
     box_subfile_target = None
@@ -226,7 +281,7 @@ def get_corresponding_box_subfile(local_subfile, box_folder):
     return box_subfile_target
 
 
-def delete_box_subfolders_not_found_in_local(local_subfolders, box_subfolders, is_verbose=False):
+def delete_box_subfolders_not_found_in_local(local_subfolders, box_subfolders, is_verbose=False, box_index=None):
     """Delete Box subFolders that are not found in local subfolders
 
     :param local_subfolders: A list of DirEntry folders to sync Box against
@@ -235,6 +290,8 @@ def delete_box_subfolders_not_found_in_local(local_subfolders, box_subfolders, i
     :type  box_subfolders: list[Folder]
     :param is_verbose: A flag for turning print statements on/off
     :type  is_verbose: bool, optional
+    :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+    :type  box_index: BoxFolderIndex, optional
 
     :return: A list of Box subFolder ID strings that were deleted
     :rtype: list[str]
@@ -247,6 +304,8 @@ def delete_box_subfolders_not_found_in_local(local_subfolders, box_subfolders, i
         box_subfolder_id, box_subfolder_name = box_subfolder.id, box_subfolder.name
         box_subfolder_deleted = box_subfolder.delete(recursive=True)
         if box_subfolder_deleted:
+            if box_index is not None:
+                box_index.remove_item(box_subfolder)
             deleted_box_subfolders_ids.append(box_subfolder_id)
             if is_verbose:
                 print(f"  Deleted subFolder", f"'{box_subfolder_name}'",
@@ -254,7 +313,8 @@ def delete_box_subfolders_not_found_in_local(local_subfolders, box_subfolders, i
     return deleted_box_subfolders_ids
 
 
-def create_box_subfolders_found_in_local(local_subfolders, box_folder, box_subfolders, is_verbose=False):
+def create_box_subfolders_found_in_local(local_subfolders, box_folder, box_subfolders, is_verbose=False,
+                                         box_index=None):
     """Create new Box subFolders that are found in local subfolders
 
     :param local_subfolders: A list of DirEntry folders to sync Box against
@@ -265,6 +325,8 @@ def create_box_subfolders_found_in_local(local_subfolders, box_folder, box_subfo
     :type  box_subfolders: list[Folder]
     :param is_verbose: A flag for turning print statements on/off
     :type  is_verbose: bool, optional
+    :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+    :type  box_index: BoxFolderIndex, optional
 
     :return: A ist of Box subFolder ID strings that were created
     :rtype: list[str]
@@ -274,7 +336,9 @@ def create_box_subfolders_found_in_local(local_subfolders, box_folder, box_subfo
         list(filter(lambda localsubfolder: localsubfolder.name not in box_subfolders_names, local_subfolders))
     created_box_subfolders_ids = []
     for local_subfolder in subfolders_in_local_not_in_box:
-        box_subfolder = box_folder.create_subfolder(local_subfolder.name)
+        box_subfolder, is_new = create_box_subfolder(box_folder, local_subfolder.name)
+        if box_index is not None:
+            box_index.add_new_folder(box_folder, box_subfolder, is_new)
         created_box_subfolders_ids.append(box_subfolder.id)
         if is_verbose:
             print(f"  Created subFolder", f"'{box_subfolder.name}'",
@@ -282,7 +346,7 @@ def create_box_subfolders_found_in_local(local_subfolders, box_folder, box_subfo
     return created_box_subfolders_ids
 
 
-def delete_box_subfiles_not_found_in_local(local_subfiles, box_subfiles, is_verbose=False):
+def delete_box_subfiles_not_found_in_local(local_subfiles, box_subfiles, is_verbose=False, box_index=None):
     """Delete Box subFiles that are not found in local subfiles
 
     :param local_subfiles: A list of DirEntry files to sync Box against
@@ -291,6 +355,8 @@ def delete_box_subfiles_not_found_in_local(local_subfiles, box_subfiles, is_verb
     :type  box_subfiles: list[File]
     :param is_verbose: An optional flag for turning print statements on/off
     :type  is_verbose: bool, optional
+    :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+    :type  box_index: BoxFolderIndex, optional
 
     :return: A list of Box subFile ID strings that were deleted
     :rtype: list[str]
@@ -303,6 +369,8 @@ def delete_box_subfiles_not_found_in_local(local_subfiles, box_subfiles, is_verb
         box_subfile_id, box_subfile_name = box_subfile.id, box_subfile.name
         box_subfile_deleted = box_subfile.delete()
         if box_subfile_deleted:
+            if box_index is not None:
+                box_index.remove_item(box_subfile)
             deleted_box_subfiles_ids.append(box_subfile_id)
             if is_verbose:
                 print(f"  Deleted subFile", f"'{box_subfile_name}'",
@@ -310,7 +378,99 @@ def delete_box_subfiles_not_found_in_local(local_subfiles, box_subfiles, is_verb
     return deleted_box_subfiles_ids
 
 
-def create_box_subfiles_found_in_local(local_subfiles, box_folder, box_subfiles, is_verbose=False):
+def get_local_file_sha1(local_path):
+    """Helper function: Get the SHA-1 hex digest of a local file's contents, as Box lists it
+
+    :param local_path: A path to the local file
+    :type  local_path: str
+
+    :return: A SHA-1 hex digest
+    :rtype: str
+    """
+    file_sha1 = hashlib.sha1()
+    with open(local_path, 'rb') as local_file:
+        for chunk in iter(lambda: local_file.read(1024 * 1024), b""):
+            file_sha1.update(chunk)
+    return file_sha1.hexdigest()
+
+
+def box_file_matches_local_file(box_file, local_path):
+    """Helper function: Check whether a Box File, listed with its "size" and "sha1" fields, has a local file's contents
+
+    :param box_file: A Box File
+    :type  box_file: File
+    :param local_path: A path to the local file
+    :type  local_path: str
+
+    :return: A boolean whether the sizes and SHA-1s match
+    :rtype: boolean
+    """
+    return box_file.size == os.path.getsize(local_path) and box_file.sha1 == get_local_file_sha1(local_path)
+
+
+def upload_local_file(box_folder, local_path, chunked_uploader=None):
+    """Upload a local file into a Box Folder, in parts through an upload session if it's big enough
+
+    Box answers a duplicate name with a 409 conflict, so a Box File already there (e.g., uploaded by a run that died
+    before journaling it) is not an error; the Box Folder is listed to find it. It's kept as-is if it has the local
+    file's contents, and updated from the local file otherwise.
+
+    :param box_folder: A Box Folder to upload the file into
+    :type  box_folder: Folder
+    :param local_path: A path to the local file
+    :type  local_path: str
+    :param chunked_uploader: An uploader for files at or above its size threshold
+    :type  chunked_uploader: ChunkedUploader, optional
+
+    :return: The new (or reconciled) Box File
+    :rtype: File
+    """
+    try:
+        if chunked_uploader is not None and chunked_uploader.should_chunk(local_path):
+            return chunked_uploader.upload(box_folder, local_path)
+        return box_folder.upload(local_path, preflight_check=True)
+    except BoxAPIException as box_api_exception:
+        if box_api_exception.status != 409:
+            raise
+        name = os.path.basename(local_path)
+        for box_subitem in get_box_subitems(box_folder):
+            if box_subitem.type == "file" and box_subitem.name == name:
+                if box_file_matches_local_file(box_subitem, local_path):
+                    return box_subitem
+                return update_box_file_contents(box_subitem, local_path, chunked_uploader)
+        raise  # the conflict is with a Box Folder of the same name
+
+
+def update_box_file_contents(box_file, local_path, chunked_uploader=None):
+    """Update a Box File's contents from a local file, in parts through an upload session if it's big enough
+
+    A 409 conflict is reconciled as in `upload_local_file`: the Box File is fetched again, and if it already has the
+    local file's contents (e.g., updated by a run that died before journaling it), it's returned as-is.
+
+    :param box_file: A Box File to update
+    :type  box_file: File
+    :param local_path: A path to the local file
+    :type  local_path: str
+    :param chunked_uploader: An uploader for files at or above its size threshold
+    :type  chunked_uploader: ChunkedUploader, optional
+
+    :return: The updated Box File
+    :rtype: File
+    """
+    try:
+        if chunked_uploader is not None and chunked_uploader.should_chunk(local_path):
+            return chunked_uploader.update(box_file, local_path)
+        return box_file.update_contents(local_path, preflight_check=True)
+    except BoxAPIException as box_api_exception:
+        if box_api_exception.status != 409:
+            raise
+        box_file = box_file.get(fields=box_folder_attrs)
+        if box_file_matches_local_file(box_file, local_path):
+            return box_file
+        raise
+
+
+def create_box_subfiles_found_in_local(local_subfiles, box_folder, box_subfiles, is_verbose=False, box_index=None):
     """Create new Box subFiles that are found in local subfiles
 
     :param local_subfiles: A list of DirEntry files to sync Box against
@@ -321,6 +481,8 @@ def create_box_subfiles_found_in_local(local_subfiles, box_folder, box_subfiles,
     :type  box_subfiles: list[File]
     :param is_verbose: An optional flag for turning print statements on/off
     :type  is_verbose: bool, optional
+    :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+    :type  box_index: BoxFolderIndex, optional
 
     :return: A list of Box subFile ID strings that were created
     :rtype: list[str]
@@ -331,6 +493,8 @@ def create_box_subfiles_found_in_local(local_subfiles, box_folder, box_subfiles,
     created_box_subfiles_ids = []
     for local_subfile in subfiles_in_local_not_in_box:
         box_subfile = box_folder.upload(local_subfile.path, preflight_check=True)
+        if box_index is not None:
+            box_index.add_item(box_folder, box_subfile)
         box_subfile_id = box_subfile.id
         created_box_subfiles_ids.append(box_subfile_id)
         if is_verbose:
@@ -339,7 +503,7 @@ def create_box_subfiles_found_in_local(local_subfiles, box_folder, box_subfiles,
     return created_box_subfiles_ids
 
 
-def update_box_subfiles_found_in_local(local_subfiles, box_folder, box_subfiles, is_verbose=False):
+def update_box_subfiles_found_in_local(local_subfiles, box_folder, box_subfiles, is_verbose=False, box_index=None):
     """Update existing Box subFiles that are found in--but are older than--local subfiles
 
     :param local_subfiles: A list of DirEntry files to sync Box against
@@ -350,6 +514,8 @@ def update_box_subfiles_found_in_local(local_subfiles, box_folder, box_subfiles,
     :type  box_subfiles: list[File]
     :param is_verbose: An optional flag for turning print statements on/off
     :type  is_verbose: bool, optional
+    :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+    :type  box_index: BoxFolderIndex, optional
 
     :return: List of Box subFile ID strings that were updated
     :rtype: list[str]
@@ -359,7 +525,7 @@ def update_box_subfiles_found_in_local(local_subfiles, box_folder, box_subfiles,
         list(filter(lambda localsubfile: localsubfile.name in box_subfiles_names, local_subfiles))
     updated_box_subfiles_ids = []
     for local_subfile in local_subfiles_in_local_in_box:
-        corres_box_subfile = get_corresponding_box_subfile(local_subfile, box_folder)
+        corres_box_subfile = get_corresponding_box_subfile(local_subfile, box_folder, box_index)
         # Local subfile modified timestamp
         local_subfile_modified_psx = local_subfile.stat().st_mtime
         local_subfile_modified_dt = datetime.fromtimestamp(local_subfile_modified_psx, tz=tz_east)
@@ -369,6 +535,8 @@ def update_box_subfiles_found_in_local(local_subfiles, box_folder, box_subfiles,
         # Update corres_box_subfile with contents of more recent local_subfile
         if local_subfile_modified_dt > corres_box_subfile_modified_dt:
             updated_box_subfile = corres_box_subfile.update_contents(local_subfile.path, preflight_check=True)
+            if box_index is not None:
+                box_index.add_item(box_folder, updated_box_subfile)
             updated_box_subfile_id = updated_box_subfile.id
             updated_box_subfiles_ids.append(updated_box_subfile_id)
             if is_verbose:
@@ -377,7 +545,7 @@ def update_box_subfiles_found_in_local(local_subfiles, box_folder, box_subfiles,
     return updated_box_subfiles_ids
 
 
-def sync_box_subfolders(local_subfolders, box_folder, box_subfolders, is_verbose):
+def sync_box_subfolders(local_subfolders, box_folder, box_subfolders, is_verbose, box_index=None):
     """Run functions to sync Box subFolders
 
     :param local_subfolders: A list of DirEntry folders to sync Box against
@@ -388,22 +556,25 @@ def sync_box_subfolders(local_subfolders, box_folder, box_subfolders, is_verbose
     :type  box_subfolders: list[Folder]
     :param is_verbose: An optional flag for turning print statements on/off
     :type  is_verbose: bool, optional
+    :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+    :type  box_index: BoxFolderIndex, optional
 
     :return: A tuple of lists of Box subFolder ID Strings that are deleted and created
     :rtype: (list[str], list[str])
     """
     # (0,1) Not Found in MADCBrain, Found in Box: Delete subfolder from box_folder
     deleted_box_subfolders_ids = \
-        delete_box_subfolders_not_found_in_local(local_subfolders, box_subfolders, is_verbose)
+        delete_box_subfolders_not_found_in_local(local_subfolders, box_subfolders, is_verbose, box_index)
 
     # (1,0) Found in MADCBrain, Not Found in Box: Create subfolder in box_folder
     created_box_subfolders_ids = \
-        create_box_subfolders_found_in_local(local_subfolders, box_folder, box_subfolders, is_verbose)
+        create_box_subfolders_found_in_local(local_subfolders, box_folder, box_subfolders, is_verbose, box_index)
 
     return deleted_box_subfolders_ids, created_box_subfolders_ids
 
 
-def sync_box_subfiles(local_subfiles, box_folder, box_subfiles, update_subfiles=False, is_verbose=False):
+def sync_box_subfiles(local_subfiles, box_folder, box_subfiles, update_subfiles=False, is_verbose=False,
+                      box_index=None):
     """Run functions to sync Box subFiles
 
     :param local_subfiles: A list of DirEntry files to sync Box against
@@ -416,6 +587,8 @@ def sync_box_subfiles(local_subfiles, box_folder, box_subfiles, update_subfiles=
     :type  update_subfiles: bool, optional
     :param is_verbose: An optional flag for turning print statements on/off
     :type  is_verbose: bool, optional
+    :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+    :type  box_index: BoxFolderIndex, optional
 
     :return: A tuple of lists of Box subFile ID Strings that are deleted, created, or updated
     :rtype: (list[str], list[str], list[str])
@@ -424,16 +597,16 @@ def sync_box_subfiles(local_subfiles, box_folder, box_subfiles, update_subfiles=
 
     # (0,1) Not Found in MADCBrain, Found in Box: Delete subfile from box_folder
     deleted_box_subfiles_ids = \
-        delete_box_subfiles_not_found_in_local(local_subfiles, box_subfiles, is_verbose)
+        delete_box_subfiles_not_found_in_local(local_subfiles, box_subfiles, is_verbose, box_index)
 
     # (1,0) Found in MADCBrain, Not Found in Box: Create subfile in box_folder
     created_box_subfiles_ids = \
-        create_box_subfiles_found_in_local(local_subfiles, box_folder, box_subfiles, is_verbose)
+        create_box_subfiles_found_in_local(local_subfiles, box_folder, box_subfiles, is_verbose, box_index)
 
     # (1,1) Found in MADCBrain, Found in Box: Update Box subFile with updated local subfile
     if update_subfiles:
         updated_box_subfiles_ids = \
-            update_box_subfiles_found_in_local(local_subfiles, box_folder, box_subfiles, is_verbose)
+            update_box_subfiles_found_in_local(local_subfiles, box_folder, box_subfiles, is_verbose, box_index)
 
     return deleted_box_subfiles_ids, created_box_subfiles_ids, updated_box_subfiles_ids
 
@@ -443,7 +616,7 @@ def sync_box_subfiles(local_subfiles, box_folder, box_subfiles, update_subfiles=
 
 def walk_local_dir_tree_sync_contents(local_folder, box_client, box_folder,
                                       regex_subfolder=None, regex_subfile=None,
-                                      update_subfiles=False, is_verbose=False):
+                                      update_subfiles=False, is_verbose=False, box_index=None):
     """Recursive driver function for syncing source local folder contents to a destination Box Folder
 
     :param local_folder: A DirEntry folder whose contents we want to fetch
@@ -460,25 +633,30 @@ def walk_local_dir_tree_sync_contents(local_folder, box_client, box_folder,
     :type  update_subfiles: bool, optional
     :param is_verbose: An optional flag for turning print statements on/off
     :type  is_verbose: bool, optional
+    :param box_index: A per-run index of Box Folder listings to look up and record Box subitems in
+    :type  box_index: BoxFolderIndex, optional
     """
     if is_verbose:
         print(f"Box Folder ID:", box_folder.id)
 
     local_subitems = get_local_subitems(local_folder)
     # box_subitems = get_box_subitems(box_client, box_folder)
-    box_subitems = get_box_subitems(box_folder)
+    if box_index is not None:
+        box_subitems = box_index.get_subitems(box_folder)
+    else:
+        box_subitems = get_box_subitems(box_folder)
 
     # Folders #
     local_subfolders = get_local_subfolders(local_subitems, regex_subfolder)
     box_subfolders = get_box_subfolders(box_subitems)
     deleted_box_subfolders_ids, created_box_subfolders_ids = \
-        sync_box_subfolders(local_subfolders, box_folder, box_subfolders, is_verbose)
+        sync_box_subfolders(local_subfolders, box_folder, box_subfolders, is_verbose, box_index)
 
     # Files #
     local_subfiles = get_local_subfiles(local_subitems, regex_subfile)
     box_subfiles = get_box_subfiles(box_subitems)
     deleted_box_subfiles_ids, created_box_subfiles_ids, updated_box_subfiles_ids = \
-        sync_box_subfiles(local_subfiles, box_folder, box_subfiles, update_subfiles, is_verbose)
+        sync_box_subfiles(local_subfiles, box_folder, box_subfiles, update_subfiles, is_verbose, box_index)
 
     if is_verbose:
         print(f"  Deleted Box subFolders:", deleted_box_subfolders_ids)
@@ -489,34 +667,68 @@ def walk_local_dir_tree_sync_contents(local_folder, box_client, box_folder,
 
     # Recurse Down #
     for local_subfolder in local_subfolders:
-        corres_box_subfolder = get_corresponding_box_subfolder(local_subfolder, box_folder)
+        corres_box_subfolder = get_corresponding_box_subfolder(local_subfolder, box_folder, box_index)
         walk_local_dir_tree_sync_contents(local_subfolder, box_client, corres_box_subfolder,
                                           regex_subfolder, regex_subfile,
-                                          update_subfiles, is_verbose)
+                                          update_subfiles, is_verbose, box_index)
 
 
 ###########################
 # DICOM Handler Functions #
 
-def get_local_dicom_dataset(dir_entry_file, rgx_dicom=re.compile(r'^i\d+\.MRDC\.\d+$')):
+def read_local_dicom_header(dicom_file, specific_tags=dicom_header_tags):
+    """Read only the header tags of a DICOM file, stopping before pixel data
+
+    :param dicom_file: A path to (or readable binary file object of) a DICOM Dataset file
+    :type  dicom_file: str or file-like
+    :param specific_tags: A list of DICOM tag keywords to parse; all other tags are skipped
+    :type  specific_tags: list[str], optional
+
+    :return: A pydicom Dataset holding only the requested header tags
+    :rtype: pydicom Dataset
+    """
+    count_dicom_header_parsed()
+    return pydicom.dcmread(dicom_file, stop_before_pixels=True, specific_tags=specific_tags)
+
+
+def count_dicom_header_parsed():
+    """Helper function: Add one to the count of DICOM file headers parsed from disk, from any thread"""
+    global dicom_headers_parsed
+    with dicom_headers_parsed_lock:
+        dicom_headers_parsed += 1
+
+
+def get_local_dicom_dataset(dir_entry_file, rgx_dicom=re.compile(r'^i\d+\.MRDC\.\d+$'), header_only=True,
+                            header_index=None):
     """Get the DICOM Dataset from the file that matches the provided Regex
 
     :param dir_entry_file: A DirEntry file of a DICOM Dataset (where a DICOM "dataset" is a DICOM file)
     :type  dir_entry_file: DirEntry
     :param rgx_dicom: A Regex for matching a DICOM Dataset file
     :type  rgx_dicom: Regex
+    :param header_only: A boolean flag for reading only the `dicom_header_tags` instead of the whole file
+    :type  header_only: boolean
+    :param header_index: An on-disk index to serve header-only reads from, if its row for the file is still valid
+    :type  header_index: DicomHeaderIndex, optional
 
     :return: A pydicom Dataset
     :rtype: pydicom Dataset
     """
     dicom_dataseries = pydicom.Dataset()
     if re.match(rgx_dicom, dir_entry_file.name):
-        dicom_dataseries = pydicom.dcmread(dir_entry_file.path)
+        if header_only and header_index is not None:
+            dicom_dataseries = header_index.get_dicom_dataset(dir_entry_file)
+        elif header_only:
+            dicom_dataseries = read_local_dicom_header(dir_entry_file.path)
+        else:
+            dicom_dataseries = pydicom.dcmread(dir_entry_file.path)
+            count_dicom_header_parsed()
 
     return dicom_dataseries
 
 
-def get_local_dicom_sequence(dir_entry_folder, rgx_dicom=re.compile(r'^i\d+\.MRDC\.\d+$'), presort=True):
+def get_local_dicom_sequence(dir_entry_folder, rgx_dicom=re.compile(r'^i\d+\.MRDC\.\d+$'), presort=True,
+                             header_only=True, header_index=None):
     """Get the DICOM Sequence in a given DirEntry folder whose DICOM Datasets that match the provided Regex
 
     :param dir_entry_folder: A DirEntry folder holding DICOM Datasets that will be bundled as a DICOM Sequence
@@ -525,6 +737,10 @@ def get_local_dicom_sequence(dir_entry_folder, rgx_dicom=re.compile(r'^i\d+\.MRD
     :type  rgx_dicom: Regex
     :param presort: A boolean flag for sorting the DICOM Datasets within the DICOM Sequence before returning it
     :type  presort: boolean
+    :param header_only: A boolean flag for reading only the `dicom_header_tags` of each DICOM Dataset
+    :type  header_only: boolean
+    :param header_index: An on-disk index to serve header-only reads from, if its rows are still valid
+    :type  header_index: DicomHeaderIndex, optional
 
     :return: pydicom Sequence of DICOM Datasets (where a DICOM "dataset" is a DICOM file)
     :rtype: pydicom Sequence
@@ -533,9 +749,13 @@ def get_local_dicom_sequence(dir_entry_folder, rgx_dicom=re.compile(r'^i\d+\.MRD
     dicom_subfiles = get_local_subfiles(subitems, rgx_dicom)
     if presort:
         sorted_dicom_subfiles = sorted(dicom_subfiles, key=lambda f: int(f.name.split(".")[-1]))
-        dicom_datasets = map(lambda dicom_subfile: get_local_dicom_dataset(dicom_subfile), sorted_dicom_subfiles)
+        dicom_datasets = map(lambda dicom_subfile:
+                             get_local_dicom_dataset(dicom_subfile, rgx_dicom, header_only, header_index),
+                             sorted_dicom_subfiles)
     else:
-        dicom_datasets = map(lambda dicom_subfile: get_local_dicom_dataset(dicom_subfile), dicom_subfiles)
+        dicom_datasets = map(lambda dicom_subfile:
+                             get_local_dicom_dataset(dicom_subfile, rgx_dicom, header_only, header_index),
+                             dicom_subfiles)
 
     return pydicom.Sequence(dicom_datasets)
 